@@ -0,0 +1,155 @@
+# Файл: app/database/bench_event_search.py
+#
+# Бенчмарк запасного (нечеткого) этапа find_events_fuzzy на 10k / 100k / 1M событий:
+#   old - как было: все события фильтра загружаются в Python и сравниваются с запросом
+#         через fuzz.partial_ratio (название и каждый артист). Здесь загружаются только строки
+#         (название, артисты) без ORM-объектов и selectinload - т.е. это нижняя оценка прежней стоимости;
+#   new - текущий запрос: кандидаты по триграммному индексу на search_document (%>),
+#         оценка word_similarity в БД, из БД приходят только limit строк.
+# Запросы - названия случайных событий с опечаткой (ILIKE-этап такие не находит).
+#
+# Данные генерируются в отдельной схеме (по умолчанию bench_event_search), рабочие таблицы не трогаются;
+# схема удаляется после замера (--keep - оставить). Нужны права на CREATE SCHEMA и расширение pg_trgm.
+#
+# Запуск из папки Tg_bot (подключение - из тех же DB_* переменных, что у бота):
+#   python -m app.database.bench_event_search
+#   python -m app.database.bench_event_search --sizes 10000 100000 --queries 20 --old-max 100000
+
+import argparse
+import asyncio
+import random
+import statistics
+import time
+import tracemalloc
+
+from sqlalchemy import text
+from thefuzz import fuzz
+
+from app.database.models import engine
+from app.database.requests.requests import (
+    EVENT_SEARCH_LIMIT, SIMILARITY_THRESHOLD, TRGM_WORD_SIMILARITY_THRESHOLD, normalize_search_text
+)
+
+SYLLABLES = [
+    'ба', 'ста', 'ми', 'ро', 'ка', 'ле', 'на', 'ту', 'зе', 'мфи', 'ра', 'ко', 'ри', 'до', 'ша', 'вы',
+    'max', 'kor', 'ima', 'gine', 'dra', 'gon', 'noi', 'ze', 'lin', 'kin', 'park', 'mo', 'net', 'ta',
+    'lu', 'na', 'sol', 'ar', 'tem', 'vel', 'da', 'ni', 'ya', 'ger',
+]
+PREFIXES = ['Концерт', 'Большой сольный концерт', 'Тур', 'Шоу', 'Вечер с группой', 'Live', 'Фестиваль', 'Презентация альбома']
+
+
+def _sql_array(values: list[str]) -> str:
+    return "ARRAY[" + ", ".join("'" + value.replace("'", "''") + "'" for value in values) + "]"
+
+
+def _name_sql(seed: str) -> str:
+    """Имя "артиста" из трех слогов, детерминированно по номеру события."""
+    parts = [f"s[1 + (({seed}) * {prime}) % {len(SYLLABLES)}]" for prime in (7, 13, 31)]
+    return f"initcap({' || '.join(parts)})"
+
+
+async def generate(conn, schema: str, size: int):
+    await conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    await conn.execute(text(f"CREATE SCHEMA {schema}"))
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    await conn.execute(text(f"""
+        CREATE TABLE {schema}.events AS
+        SELECT i AS event_id,
+               p[1 + i % {len(PREFIXES)}] || ' ' || {_name_sql('i / 3')} AS title,
+               {_name_sql('i / 3')} || ' ' || {_name_sql('i / 3 + 17')} AS artists
+        FROM generate_series(1, {size}) AS i,
+             (SELECT {_sql_array(SYLLABLES)} AS s, {_sql_array(PREFIXES)} AS p) AS pools
+    """))
+    await conn.execute(text(f"ALTER TABLE {schema}.events ADD COLUMN search_document TEXT"))
+    # Та же нормализация, что у normalize_search_text в БД
+    await conn.execute(text(f"""
+        UPDATE {schema}.events
+        SET search_document = btrim(regexp_replace(translate(lower(title || ' ' || artists), 'ё', 'е'), '[[:space:]]+', ' ', 'g'))
+    """))
+    await conn.execute(text(f"CREATE INDEX ON {schema}.events USING gin (search_document gin_trgm_ops)"))
+    await conn.execute(text(f"ANALYZE {schema}.events"))
+
+
+def with_typo(value: str, rnd: random.Random) -> str:
+    position = rnd.randrange(1, len(value) - 1)
+    return value[:position] + value[position + 1:]  # пропущенная буква
+
+
+async def sample_queries(conn, schema: str, count: int, rnd: random.Random) -> list[str]:
+    rows = (await conn.execute(text(
+        f"SELECT artists FROM {schema}.events TABLESAMPLE SYSTEM (5) LIMIT :count"
+    ), {'count': count * 3})).scalars().all()
+    rnd.shuffle(rows)
+    return [with_typo(row.split(' ')[0], rnd) for row in rows[:count]]
+
+
+async def run_old(conn, schema: str, query: str) -> tuple[float, float, int]:
+    """Прежний этап 2: все строки в Python + partial_ratio. Возвращает (секунды, пик памяти МБ, найдено)."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    rows = (await conn.execute(text(f"SELECT event_id, title, artists FROM {schema}.events"))).all()
+    query_lower = query.lower()
+    found = 0
+    for row in rows:
+        scores = [fuzz.partial_ratio(query_lower, row.title.lower())]
+        scores += [fuzz.partial_ratio(query_lower, name.lower()) for name in row.artists.split(' ')]
+        if max(scores) >= SIMILARITY_THRESHOLD:
+            found += 1
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+    tracemalloc.stop()
+    return elapsed, peak, found
+
+
+async def run_new(conn, schema: str, query: str) -> tuple[float, int]:
+    started = time.perf_counter()
+    rows = (await conn.execute(text(f"""
+        SELECT event_id, word_similarity(:q, search_document) AS score
+        FROM {schema}.events
+        WHERE search_document %> :q AND word_similarity(:q, search_document) >= :threshold
+        ORDER BY score DESC
+        LIMIT :limit
+    """), {'q': normalize_search_text(query), 'threshold': TRGM_WORD_SIMILARITY_THRESHOLD,
+           'limit': EVENT_SEARCH_LIMIT})).all()
+    return time.perf_counter() - started, len(rows)
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк нечеткого поиска событий")
+    arg_parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    arg_parser.add_argument('--queries', type=int, default=10)
+    arg_parser.add_argument('--old-max', type=int, default=100_000,
+                            help='Не замерять старый вариант на больших объемах (он идет минутами)')
+    arg_parser.add_argument('--schema', default='bench_event_search')
+    arg_parser.add_argument('--keep', action='store_true', help='Не удалять схему с данными')
+    args = arg_parser.parse_args()
+
+    rnd = random.Random(42)
+    print(f"{'событий':>10} | {'new, мс (медиана)':>18} | {'old, мс (медиана)':>18} | {'old, пик МБ':>11} | найдено new/old")
+    try:
+        for size in args.sizes:
+            async with engine.begin() as conn:
+                await generate(conn, args.schema, size)
+            async with engine.connect() as conn:
+                queries = await sample_queries(conn, args.schema, args.queries, rnd)
+                new_results = [await run_new(conn, args.schema, query) for query in queries]
+                new_ms = statistics.median(elapsed for elapsed, _ in new_results) * 1000
+                new_found = statistics.median(found for _, found in new_results)
+                if size <= args.old_max:
+                    # Старый вариант медленный - хватает нескольких запросов
+                    old_results = [await run_old(conn, args.schema, query) for query in queries[:3]]
+                    old_ms = f"{statistics.median(r[0] for r in old_results) * 1000:18.0f}"
+                    old_mb = f"{max(r[1] for r in old_results):11.0f}"
+                    old_found = statistics.median(r[2] for r in old_results)
+                else:
+                    old_ms, old_mb, old_found = f"{'пропущено':>18}", f"{'-':>11}", '-'
+            print(f"{size:>10} | {new_ms:18.1f} | {old_ms} | {old_mb} | {new_found}/{old_found}")
+    finally:
+        if not args.keep:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
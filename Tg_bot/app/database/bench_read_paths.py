@@ -0,0 +1,79 @@
+# Файл: app/database/bench_read_paths.py
+#
+# Бенчмарк горячих запросов чтения: ORM-версии из requests.py против requests_fast.py
+# (asyncpg напрямую, строки -> NamedTuple). Для каждого запроса - медиана и p95 времени вызова
+# функции целиком (запрос + создание объектов результата) и число строк у обоих путей.
+# Работает на текущей базе и только читает: берет пользователя с наибольшим числом подписок
+# и пользователя с наибольшим избранным.
+#
+# Запуск из папки Tg_bot (подключение - из тех же DB_* переменных, что у бота):
+#   python -m app.database.bench_read_paths
+#   python -m app.database.bench_read_paths --iterations 500
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import text
+
+from app.database.models import async_session, engine
+from app.database.requests import requests as db
+from app.database.requests import requests_fast as db_fast
+
+
+async def pick_sample() -> dict:
+    async with async_session() as session:
+        subscriber = (await session.execute(text(
+            "SELECT user_id FROM subscriptions GROUP BY user_id ORDER BY count(*) DESC LIMIT 1"
+        ))).scalar()
+        favorites_owner = (await session.execute(text(
+            "SELECT user_id FROM user_favorites GROUP BY user_id ORDER BY count(*) DESC LIMIT 1"
+        ))).scalar()
+    return {'subscriber': subscriber, 'favorites_owner': favorites_owner}
+
+
+async def measure(call, iterations: int) -> tuple[float, float, int]:
+    """(медиана мс, p95 мс, число строк результата)."""
+    result = await call()  # прогрев: подготовка запроса, пул соединений
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = await call()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.95))], len(result)
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк ORM и asyncpg путей чтения")
+    arg_parser.add_argument('--iterations', type=int, default=200)
+    args = arg_parser.parse_args()
+
+    sample = await pick_sample()
+    cases = []
+    if sample['subscriber'] is not None:
+        cases.append(('get_user_subscriptions',
+                      lambda: db.get_user_subscriptions(sample['subscriber']),
+                      lambda: db_fast.get_user_subscriptions(sample['subscriber'])))
+    if sample['favorites_owner'] is not None:
+        cases.append(('get_user_favorites',
+                      lambda: db.get_user_favorites(sample['favorites_owner']),
+                      lambda: db_fast.get_user_favorites(sample['favorites_owner'])))
+    if not cases:
+        print("В базе нет подписок и избранного - нечего замерять.")
+        return
+
+    print(f"{'запрос':<43} | {'ORM, мс (медиана/p95)':>22} | {'asyncpg, мс (медиана/p95)':>26} | {'ускорение':>9} | строк")
+    try:
+        for name, orm_call, fast_call in cases:
+            orm_median, orm_p95, orm_rows = await measure(orm_call, args.iterations)
+            fast_median, fast_p95, fast_rows = await measure(fast_call, args.iterations)
+            print(f"{name:<43} | {orm_median:>11.2f}/{orm_p95:<10.2f} | {fast_median:>13.2f}/{fast_p95:<12.2f} | "
+                  f"{orm_median / fast_median:>8.1f}x | {orm_rows}/{fast_rows}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,193 @@
+# Файл: app/database/check_query_plans.py
+#
+# Проверка планов ключевых запросов: на большом синтетическом наборе данных вызываются функции
+# из app/database/requests, все их SELECT-запросы перехватываются и прогоняются через
+# EXPLAIN (FORMAT JSON). Если в плане есть Seq Scan по большой таблице (LARGE_TABLES) -
+# проверка не пройдена (код выхода 1): значит, запросу не хватает индекса или индекс не используется.
+#
+# Данные создаются в отдельной схеме (по умолчанию plan_check): таблицы из моделей, синтетические
+# строки, затем миграции (app/database/migrations) - так заодно проверяется, что миграции
+# применяются к заполненной базе. Рабочие таблицы не трогаются; схема удаляется после проверки (--keep - оставить).
+#
+# Запуск из папки Tg_bot (подключение - из тех же DB_* переменных, что у бота):
+#   python -m app.database.check_query_plans
+#   python -m app.database.check_query_plans --events 1000000 --keep
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import models
+from app.database.migrations import migrate
+from app.database.requests import requests as db
+from app.database.requests.requests_favorite_notifier import get_favorite_subscribers_by_artist
+
+# Таблицы, полное сканирование которых в ключевых запросах недопустимо
+LARGE_TABLES = {
+    'events', 'event_artists', 'event_links', 'artists', 'venues',
+    'subscriptions', 'user_favorites', 'afisha_event_series',
+}
+
+
+def synthetic_data_sql(events: int) -> list[str]:
+    """Объемы остальных таблиц - пропорционально числу событий."""
+    cities = 2000
+    venues = max(1000, events // 10)
+    artists = max(1000, events // 10)
+    users = max(1000, events // 4)
+    series = max(1, events // 3)  # в среднем по три даты у одного названия
+    return [
+        "INSERT INTO countries (country_id, name) SELECT i, 'Страна ' || i FROM generate_series(1, 30) AS i",
+        f"INSERT INTO cities (city_id, name, country_id) SELECT i, 'Город ' || i, 1 + i % 30 FROM generate_series(1, {cities}) AS i",
+        "INSERT INTO event_types (type_id, name) SELECT i, 'Тип ' || i FROM generate_series(1, 6) AS i",
+        f"""INSERT INTO venues (venue_id, name, normalized_key, city_id, country_id)
+            SELECT i, 'Площадка ' || i, 'ploschadka ' || i, 1 + i % {cities}, 1 + (1 + i % {cities}) % 30
+            FROM generate_series(1, {venues}) AS i""",
+        f"""INSERT INTO events (event_id, title, type_id, venue_id, date_start, price_min, price_max)
+            SELECT i, 'Событие ' || (i % {series}), 1 + (i % {series}) % 6, 1 + (i % {series}) % {venues},
+                   date_trunc('day', now()) + (i % 365) * interval '1 day' + interval '19 hours',
+                   10 + i % 50, 60 + i % 100
+            FROM generate_series(1, {events}) AS i""",
+        f"INSERT INTO artists (artist_id, name) SELECT i, 'Артист ' || i FROM generate_series(1, {artists}) AS i",
+        f"""INSERT INTO event_artists (event_id, artist_id)
+            SELECT i, 1 + i % {artists} FROM generate_series(1, {events}) AS i
+            UNION
+            SELECT i, 1 + (i * 7 + 3) % {artists} FROM generate_series(1, {events}) AS i""",
+        f"""INSERT INTO event_links (event_id, url, type)
+            SELECT i, 'https://tickets.example/' || i, 'bilety' FROM generate_series(1, {events}) AS i""",
+        f"""INSERT INTO users (user_id, language_code, main_geo_completed, general_geo_completed)
+            SELECT i, 'ru', true, true FROM generate_series(1, {users}) AS i""",
+        f"""INSERT INTO subscriptions (user_id, event_id, status, is_turbo)
+            SELECT 1 + i % {users}, 1 + (i * 13) % {events},
+                   CASE WHEN i % 5 = 0 THEN 'paused' ELSE 'active' END::subscription_status_enum, false
+            FROM generate_series(1, {events}) AS i""",
+        f"""INSERT INTO user_favorites (user_id, artist_id, regions)
+            SELECT user_id, artist_id, '[]'::json
+            FROM (SELECT DISTINCT 1 + i % {users} AS user_id, 1 + (i * 11) % {artists} AS artist_id
+                  FROM generate_series(1, {events}) AS i) AS pairs""",
+    ]
+
+
+def seq_scans(plan: dict) -> list[str]:
+    """Большие таблицы, которые план читает последовательным сканированием."""
+    found = []
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        if node.get('Node Type') == 'Seq Scan' and node.get('Relation Name') in LARGE_TABLES:
+            found.append(node['Relation Name'])
+        nodes.extend(node.get('Plans', []))
+    return found
+
+
+async def with_session(func, *args):
+    async with models.async_session() as session:
+        return await func(session, *args)
+
+
+def key_queries(sample: dict) -> list[tuple[str, callable]]:
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return [
+        ('find_event_by_signature', lambda: with_session(db.find_event_by_signature, sample['title'], sample['date_start'])),
+        ('get_user_subscriptions', lambda: db.get_user_subscriptions(sample['user_id'])),
+        ('get_subscription_details', lambda: db.get_subscription_details(sample['user_id'], sample['event_id'])),
+        ('get_future_events_for_artists', lambda: db.get_future_events_for_artists([sample['artist_id']])),
+        ('get_events_for_artists', lambda: db.get_events_for_artists([sample['artist_name']], [sample['city_name']])),
+        ('get_or_create_artists_by_name', lambda: db.get_or_create_artists_by_name([sample['artist_name'].lower()])),
+        ('get_favorite_subscribers_by_artist', lambda: get_favorite_subscribers_by_artist(sample['artist_id'])),
+        ('find_events_fuzzy (ILIKE)', lambda: db.find_events_fuzzy(sample['artist_name'])),
+        ('find_events_fuzzy (search_document)', lambda: db.find_events_fuzzy(sample['artist_name'][:-1] + 'ъ')),
+        ('get_grouped_events_by_city_and_categories', lambda: db.get_grouped_events_by_city_and_categories(
+            sample['city_name'], ['Тип 1', 'Тип 2'], month_start, month_end)),
+    ]
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description="Проверка планов ключевых запросов (нет Seq Scan по большим таблицам)")
+    arg_parser.add_argument('--events', type=int, default=300_000)
+    arg_parser.add_argument('--schema', default='plan_check')
+    arg_parser.add_argument('--keep', action='store_true', help='Не удалять схему с данными')
+    args = arg_parser.parse_args()
+
+    check_engine = create_async_engine(
+        models.SQL_ALCHEMY, connect_args={'server_settings': {'search_path': f'{args.schema},public'}}
+    )
+    captured: list[tuple[str, object]] = []
+    capturing = False
+
+    @event.listens_for(check_engine.sync_engine, 'before_cursor_execute')
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if capturing and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+            captured.append((statement, parameters))
+
+    failed = False
+    try:
+        async with models.engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+            await conn.execute(text(f"CREATE SCHEMA {args.schema}"))
+
+        print(f"Схема {args.schema}: таблицы и {args.events} синтетических событий...")
+        async with check_engine.begin() as conn:
+            await conn.run_sync(models.Base.metadata.create_all)
+            for statement in synthetic_data_sql(args.events):
+                await conn.execute(text(statement))
+        print("Миграции на заполненной базе...")
+        await migrate(check_engine)
+        async with check_engine.begin() as conn:
+            await conn.execute(text("ANALYZE"))
+            row = (await conn.execute(text("""
+                SELECT e.event_id, e.title, e.date_start, s.user_id, a.artist_id, a.name AS artist_name, c.name AS city_name
+                FROM events e
+                JOIN subscriptions s ON s.event_id = e.event_id
+                JOIN event_artists ea ON ea.event_id = e.event_id
+                JOIN artists a ON a.artist_id = ea.artist_id
+                JOIN venues v ON v.venue_id = e.venue_id
+                JOIN cities c ON c.city_id = v.city_id
+                ORDER BY e.event_id
+                LIMIT 1
+            """))).one()
+        sample = dict(row._mapping)
+
+        # Функции запросов работают через общий async_session - направляем его в проверочную схему
+        models.async_session.configure(bind=check_engine)
+        print(f"\n{'запрос':<45} результат")
+        for name, call in key_queries(sample):
+            captured.clear()
+            capturing = True
+            try:
+                await call()
+            finally:
+                capturing = False
+            problems = []
+            async with check_engine.connect() as conn:
+                for statement, parameters in captured:
+                    plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+                    plan = json.loads(plan) if isinstance(plan, str) else plan
+                    problems += seq_scans(plan[0]['Plan'])
+            if problems:
+                failed = True
+                print(f"{name:<45} FAIL: Seq Scan по {', '.join(sorted(set(problems)))}")
+            else:
+                print(f"{name:<45} ok ({len(captured)} запр.)")
+    finally:
+        models.async_session.configure(bind=models.engine)
+        if not args.keep:
+            async with models.engine.begin() as conn:
+                await conn.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        await check_engine.dispose()
+        await models.engine.dispose()
+
+    if failed:
+        print("\nЕсть запросы с последовательным сканированием больших таблиц.")
+        sys.exit(1)
+    print("\nВсе ключевые запросы используют индексы.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
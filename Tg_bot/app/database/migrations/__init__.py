@@ -0,0 +1,11 @@
+# app/database/migrations/__init__.py
+#
+# Версионные миграции схемы. async_main сначала создает недостающие таблицы (create_all),
+# затем применяет миграции, которых еще нет в таблице schema_migrations.
+# Миграция - модуль mNNNN_<название>.py в этом пакете:
+#   VERSION    - номер (совпадает с NNNN), миграции применяются по возрастанию;
+#   STATEMENTS - операторы, выполняются в одной транзакции вместе с отметкой о применении;
+#   INDEXES    - (имя, CREATE INDEX CONCURRENTLY ...) - выполняются вне транзакции, по одному.
+# Примененную миграцию не редактируют - изменения оформляются новой миграцией.
+
+from .runner import load_migrations, migrate
@@ -0,0 +1,154 @@
+# app/database/migrations/m0001_baseline.py
+#
+# Изменения схемы, которые до появления версионных миграций выполнялись при каждом запуске
+# async_main (список SQL_SCHEMA_UPGRADES в models.py). Все операторы идемпотентны, поэтому
+# на базе, где они уже выполнялись, миграция просто отмечается примененной.
+
+VERSION = 1
+NAME = 'baseline'
+
+STATEMENTS = [
+    "ALTER TABLE venues ADD COLUMN IF NOT EXISTS normalized_key VARCHAR(500)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_venues_city_normalized_key ON venues (city_id, normalized_key)",
+    # Уникальность ссылок события: сначала удаляем накопившиеся дубли (остается самая старая ссылка).
+    # Только при первом запуске - пока индекса нет
+    """
+    DO $$
+    BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() AND indexname = 'uq_event_links_event_url') THEN
+            DELETE FROM event_links a
+                USING event_links b
+                WHERE a.event_id = b.event_id AND a.url = b.url AND a.link_id > b.link_id;
+            CREATE UNIQUE INDEX uq_event_links_event_url ON event_links (event_id, url);
+        END IF;
+    END
+    $$;
+    """,
+    # Нечеткий поиск на стороне БД (find_*_fuzzy): триграммные GIN-индексы обслуживают операторы
+    # % (similarity) и %> (word_similarity). Индексы здесь, а не в моделях: create_all выполняется
+    # раньше и не знает о классе операторов gin_trgm_ops, пока расширение не создано
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_artists_name_trgm ON artists USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_events_title_trgm ON events USING gin (title gin_trgm_ops)",
+    # Кэш справочников в боте (app/services/reference_data.py, city_catalog.py) сбрасывается
+    # по этому уведомлению; payload - имя измененной таблицы
+    """
+    CREATE OR REPLACE FUNCTION notify_reference_data_changed() RETURNS TRIGGER AS $$
+    BEGIN
+        PERFORM pg_notify('reference_data_changed_channel', TG_TABLE_NAME);
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "DROP TRIGGER IF EXISTS cities_changed_trigger ON cities",
+    "DROP FUNCTION IF EXISTS notify_cities_changed()",
+    "DROP TRIGGER IF EXISTS reference_data_changed_trigger ON countries",
+    """
+    CREATE TRIGGER reference_data_changed_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON countries
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+    """,
+    "DROP TRIGGER IF EXISTS reference_data_changed_trigger ON cities",
+    """
+    CREATE TRIGGER reference_data_changed_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON cities
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+    """,
+    "DROP TRIGGER IF EXISTS reference_data_changed_trigger ON event_types",
+    """
+    CREATE TRIGGER reference_data_changed_trigger
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON event_types
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_reference_data_changed();
+    """,
+    # Поисковый документ события: название + имена артистов, в нижнем регистре и с е вместо ё.
+    # Поддерживается триггерами на events (название) и event_artists (состав артистов)
+    """
+    CREATE OR REPLACE FUNCTION normalize_search_text(value TEXT) RETURNS TEXT
+    LANGUAGE sql IMMUTABLE AS $$
+        SELECT btrim(regexp_replace(translate(lower(coalesce(value, '')), 'ё', 'е'), '[[:space:]]+', ' ', 'g'))
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION build_event_search_document(p_event_id INTEGER, p_title TEXT) RETURNS TEXT
+    LANGUAGE sql STABLE AS $$
+        SELECT normalize_search_text(concat_ws(' ', p_title, (
+            SELECT string_agg(a.name, ' ' ORDER BY a.artist_id)
+            FROM event_artists ea JOIN artists a ON a.artist_id = ea.artist_id
+            WHERE ea.event_id = p_event_id
+        )))
+    $$;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION events_set_search_document() RETURNS TRIGGER AS $$
+    BEGIN
+        NEW.search_document := build_event_search_document(NEW.event_id, NEW.title);
+        RETURN NEW;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    """
+    CREATE OR REPLACE FUNCTION event_artists_refresh_search_document() RETURNS TRIGGER AS $$
+    DECLARE
+        target_event_id INTEGER;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            target_event_id := OLD.event_id;
+        ELSE
+            target_event_id := NEW.event_id;
+        END IF;
+        UPDATE events SET search_document = build_event_search_document(event_id, title)
+            WHERE event_id = target_event_id;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """,
+    "ALTER TABLE events ADD COLUMN IF NOT EXISTS search_document TEXT",
+    "DROP TRIGGER IF EXISTS events_search_document_trigger ON events",
+    """
+    CREATE TRIGGER events_search_document_trigger
+    BEFORE INSERT OR UPDATE OF title ON events
+    FOR EACH ROW EXECUTE FUNCTION events_set_search_document();
+    """,
+    "DROP TRIGGER IF EXISTS event_artists_search_document_trigger ON event_artists",
+    """
+    CREATE TRIGGER event_artists_search_document_trigger
+    AFTER INSERT OR DELETE ON event_artists
+    FOR EACH ROW EXECUTE FUNCTION event_artists_refresh_search_document();
+    """,
+    # Заполнение для событий, созданных до появления колонки (при следующих запусках - пустой проход)
+    "UPDATE events SET search_document = build_event_search_document(event_id, title) WHERE search_document IS NULL",
+    "CREATE INDEX IF NOT EXISTS ix_events_search_document_trgm ON events USING gin (search_document gin_trgm_ops)",
+    # Афиша: события, заранее сгруппированные в "серии" (одно название + место + тип в городе).
+    # Массивы event_ids/dates/links/prices_* выровнены по событиям (по дате), чтобы при чтении
+    # можно было оставить только даты из выбранного периода. Обновляется в конце прогона парсера
+    # (refresh_afisha_series); уникальный индекс нужен для REFRESH ... CONCURRENTLY.
+    # Новое определение - отдельной миграцией (DROP + CREATE), IF NOT EXISTS его не пересоздаст
+    """
+    CREATE MATERIALIZED VIEW IF NOT EXISTS afisha_event_series AS
+    SELECT
+        c.city_id,
+        c.name AS city_name,
+        et.type_id,
+        et.name AS category_name,
+        v.venue_id,
+        v.name AS venue_name,
+        e.title,
+        array_agg(e.event_id ORDER BY e.date_start, e.event_id) AS event_ids,
+        array_agg(e.date_start ORDER BY e.date_start, e.event_id) AS dates,
+        array_agg((
+            SELECT l.url FROM event_links l WHERE l.event_id = e.event_id ORDER BY l.link_id LIMIT 1
+        ) ORDER BY e.date_start, e.event_id) AS links,
+        array_agg(e.price_min ORDER BY e.date_start, e.event_id) AS prices_min,
+        array_agg(e.price_max ORDER BY e.date_start, e.event_id) AS prices_max,
+        min(e.date_start) AS first_date,
+        max(e.date_start) AS last_date
+    FROM events e
+    JOIN venues v ON v.venue_id = e.venue_id
+    JOIN cities c ON c.city_id = v.city_id
+    JOIN event_types et ON et.type_id = e.type_id
+    WHERE e.date_start IS NULL OR e.date_start >= date_trunc('month', now())
+    GROUP BY c.city_id, c.name, et.type_id, et.name, v.venue_id, v.name, e.title
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS uq_afisha_event_series ON afisha_event_series (city_id, type_id, venue_id, title)",
+    "CREATE INDEX IF NOT EXISTS ix_afisha_event_series_city_category_date ON afisha_event_series (city_name, category_name, first_date)",
+]
@@ -0,0 +1,33 @@
+# app/database/migrations/m0002_hot_path_indexes.py
+#
+# Индексы под частые фильтры - без них запросы шли последовательным сканированием таблиц.
+# Создаются CONCURRENTLY: таблицы событий и подписок не блокируются на запись на время построения.
+# venues.city_id отдельно не индексируется - его обслуживает uq_venues_city_normalized_key (city_id первый).
+
+VERSION = 2
+NAME = 'hot_path_indexes'
+
+# (имя индекса, оператор) - выполняются вне транзакции, см. runner.create_index_concurrently
+INDEXES = [
+    # Афиша и уведомления: события начиная с даты
+    ('ix_events_date_start',
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_events_date_start ON events (date_start)"),
+    # find_event_by_signature (парсер: поиск существующего события)
+    ('ix_events_title_date_start',
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_events_title_date_start ON events (title, date_start)"),
+    # События артиста (первичный ключ event_artists начинается с event_id)
+    ('ix_event_artists_artist_id',
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_event_artists_artist_id ON event_artists (artist_id)"),
+    # Подписки пользователя (с фильтром по статусу)
+    ('ix_subscriptions_user_id_status',
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_subscriptions_user_id_status ON subscriptions (user_id, status)"),
+    # Подписки на событие (selectinload(Event.subscriptions), каскадное удаление событий)
+    ('ix_subscriptions_event_id',
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_subscriptions_event_id ON subscriptions (event_id)"),
+    # Подписчики артиста (уведомления о новых событиях; первичный ключ начинается с user_id)
+    ('ix_user_favorites_artist_id',
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_favorites_artist_id ON user_favorites (artist_id)"),
+    # get_or_create_artists_by_name: поиск по lower(name)
+    ('ix_artists_lower_name',
+     "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_artists_lower_name ON artists (lower(name))"),
+]
@@ -0,0 +1,13 @@
+# app/database/migrations/m0003_drop_cities_name_trgm.py
+#
+# Триграммный индекс по cities.name создавался при запуске до версионных миграций, пока город
+# искался в БД оператором %. Теперь выбор и поиск города идут по каталогу в памяти
+# (app/services/city_catalog.py), индекс не используется - на старых базах он только
+# замедляет запись в cities. Таблица маленькая, поэтому обычный DROP без CONCURRENTLY.
+
+VERSION = 3
+NAME = 'drop_cities_name_trgm'
+
+STATEMENTS = [
+    "DROP INDEX IF EXISTS ix_cities_name_trgm",
+]
@@ -0,0 +1,123 @@
+# app/database/migrations/runner.py
+
+import asyncio
+import importlib
+import logging
+import pkgutil
+import re
+from typing import NamedTuple
+
+from sqlalchemy import text
+
+MIGRATIONS_TABLE = 'schema_migrations'
+# Ключ pg_advisory_lock: бот, парсер и воркеры стартуют одновременно - миграции применяет кто-то один
+MIGRATIONS_LOCK_ID = 4815162342
+# Пауза между попытками взять блокировку, секунды
+MIGRATIONS_LOCK_POLL = 1.0
+
+_MODULE_NAME = re.compile(r'^m(\d{4})_\w+$')
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    statements: list[str]
+    indexes: list[tuple[str, str]]
+
+
+def load_migrations() -> list[Migration]:
+    """Все миграции пакета, по возрастанию версии."""
+    migrations = []
+    for module_info in pkgutil.iter_modules(_package_path()):
+        match = _MODULE_NAME.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__package__}.{module_info.name}")
+        if module.VERSION != int(match.group(1)):
+            raise ValueError(f"Миграция {module_info.name}: VERSION={module.VERSION} не совпадает с именем файла")
+        migrations.append(Migration(
+            version=module.VERSION,
+            name=module.NAME,
+            statements=list(getattr(module, 'STATEMENTS', [])),
+            indexes=list(getattr(module, 'INDEXES', [])),
+        ))
+    migrations.sort(key=lambda migration: migration.version)
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Повторяющиеся версии миграций: {versions}")
+    return migrations
+
+
+def _package_path() -> list[str]:
+    return list(importlib.import_module(__package__).__path__)
+
+
+async def create_index_concurrently(conn, name: str, statement: str):
+    """
+    CREATE INDEX CONCURRENTLY на соединении в режиме AUTOCOMMIT.
+    Прерванное построение оставляет невалидный индекс, который IF NOT EXISTS пропустил бы, -
+    такой индекс сначала удаляется.
+    """
+    invalid = (await conn.execute(text("""
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = :name AND n.nspname = current_schema()
+    """), {'name': name})).scalar()
+    # Простой протокол asyncpg: оператор гарантированно выполняется вне блока транзакции
+    driver_connection = (await conn.get_raw_connection()).driver_connection
+    if invalid:
+        logging.warning(f"Миграции: индекс {name} невалиден (прерванное построение) - пересоздаю")
+        await driver_connection.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+    await driver_connection.execute(statement)
+
+
+async def _acquire_lock(conn):
+    """
+    Берет блокировку миграций опросом pg_try_advisory_lock, а не ожиданием в pg_advisory_lock:
+    ждущий процесс держал бы снимок, а CREATE INDEX CONCURRENTLY у того, кто применяет миграции,
+    ждет завершения всех более старых снимков - получилась бы взаимная блокировка.
+    Между попытками у ждущего нет ни открытого запроса, ни снимка.
+    """
+    while not (await conn.execute(text("SELECT pg_try_advisory_lock(:lock_id)"),
+                                  {'lock_id': MIGRATIONS_LOCK_ID})).scalar():
+        await asyncio.sleep(MIGRATIONS_LOCK_POLL)
+
+
+async def migrate(engine) -> list[int]:
+    """Применяет новые миграции. Возвращает их версии."""
+    migrations = load_migrations()
+    applied_now = []
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level='AUTOCOMMIT')
+        await _acquire_lock(conn)
+        try:
+            await conn.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} (
+                    version INTEGER PRIMARY KEY,
+                    name VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT now()
+                )
+            """))
+            applied = set((await conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}"))).scalars())
+
+            for migration in migrations:
+                if migration.version in applied:
+                    continue
+                logging.info(f"Миграции: применяю {migration.version:04d}_{migration.name}")
+                record = text(f"INSERT INTO {MIGRATIONS_TABLE} (version, name) VALUES (:version, :name)")
+                record_params = {'version': migration.version, 'name': migration.name}
+                async with engine.begin() as transaction:
+                    for statement in migration.statements:
+                        await transaction.execute(text(statement))
+                    if not migration.indexes:
+                        await transaction.execute(record, record_params)
+                if migration.indexes:
+                    for name, statement in migration.indexes:
+                        await create_index_concurrently(conn, name, statement)
+                    await conn.execute(record, record_params)
+                applied_now.append(migration.version)
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {'lock_id': MIGRATIONS_LOCK_ID})
+    return applied_now
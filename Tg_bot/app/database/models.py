@@ -3,13 +3,15 @@
 import os
 from dotenv import load_dotenv
 
-from sqlalchemy.orm import DeclarativeBase, relationship
+from sqlalchemy.orm import DeclarativeBase, relationship, deferred
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
 from sqlalchemy import (
     Column, Integer, NullPool, String, Text, ForeignKey, TIMESTAMP, DECIMAL, BigInteger,
-    JSON, Boolean, text, Enum, inspect
+    JSON, Boolean, text, Enum, inspect, UniqueConstraint, Index, func
 )
 
+from .migrations import migrate
+
 # --- Настройка подключения (без изменений) ---
 load_dotenv()
 DB_HOST = os.getenv("DB_HOST")
@@ -71,14 +73,36 @@ class Artist(Base):
 
 class Venue(Base):
     __tablename__ = "venues"
-    # ... (без изменений)
+    __table_args__ = (
+        # Одно место на (город, нормализованное название); NULL - строки, еще не прошедшие merge_venues.py
+        Index('uq_venues_city_normalized_key', 'city_id', 'normalized_key', unique=True),
+    )
     venue_id = Column(Integer, primary_key=True)
     name = Column(String(500), nullable=False)
+    # Ключ из app/services/venues.normalize_venue_name: "Minsk Arena, Минск" и "Минск-Арена" -> "minsk arena"
+    normalized_key = Column(String(500), nullable=True)
     country_id = Column(Integer, ForeignKey("countries.country_id"), nullable=False)
     city_id = Column(Integer, ForeignKey("cities.city_id"), nullable=False)
     country = relationship("Country", back_populates="venues")
     city = relationship("City", back_populates="venues")
     events = relationship("Event", back_populates="venue")
+    aliases = relationship("VenueAlias", back_populates="venue", cascade="all, delete-orphan")
+
+
+# Другие написания места, которые нормализация сама не сводит к ключу места
+# ("Дворец Республики" / "Palace of the Republic") и ключи слитых дублей.
+class VenueAlias(Base):
+    __tablename__ = "venue_aliases"
+    __table_args__ = (
+        UniqueConstraint('city_id', 'alias_key', name='uq_venue_aliases_city_alias_key'),
+    )
+    alias_id = Column(Integer, primary_key=True)
+    venue_id = Column(Integer, ForeignKey("venues.venue_id", ondelete="CASCADE"), nullable=False, index=True)
+    city_id = Column(Integer, ForeignKey("cities.city_id"), nullable=False)
+    alias_key = Column(String(500), nullable=False)
+    # Исходное написание (для людей)
+    name = Column(String(500), nullable=False)
+    venue = relationship("Venue", back_populates="aliases")
 
 class Event(Base):
     __tablename__ = "events"
@@ -94,6 +118,9 @@ class Event(Base):
     price_max = Column(DECIMAL(10, 2))
     # НОВОЕ ПОЛЕ: для хранения информации о билетах (например, "Осталось мало", "Sold Out")
     tickets_info = Column(String(255), nullable=True)
+    # Нормализованные название + имена артистов для нечеткого поиска (find_events_fuzzy).
+    # Заполняется триггерами БД (migrations/m0001_baseline.py), из кода не пишется и без нужды не загружается
+    search_document = deferred(Column(Text))
     # Связи
     event_type = relationship("EventType", back_populates="events")
     venue = relationship("Venue", back_populates="events")
@@ -112,7 +139,10 @@ class EventArtist(Base):
 
 class EventLink(Base):
     __tablename__ = "event_links"
-    # ... (без изменений)
+    __table_args__ = (
+        # Ссылки пишутся пачкой через INSERT ... ON CONFLICT DO NOTHING (upsert_event_links)
+        Index('uq_event_links_event_url', 'event_id', 'url', unique=True),
+    )
     link_id = Column(Integer, primary_key=True)
     event_id = Column(Integer, ForeignKey("events.event_id", ondelete="CASCADE"), nullable=False)
     url = Column(String(1024), nullable=False)
@@ -165,6 +195,36 @@ class UserFavorite(Base):
     artist = relationship("Artist", back_populates="user_associations")
 
 
+# --- Очередь заданий парсера (run_crawl_worker.py) ---
+# Одно задание = одна страница конфига (список категории) или одна страница события.
+# Воркеры забирают задания через SELECT ... FOR UPDATE SKIP LOCKED и продлевают heartbeat_at,
+# пока задание выполняется; задания с "протухшим" heartbeat возвращаются в очередь.
+class CrawlJob(Base):
+    __tablename__ = 'crawl_jobs'
+    __table_args__ = (
+        # Одна и та же страница не ставится в очередь дважды в рамках одного прогона
+        UniqueConstraint('run_id', 'kind', 'config_key', 'url', name='uq_crawl_jobs_run_kind_config_url'),
+        Index('ix_crawl_jobs_claim', 'status', 'available_at'),
+    )
+    job_id = Column(BigInteger, primary_key=True)
+    run_id = Column(String(64), nullable=False)
+    # 'config' - обойти категорию целиком; 'event_url' - разобрать одну страницу события
+    kind = Column(String(20), nullable=False)
+    config_key = Column(String(255), nullable=False)
+    url = Column(String(1024), nullable=False)
+    status = Column(Enum('pending', 'running', 'done', 'failed', name='crawl_job_status_enum'),
+                    default='pending', nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    max_attempts = Column(Integer, default=3, nullable=False)
+    worker_id = Column(String(255), nullable=True)
+    available_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    heartbeat_at = Column(TIMESTAMP, nullable=True)
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    finished_at = Column(TIMESTAMP, nullable=True)
+    events_found = Column(Integer, nullable=True)
+    last_error = Column(Text, nullable=True)
+
+
 SQL_CREATE_TRIGGER_FUNCTION = """
 CREATE OR REPLACE FUNCTION notify_new_event()
 RETURNS TRIGGER AS $$
@@ -275,6 +335,10 @@ async def async_main():
         await conn.run_sync(Base.metadata.create_all)
     print("Таблицы успешно созданы или уже существуют.")
 
+    # Шаг 1.1: Версионные миграции (app/database/migrations): новые колонки, индексы, представления
+    applied = await migrate(engine)
+    print(f"Миграции схемы применены: {', '.join(map(str, applied)) or 'новых нет'}.")
+
     # Шаг 2: Создание/обновление функций и триггеров в одной атомарной транзакции.
     print("\nПроверка и создание функций и триггеров...")
     try:
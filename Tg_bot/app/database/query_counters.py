@@ -0,0 +1,44 @@
+# app/database/query_counters.py
+#
+# Счетчики обращений к БД в пределах одной единицы работы (апдейт бота - app/middlewares/db_session.py):
+# выдачи соединений из пула и запросы к БД (round trip). Кто ведет учет, кладет QueryCounters
+# в current_counters; события движка увеличивают их сами. Запросы мимо SQLAlchemy (asyncpg напрямую,
+# requests/requests_fast.py) событий движка не вызывают и учитываются явно через count_round_trip().
+
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from app.database.models import engine
+
+
+class QueryCounters:
+    __slots__ = ('checkouts', 'round_trips')
+
+    def __init__(self):
+        self.checkouts = 0
+        self.round_trips = 0
+
+
+# Контекст задачи наследуется greenlet'ами SQLAlchemy, поэтому события движка попадают
+# в счетчики той задачи, которая их вызвала
+current_counters: ContextVar[QueryCounters | None] = ContextVar('db_query_counters', default=None)
+
+
+def count_round_trip():
+    """Учитывает запрос к БД в текущих счетчиках (если учет не ведется - ничего не делает)."""
+    counters = current_counters.get()
+    if counters is not None:
+        counters.round_trips += 1
+
+
+@event.listens_for(engine.sync_engine, 'checkout')
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    counters = current_counters.get()
+    if counters is not None:
+        counters.checkouts += 1
+
+
+@event.listens_for(engine.sync_engine, 'before_cursor_execute')
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    count_round_trip()
@@ -0,0 +1,4 @@
+# app/database/requests/__init__.py
+#
+# Обычный пакет, а не пространство имен: иначе app/database/requests.py (старый модуль) перекрывает
+# пакет, и "from app.database.requests import requests" не находит модули этой папки.
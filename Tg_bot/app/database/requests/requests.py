@@ -1,30 +1,80 @@
 # app/database/requests.py
 
 import logging
-from sqlalchemy import select, delete, and_, or_, func, distinct, union, update
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from typing import NamedTuple
+from sqlalchemy import select, delete, and_, or_, func, distinct, union, update, text, bindparam
 from sqlalchemy.orm import selectinload, joinedload,undefer
-from sqlalchemy.dialects.postgresql import aggregate_order_by, array_agg
-from thefuzz import process as fuzzy_process, fuzz
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime
 
 from ..models import (
     UserFavorite, async_session, User, Subscription, Event, Artist, Venue, EventLink,
     EventType, EventArtist, Country, City
 )
+from .requests_venues import VenueResolver
+from app.services.artist_index import artist_index, ArtistMatch
+from app.services import city_catalog, reference_data
 
 SIMILARITY_THRESHOLD = 85
+# Пороги pg_trgm (0..1). Фильтр идет операторами % и %>, которые используют триграммные индексы
+# с порогами pg_trgm.similarity_threshold (0.3) и pg_trgm.word_similarity_threshold (0.6);
+# наши пороги не ниже этих значений, иначе пришлось бы менять настройку сессии
+TRGM_SIMILARITY_THRESHOLD = 0.3
+TRGM_WORD_SIMILARITY_THRESHOLD = 0.6
+EVENT_SEARCH_LIMIT = 50
+# Сколько последних id артистов перечитывать при пополнении индекса (см. load_artist_index)
+ARTIST_INDEX_LOOKBACK = 1000
+
+
+def normalize_search_text(value: str) -> str:
+    """То же, что SQL-функция normalize_search_text (по ней строится events.search_document)."""
+    return ' '.join(value.lower().replace('ё', 'е').split())
+
+
+@asynccontextmanager
+async def session_scope(session=None):
+    """
+    Сессия для функции чтения: переданная (сессия апдейта из DbSessionMiddleware -
+    app/middlewares/db_session.py) или своя, на время вызова.
+    Общая сессия после чтения закрывается (end_read): иначе транзакция, начатая первым запросом,
+    висит "idle in transaction" с соединением из пула до конца хэндлера, включая вызовы Telegram API.
+    """
+    if session is not None:
+        try:
+            yield session
+        finally:
+            await end_read(session)
+        return
+    async with async_session() as own_session:
+        yield own_session
+
+
+async def end_read(session):
+    """
+    Завершает транзакцию чтения сессии апдейта и возвращает соединение в пул.
+    close(), а не commit(): прочитанные объекты отсоединяются, но не истекают - их поля
+    доступны и без повторного запроса. Следующий запрос через сессию возьмет соединение заново.
+    Сессию с несохраненными изменениями не трогает.
+    """
+    if session.in_transaction() and not (session.new or session.dirty or session.deleted):
+        await session.close()
 
 
 async def get_or_create(session, model, **kwargs):
+    """
+    Для моделей с уникальным ключом из kwargs (Country, EventType, Artist - по name).
+    Слоты и воркеры парсера параллельно создают одни и те же имена: вставка идет через
+    ON CONFLICT DO NOTHING (при гонке ждет чужую транзакцию и ничего не вставляет), и строка
+    перечитывается. Обычный INSERT падал бы IntegrityError и обрывал транзакцию всей пачки событий.
+    """
     instance = await session.execute(select(model).filter_by(**kwargs))
     instance = instance.scalar_one_or_none()
     if instance:
         return instance
-    else:
-        instance = model(**kwargs)
-        session.add(instance)
-        await session.flush()
-        return instance
+    await session.execute(pg_insert(model).values(**kwargs).on_conflict_do_nothing())
+    return (await session.execute(select(model).filter_by(**kwargs))).scalar_one()
 
 async def get_or_create_user(session, user_id: int, username: str = None, lang_code: str = 'en'):
     result = await session.execute(select(User).where(User.user_id == user_id))
@@ -39,8 +89,8 @@ async def get_or_create_user(session, user_id: int, username: str = None, lang_c
         await session.commit()
     return user
 
-async def get_user_lang(user_id):
-    async with async_session() as session:
+async def get_user_lang(user_id, session=None):
+    async with session_scope(session) as session:
         result = await session.execute(
             select(User.language_code)
             .where(User.user_id == user_id)
@@ -67,8 +117,8 @@ async def update_user_preferences(user_id: int, home_country: str, home_city: st
         await session.execute(stmt)
         await session.commit()
 
-async def get_user_preferences(user_id: int) -> dict | None:
-    async with async_session() as session:
+async def get_user_preferences(user_id: int, session=None) -> dict | None:
+    async with session_scope(session) as session:
         result = await session.execute(
             select(User.home_city, User.preferred_event_types, User.home_country)
             .where(User.user_id == user_id)
@@ -82,9 +132,24 @@ async def get_user_preferences(user_id: int) -> dict | None:
             }
         return None
 
-async def get_user_favorites(user_id: int) -> list[Artist]:
+async def get_user_settings(user_id: int, session=None):
+    """
+    Все настройки пользователя одной строкой (для UserContext - app/middlewares/db_session.py):
+    язык, домашняя география, типы событий, флаги онбординга, общая мобильность. None - пользователя нет.
+    """
+    async with session_scope(session) as session:
+        result = await session.execute(
+            select(
+                User.language_code, User.home_country, User.home_city, User.preferred_event_types,
+                User.main_geo_completed, User.general_geo_completed, User.general_mobility_regions
+            )
+            .where(User.user_id == user_id)
+        )
+        return result.first()
+
+async def get_user_favorites(user_id: int, session=None) -> list[Artist]:
     """Получает список всех "Объектов интереса" (Артистов) из избранного пользователя."""
-    async with async_session() as session:
+    async with session_scope(session) as session:
         # ИЗМЕНЕНИЕ: Используем явное условие для JOIN
         stmt = (
             select(Artist)
@@ -140,15 +205,15 @@ async def remove_artist_from_favorites(user_id: int, artist_id: int):
         await session.execute(delete_fav_stmt)
         await session.commit()
 
-async def check_main_geo_status(user_id: int) -> bool:
+async def check_main_geo_status(user_id: int, session=None) -> bool:
     """Проверяет, проходил ли пользователь ОСНОВНОЙ онбординг (для Афиши)."""
-    async with async_session() as session:
+    async with session_scope(session) as session:
         result = await session.execute(select(User.main_geo_completed).where(User.user_id == user_id))
         return result.scalar_one_or_none() or False
 
-async def check_general_geo_onboarding_status(user_id: int) -> bool:
+async def check_general_geo_onboarding_status(user_id: int, session=None) -> bool:
     """Проверяет, проходил ли пользователь онбординг ОБЩЕЙ мобильности (для Подписок)."""
-    async with async_session() as session:
+    async with session_scope(session) as session:
         result = await session.execute(select(User.general_geo_completed).where(User.user_id == user_id))
         return result.scalar_one_or_none() or False
 
@@ -160,9 +225,9 @@ async def set_general_geo_onboarding_completed(user_id: int):
             user.general_geo_completed = True
             await session.commit()
 
-async def get_general_mobility(user_id: int) -> list | None:
+async def get_general_mobility(user_id: int, session=None) -> list | None:
     """Получает список регионов из общей мобильности пользователя (из поля User.general_mobility_regions)."""
-    async with async_session() as session:
+    async with session_scope(session) as session:
         stmt = select(User.general_mobility_regions).where(User.user_id == user_id)
         result = await session.execute(stmt)
         regions_data = result.scalar_one_or_none()
@@ -176,9 +241,9 @@ async def set_general_mobility(user_id: int, regions: list):
             user.general_mobility_regions = regions
             await session.commit()
 
-async def get_user_subscriptions(user_id: int) -> list[Event]:
+async def get_user_subscriptions(user_id: int, session=None) -> list[Event]:
     """ИЗМЕНЕНИЕ: Получает список всех СОБЫТИЙ, на которые подписан пользователь."""
-    async with async_session() as session:
+    async with session_scope(session) as session:
         stmt = (
             select(Event)
             .join(Subscription)
@@ -233,61 +298,111 @@ async def set_subscription_status(user_id: int, event_id: int, status: str):
         await session.execute(stmt)
         await session.commit()
 
-async def find_artists_fuzzy(query: str, limit: int = 5) -> list[Artist]:
-    """ИЗМЕНЕНИЕ: Возвращает полные объекты Artist, а не просто имена."""
+async def load_artist_index(full: bool = False):
+    """
+    Загружает в индекс артистов (app/services/artist_index.py) всех, кого там еще нет.
+    id выдается при flush, а виден становится при commit: артист из долгой транзакции парсера
+    может появиться уже после артистов с большими id. Поэтому перечитываются и последние
+    ARTIST_INDEX_LOOKBACK id (повторы add пропускает), а full=True (по расписанию, редко)
+    перечитывает всех - на случай транзакций длиннее этого окна.
+    """
+    min_artist_id = 0 if full else artist_index.max_artist_id - ARTIST_INDEX_LOOKBACK
     async with async_session() as session:
-        result = await session.execute(select(Artist))
-        all_artists = result.scalars().all()
-        # Создаем словарь "имя -> объект" для быстрого доступа
-        artist_map = {artist.name: artist for artist in all_artists}
-        
-        found = fuzzy_process.extract(query, artist_map.keys(), limit=limit)
-        
-        # Возвращаем объекты Artist для совпадений выше порога
-        matches = [artist_map[artist_name] for artist_name, score in found if score >= SIMILARITY_THRESHOLD]
-        return matches
+        result = await session.execute(
+            select(Artist.artist_id, Artist.name)
+            .where(Artist.artist_id > min_artist_id)
+            .order_by(Artist.artist_id)
+        )
+        rows = result.all()
+    indexed_before = len(artist_index)
+    artist_index.add_many(rows)
+    artist_index.loaded = True
+    if len(artist_index) > indexed_before:
+        logging.info(f"Индекс артистов: добавлено {len(artist_index) - indexed_before}, всего {len(artist_index)}")
+    return len(rows)
+
+
+async def find_artists_fuzzy(query: str, limit: int = 5) -> list[ArtistMatch]:
+    """
+    Ищет артистов по имени в индексе в памяти, без запроса к БД.
+    Если индекс в этом процессе не загружен (бот грузит его при старте) - триграммный поиск в БД.
+    Возвращает ArtistMatch (artist_id, name, score) для совпадений выше порога.
+    """
+    if not artist_index.loaded:
+        return await find_artists_trgm(query, limit=limit)
+    return artist_index.search(query, limit=limit, score_cutoff=SIMILARITY_THRESHOLD)
+
+
+async def find_artists_trgm(query: str, limit: int = 5) -> list[ArtistMatch]:
+    """Поиск артистов в БД по similarity() (pg_trgm): из БД приходят только limit лучших."""
+    score = func.similarity(Artist.name, query)
+    async with async_session() as session:
+        result = await session.execute(
+            select(Artist.artist_id, Artist.name, score.label('score'))
+            .where(Artist.name.op('%')(query), score >= TRGM_SIMILARITY_THRESHOLD)
+            .order_by(score.desc(), Artist.name)
+            .limit(limit)
+        )
+        return [ArtistMatch(row.artist_id, row.name, row.score * 100) for row in result]
 
 async def get_countries(home_country_selection: bool = False):
     if home_country_selection:
         return ["Беларусь", "Россия"]
 
+    # Справочник из кэша процесса (сбрасывается по NOTIFY при изменении countries)
+    return list(await reference_data.get_or_load('countries', _load_countries, tables=('countries',)))
+
+async def _load_countries() -> list[str]:
     async with async_session() as session:
         result = await session.execute(select(Country.name).order_by(Country.name))
         return result.scalars().all()
 
+async def get_event_type_ids() -> dict[str, int]:
+    """Типы событий: название -> type_id (из кэша процесса)."""
+    return await reference_data.get_or_load('event_types', _load_event_types, tables=('event_types',))
+
+async def _load_event_types() -> dict[str, int]:
+    async with async_session() as session:
+        result = await session.execute(select(EventType.name, EventType.type_id))
+        return {row.name: row.type_id for row in result}
+
 async def get_top_cities_for_country(country_name: str, limit: int = 6):
     if country_name == "Беларусь":
         # Если запросили Беларусь, возвращаем заранее определенный список
         return ["Минск", "Брест", "Витебск", "Гомель", "Гродно", "Могилев"]
 
     # --- СТАРАЯ ЛОГИКА ДЛЯ ВСЕХ ОСТАЛЬНЫХ СТРАН ---
+    catalog = await load_city_catalog(country_name)
+    return catalog.top(limit)
+
+async def load_city_catalog(country_name: str) -> city_catalog.CityCatalog:
+    """Каталог городов страны из кэша процесса; при первом обращении (или после изменения cities) - из БД."""
+    catalog = city_catalog.get(country_name)
+    if catalog is not None:
+        return catalog
+    loaded_generation = city_catalog.generation()
     async with async_session() as session:
         result = await session.execute(
-            select(City.name)
+            select(City.city_id, City.name)
             .join(Country)
             .where(Country.name == country_name)
             .order_by(City.city_id)
-            .limit(limit)
         )
-        return result.scalars().all()
+        catalog = city_catalog.CityCatalog(result.all())
+    city_catalog.store(country_name, catalog, loaded_generation)
+    return catalog
 
 async def find_cities_fuzzy(country_name: str, query: str, limit: int = 3):
-    async with async_session() as session:
-        result = await session.execute(
-            select(City.name).join(Country).where(Country.name == country_name)
-        )
-        all_cities = result.scalars().all()
-        if not all_cities:
-            return []
-        found = fuzzy_process.extract(query, all_cities, limit=limit)
-        best_matches = [city[0] for city in found if city[1] >= 85]
-        return best_matches
+    """Города страны, похожие на query: сначала по началу названия, затем нечетко. Без запроса к БД, если каталог уже загружен."""
+    catalog = await load_city_catalog(country_name)
+    return catalog.search(query, limit=limit, score_cutoff=SIMILARITY_THRESHOLD)
 
 async def find_events_fuzzy(
     query: str, 
     user_regions: list = None,
     date_from: datetime = None,
-    date_to: datetime = None
+    date_to: datetime = None,
+    limit: int = EVENT_SEARCH_LIMIT
 ):
     """
     Нечеткий поиск событий с фильтрацией по региону и дате.
@@ -332,6 +447,8 @@ async def find_events_fuzzy(
             stmt = stmt.join(Event.venue).join(Venue.city).join(City.country).where(*region_conditions)
         if date_conditions:
             stmt = stmt.where(*date_conditions)
+        # ILIKE '%...%' тоже обслуживается триграммными индексами
+        stmt = stmt.order_by(Event.date_start.asc().nulls_last()).limit(limit)
         
         result = await session.execute(stmt)
         events = result.scalars().unique().all()
@@ -340,36 +457,40 @@ async def find_events_fuzzy(
         if events:
             return events
 
-        # --- Этап 2: Медленный, но полный нечеткий поиск (если быстрый не сработал) ---
-        all_events_stmt = (
+        # --- Этап 2: Нечеткий поиск по поисковому документу события (если быстрый не сработал) ---
+        # events.search_document = название + имена артистов (поддерживается триггерами БД).
+        # Кандидатов отбирает триграммный индекс (оператор %>), оценку word_similarity - аналог
+        # partial_ratio - считает БД; загружаются с артистами и ссылками только limit лучших событий
+        search_text = normalize_search_text(query)
+        document_score = func.word_similarity(search_text, Event.search_document)
+        candidates = (
+            select(Event.event_id, Event.date_start, document_score.label('score'))
+            .where(Event.search_document.op('%>')(search_text), document_score >= TRGM_WORD_SIMILARITY_THRESHOLD)
+        )
+        if region_conditions:
+            candidates = candidates.join(Event.venue).join(Venue.city).join(City.country).where(*region_conditions)
+        if date_conditions:
+            candidates = candidates.where(*date_conditions)
+        candidates = (
+            candidates
+            .order_by(document_score.desc(), Event.date_start.asc().nulls_last())
+            .limit(limit)
+            .subquery()
+        )
+
+        fuzzy_stmt = (
             select(Event)
             .options(
                 selectinload(Event.venue).selectinload(Venue.city).selectinload(City.country),
                 selectinload(Event.links),
                 selectinload(Event.artists).selectinload(EventArtist.artist)
             )
+            .join(candidates, Event.event_id == candidates.c.event_id)
+            .order_by(candidates.c.score.desc(), candidates.c.date_start.asc().nulls_last())
         )
-        
-        # Применяем фильтры к полному списку событий
-        if region_conditions:
-            all_events_stmt = all_events_stmt.join(Event.venue).join(Venue.city).join(City.country).where(*region_conditions)
-        if date_conditions:
-            all_events_stmt = all_events_stmt.where(*date_conditions)
-            
-        all_events_result = await session.execute(all_events_stmt)
-        all_events = all_events_result.scalars().unique().all()
-
-        matches = []
-        search_query_lower = query.lower()
-        for event in all_events:
-            title_score = fuzz.partial_ratio(search_query_lower, event.title.lower())
-            artist_scores = [fuzz.partial_ratio(search_query_lower, ea.artist.name.lower()) for ea in event.artists]
-            max_score = max([title_score] + artist_scores) if artist_scores else title_score
-            if max_score >= SIMILARITY_THRESHOLD:
-                matches.append((event, max_score))
-        
-        matches.sort(key=lambda x: x[1], reverse=True)
-        return [match[0] for match in matches]
+        result = await session.execute(fuzzy_stmt)
+        return result.scalars().all()
+
 
 async def get_events_for_artists(artist_names: list[str], regions: list[str]) -> list[Event]:
     """
@@ -410,13 +531,15 @@ async def get_events_for_artists(artist_names: list[str], regions: list[str]) ->
         return result.scalars().all()
 
 async def get_cities_for_category(category_name: str, user_regions: list):
+    type_id = (await get_event_type_ids()).get(category_name)
+    if type_id is None:
+        return []
     async with async_session() as session:
         stmt = (
             select(distinct(City.name))
             .join(Venue, City.city_id == Venue.city_id)
             .join(Event, Venue.venue_id == Event.venue_id)
-            .join(EventType, Event.type_id == EventType.type_id)
-            .where(EventType.name == category_name)
+            .where(Event.type_id == type_id)
             .order_by(City.name)
         )
         if user_regions:
@@ -437,50 +560,112 @@ async def get_grouped_events_by_city_and_category(
     Получает сгруппированные события с фильтрацией по дате.
     Возвращает event_id и category_name.
     """
-    async with async_session() as session:
-        # Основа запроса
-        stmt = (
-            select(
-                (func.array_agg(aggregate_order_by(Event.event_id, Event.date_start.asc())))[1].label("event_id"),
-                Event.title,
-                EventType.name.label("category_name"),
-                Venue.name.label("venue_name"),
-                array_agg(aggregate_order_by(Event.date_start, Event.date_start.asc())).label("dates"),
-                array_agg(aggregate_order_by(EventLink.url, Event.date_start.asc())).label("links"),
-                func.min(Event.price_min).label("min_price"),
-                func.max(Event.price_max).label("max_price")
-            )
-            .join(Venue, Event.venue_id == Venue.venue_id)
-            .join(City, Venue.city_id == City.city_id)
-            .join(EventType, Event.type_id == EventType.type_id)
-            .outerjoin(EventLink, Event.event_id == EventLink.event_id)
-        )
-
-        # Формируем условия фильтрации (WHERE)
-        conditions = [
-            City.name == city_name,
-            EventType.name == category
-        ]
-        if date_from:
-            # Условие "больше или равно" для даты начала
-            conditions.append(Event.date_start >= date_from)
-        if date_to:
-            # Чтобы включить весь конечный день, ищем до начала следующего дня
-            end_of_day = date_to.replace(hour=23, minute=59, second=59)
-            conditions.append(Event.date_start <= end_of_day)
+    events_by_category = await get_grouped_events_by_city_and_categories(city_name, [category], date_from, date_to)
+    return events_by_category.get(category, [])
+
+class AfishaSeries(NamedTuple):
+    """Группа событий афиши - те же поля, что у строк прежнего GROUP BY-запроса."""
+    event_id: int
+    title: str
+    category_name: str
+    venue_name: str
+    dates: list
+    links: list
+    min_price: Decimal | None
+    max_price: Decimal | None
+
+
+async def get_grouped_events_by_city_and_categories(
+    city_name: str,
+    categories: list[str],
+    date_from: datetime = None,
+    date_to: datetime = None,
+    limit_per_category: int = 20,
+    session=None
+) -> dict[str, list[AfishaSeries]]:
+    """
+    То же для нескольких категорий сразу - одним запросом к материализованному представлению
+    afisha_event_series (индекс city_name, category_name, first_date). Группы нумеруются внутри
+    своей категории по первой дате в периоде (row_number() OVER (PARTITION BY ...)),
+    отбираются первые limit_per_category.
+    Возвращает {категория: [AfishaSeries]} в порядке categories, без пустых категорий.
+    """
+    if not categories:
+        return {}
+    # Чтобы включить весь конечный день, ищем до конца дня
+    end_of_day = date_to.replace(hour=23, minute=59, second=59) if date_to else None
+
+    # Условия периода добавляются только когда он задан - иначе индекс по first_date не используется
+    series_conditions, date_conditions = [], []
+    params = {'city_name': city_name, 'categories': list(categories), 'limit': limit_per_category}
+    if date_from:
+        series_conditions.append("last_date >= :date_from")
+        date_conditions.append("d >= :date_from")
+        params['date_from'] = date_from
+    if end_of_day:
+        series_conditions.append("first_date <= :date_to")
+        date_conditions.append("d <= :date_to")
+        params['date_to'] = end_of_day
+    series_where = "".join(f" AND {condition}" for condition in series_conditions)
+    date_where = " AND ".join(date_conditions) or "TRUE"
+
+    stmt = text(f"""
+        SELECT event_ids, title, category_name, venue_name, dates, links, prices_min, prices_max
+        FROM (
+            SELECT s.*,
+                   row_number() OVER (PARTITION BY category_name ORDER BY sort_date ASC NULLS LAST) AS position
+            FROM (
+                SELECT event_ids, title, category_name, venue_name, dates, links, prices_min, prices_max,
+                       (SELECT min(d) FROM unnest(dates) AS d WHERE {date_where}) AS sort_date
+                FROM afisha_event_series
+                WHERE city_name = :city_name AND category_name IN :categories{series_where}
+            ) AS s
+            {"WHERE s.sort_date IS NOT NULL" if date_conditions else ""}
+        ) AS ranked
+        WHERE position <= :limit
+        ORDER BY category_name, position
+    """).bindparams(bindparam('categories', expanding=True))
+
+    async with session_scope(session) as session:
+        rows = (await session.execute(stmt, params)).all()
+
+    events_by_category = {category: [] for category in categories}
+    for row in rows:
+        events_by_category[row.category_name].append(trim_afisha_series(*row, date_from=date_from, date_to=end_of_day))
+    return {category: events for category, events in events_by_category.items() if events}
+
+
+def trim_afisha_series(event_ids, title, category_name, venue_name, dates, links, prices_min, prices_max,
+                       date_from: datetime = None, date_to: datetime = None) -> AfishaSeries:
+    """
+    Строка afisha_event_series (колонки в порядке SELECT выше) -> AfishaSeries
+    только с событиями серии, попавшими в период.
+    """
+    indexes = [
+        i for i, date in enumerate(dates)
+        if (date_from is None or (date is not None and date >= date_from))
+        and (date_to is None or (date is not None and date <= date_to))
+    ]
+    period_prices_min = [prices_min[i] for i in indexes if prices_min[i] is not None]
+    period_prices_max = [prices_max[i] for i in indexes if prices_max[i] is not None]
+    return AfishaSeries(
+        event_id=event_ids[indexes[0]],
+        title=title,
+        category_name=category_name,
+        venue_name=venue_name,
+        dates=[dates[i] for i in indexes],
+        # Афиша берет первую ссылку - события серии без ссылки пропускаем
+        links=[links[i] for i in indexes if links[i]],
+        min_price=min(period_prices_min) if period_prices_min else None,
+        max_price=max(period_prices_max) if period_prices_max else None,
+    )
 
-        # Применяем все условия
-        stmt = stmt.where(and_(*conditions))
 
-        # Группировка и сортировка
-        stmt = (
-            stmt.group_by(Event.title, Venue.name, EventType.name)
-            .order_by(func.min(Event.date_start).asc().nulls_last())
-            .limit(20)
-        )
-        
-        result = await session.execute(stmt)
-        return result.all()
+async def refresh_afisha_series():
+    """Пересчитывает afisha_event_series (CONCURRENTLY - чтение афиши при этом не блокируется)."""
+    async with async_session() as session:
+        await session.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY afisha_event_series"))
+        await session.commit()
 
 
 # --- ФУНКЦИИ ДЛЯ УВЕДОМЛЕНИЙ ---
@@ -560,6 +745,14 @@ async def get_or_create_city_and_country(session, city_name: str, country_name:
         )
     )
     city_obj = (await session.execute(city_stmt)).scalar_one_or_none()
+    if city_obj is None:
+        # У cities нет уникального ключа (name, country_id), поэтому ON CONFLICT не подходит:
+        # создание города сериализуется блокировкой до конца транзакции, и после нее город ищется снова -
+        # параллельный воркер мог уже создать его
+        await session.execute(
+            select(func.pg_advisory_xact_lock(func.hashtext(f"cities:{country_obj.country_id}:{city_name}")))
+        )
+        city_obj = (await session.execute(city_stmt)).scalar_one_or_none()
 
     if city_obj:
         # Город в нужной стране найден
@@ -581,12 +774,12 @@ async def get_subscribers_for_event_title(event_title: str) -> list[int]:
         user_ids = result.scalars().all()
         return list(user_ids)
     
-async def get_subscription_details(user_id: int, event_id: int) -> Subscription | None:
+async def get_subscription_details(user_id: int, event_id: int, session=None) -> Subscription | None:
     """
     Получает полную информацию о конкретной подписке пользователя
     по user_id и event_id.
     """
-    async with async_session() as session:
+    async with session_scope(session) as session:
         stmt = select(Subscription).where(
             and_(
                 Subscription.user_id == user_id,
@@ -618,9 +811,51 @@ async def find_event_by_signature(session, title: str, date_start: datetime) ->
     result = await session.execute(stmt)
     return result.scalar_one_or_none()
 
-async def update_event_details(session, event_id: int, event_data: dict):
+
+async def lock_event_signature(session, title: str, date_start: datetime):
+    """
+    Блокировка сигнатуры события (название + дата начала) до конца транзакции.
+    У events нет уникального ключа, поэтому ON CONFLICT не подходит: воркеры, одновременно разбирающие
+    одну и ту же страницу (она стоит в очереди под каждым конфигом, где встречается), иначе оба
+    не нашли бы событие и оба создали его. После блокировки событие нужно искать снова.
+    """
+    await session.execute(
+        select(func.pg_advisory_xact_lock(func.hashtext(f"events:{title}:{date_start.isoformat()}")))
+    )
+
+# Строк в одном INSERT: 3 параметра на строку, у asyncpg лимит 32767 параметров на запрос
+EVENT_LINKS_BATCH_SIZE = 5000
+
+
+async def upsert_event_links(session, links) -> int:
+    """
+    Записывает ссылки событий пачкой: links - итерируемое из (event_id, url, type).
+    Уже существующие пары (event_id, url) пропускаются (уникальный индекс uq_event_links_event_url).
+    Один INSERT на EVENT_LINKS_BATCH_SIZE ссылок. Возвращает число добавленных ссылок.
+    """
+    rows = {}
+    for event_id, url, link_type in links:
+        if event_id is not None and url:
+            rows.setdefault((event_id, url), {'event_id': event_id, 'url': url, 'type': link_type})
+    rows = list(rows.values())
+
+    added = 0
+    for start in range(0, len(rows), EVENT_LINKS_BATCH_SIZE):
+        stmt = (
+            pg_insert(EventLink)
+            .values(rows[start:start + EVENT_LINKS_BATCH_SIZE])
+            .on_conflict_do_nothing(index_elements=['event_id', 'url'])
+            .returning(EventLink.link_id)
+        )
+        added += len((await session.execute(stmt)).all())
+    return added
+
+
+async def update_event_details(session, event_id: int, event_data: dict, link_batch: list | None = None):
     """
     Обновляет ключевую информацию для СУЩЕСТВУЮЩЕГО события (цены, билеты).
+    link_batch - список, куда откладывается ссылка для общего upsert_event_links в конце прогона;
+    без него ссылка пишется сразу (одним INSERT ... ON CONFLICT DO NOTHING).
     """
     await session.execute(
         update(Event)
@@ -632,20 +867,22 @@ async def update_event_details(session, event_id: int, event_data: dict):
         )
     )
     
-    # Также обновим или добавим ссылку на покупку, если она новая
+    # Также добавим ссылку на покупку, если она новая (дубли отсекает уникальный индекс)
     link_url = event_data.get('link')
     if link_url:
-        link_stmt = select(EventLink).where(and_(EventLink.event_id == event_id, EventLink.url == link_url))
-        existing_link = (await session.execute(link_stmt)).scalar_one_or_none()
-        if not existing_link:
-            new_link = EventLink(event_id=event_id, url=link_url, type="bilety")
-            session.add(new_link)
+        if link_batch is not None:
+            link_batch.append((event_id, link_url, "bilety"))
+        elif await upsert_event_links(session, [(event_id, link_url, "bilety")]):
             print(f"  - Добавлена новая ссылка для события ID {event_id}")
 
-async def create_event_with_artists(session, event_data: dict, artist_names: list[str]) -> Event | None:
+async def create_event_with_artists(session, event_data: dict, artist_names: list[str],
+                                    venue_resolver: VenueResolver | None = None,
+                                    link_batch: list | None = None) -> Event | None:
     """
     Создает новое событие и все его связи (место, артисты, ссылка).
     Теперь корректно работает со страной и городом.
+    Место ищется по нормализованному названию; venue_resolver - кэш мест на весь прогон парсера.
+    link_batch - как в update_event_details: ссылка откладывается для общего upsert_event_links.
     """
     try:
         # 1. Получаем/создаем связанные сущности
@@ -658,17 +895,20 @@ async def create_event_with_artists(session, event_data: dict, artist_names: lis
             country_name=event_data['country_name'] # Передаем имя страны
         )
         
-        # Создаем Venue с правильными ID города и страны
-        venue_obj = await get_or_create(session, Venue, 
-                                    name=event_data['venue'], 
-                                    city_id=city_obj.city_id,
-                                    country_id=country_obj.country_id) # <--- ВОТ ОНО!
+        # Место: "Минск-Арена" и "Minsk Arena, Минск" - одна строка в venues (requests_venues.py)
+        venue_id = await (venue_resolver or VenueResolver()).resolve(
+            session,
+            name=event_data['venue'],
+            city_name=city_obj.name,
+            city_id=city_obj.city_id,
+            country_id=country_obj.country_id,
+        )
 
         # 2. Создаем само событие
         new_event = Event(
             title=event_data['event_title'],
             description=event_data.get('time'), 
-            venue_id=venue_obj.venue_id,
+            venue_id=venue_id,
             type_id=event_type_obj.type_id,
             date_start=event_data.get('timestamp'),
             price_min=event_data.get('price_min'),
@@ -680,8 +920,10 @@ async def create_event_with_artists(session, event_data: dict, artist_names: lis
 
         # 3. Создаем ссылку на покупку
         if event_data.get('link'):
-            event_url_link = EventLink(event_id=new_event.event_id, url=event_data['link'], type="bilety")
-            session.add(event_url_link)
+            if link_batch is not None:
+                link_batch.append((new_event.event_id, event_data['link'], "bilety"))
+            else:
+                session.add(EventLink(event_id=new_event.event_id, url=event_data['link'], type="bilety"))
 
         # 4. Работа с артистами
         if artist_names:
@@ -709,9 +951,9 @@ async def create_event_with_artists(session, event_data: dict, artist_names: lis
         result = await session.get(Event, event_id)
         return result
     
-async def get_favorite_details(user_id: int, artist_id: int) -> UserFavorite | None:
+async def get_favorite_details(user_id: int, artist_id: int, session=None) -> UserFavorite | None:
     """Получает детали одной записи из избранного (включая регионы)."""
-    async with async_session() as session:
+    async with session_scope(session) as session:
         stmt = select(UserFavorite).where(
             and_(UserFavorite.user_id == user_id, UserFavorite.artist_id == artist_id)
         )
@@ -813,7 +1055,10 @@ async def get_or_create_artists_by_name(names: list[str]) -> list[dict]:
         # --- КЛЮЧЕВОЕ ИЗМЕНЕНИЕ ---
         # Сразу же преобразуем объекты в словари, пока сессия еще жива
         result_dicts = [artist.to_dict() for artist in final_artist_list]
+        new_artist_rows = [(artist.artist_id, artist.name) for artist in new_artists]
         
         await session.commit()
+        # Новые артисты сразу доступны поиску (find_artists_fuzzy)
+        artist_index.add_many(new_artist_rows)
         
         return result_dicts
\ No newline at end of file
@@ -0,0 +1,187 @@
+# app/database/requests/requests_crawl_jobs.py
+#
+# Очередь заданий парсера на Postgres (таблица crawl_jobs).
+# Любое число воркеров (на одной или нескольких машинах) забирает задания через
+# FOR UPDATE SKIP LOCKED: заблокированные строки просто пропускаются, поэтому воркеры
+# не ждут друг друга и не получают одно задание дважды.
+# Все отметки времени берутся с часов сервера БД (now()), чтобы расхождение часов
+# между машинами воркеров не влияло на поиск зависших заданий.
+
+from datetime import timedelta
+from typing import NamedTuple
+
+from sqlalchemy import select, update, and_, or_, func
+from sqlalchemy.dialects.postgresql import insert
+
+from ..models import async_session, CrawlJob
+
+# Задание считается зависшим, если воркер не продлевал heartbeat дольше этого времени
+STALL_TIMEOUT = timedelta(minutes=5)
+# Пауза перед повтором упавшего задания: RETRY_BASE_DELAY * 2^(попытка-1)
+RETRY_BASE_DELAY = timedelta(seconds=30)
+
+
+class ClaimedJob(NamedTuple):
+    """Задание, выданное воркеру (отвязано от сессии - можно держать сколько угодно)."""
+    job_id: int
+    run_id: str
+    kind: str
+    config_key: str
+    url: str
+    attempts: int
+
+
+async def enqueue_jobs(run_id: str, kind: str, config_key: str, urls: list[str], max_attempts: int = 3) -> int:
+    """
+    Ставит задания в очередь. Повторная постановка той же страницы в рамках прогона игнорируется.
+    Возвращает число реально добавленных заданий.
+    """
+    if not urls:
+        return 0
+    async with async_session() as session:
+        stmt = (
+            insert(CrawlJob)
+            .values([
+                {'run_id': run_id, 'kind': kind, 'config_key': config_key, 'url': url, 'max_attempts': max_attempts}
+                for url in urls
+            ])
+            .on_conflict_do_nothing(constraint='uq_crawl_jobs_run_kind_config_url')
+            .returning(CrawlJob.job_id)
+        )
+        result = await session.execute(stmt)
+        added = len(result.all())
+        await session.commit()
+        return added
+
+
+async def claim_jobs(worker_id: str, limit: int = 1) -> list[ClaimedJob]:
+    """
+    Забирает до limit готовых к выполнению заданий и помечает их как 'running' за этим воркером.
+    Строки, которые прямо сейчас забирает другой воркер, пропускаются (SKIP LOCKED).
+    Выбор и пометка - один запрос UPDATE ... WHERE job_id IN (SELECT ... FOR UPDATE SKIP LOCKED).
+    """
+    claimable = (
+        select(CrawlJob.job_id)
+        .where(and_(CrawlJob.status == 'pending', CrawlJob.available_at <= func.now()))
+        .order_by(CrawlJob.available_at, CrawlJob.job_id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .scalar_subquery()
+    )
+    stmt = (
+        update(CrawlJob)
+        .where(CrawlJob.job_id.in_(claimable))
+        .values(status='running', worker_id=worker_id, attempts=CrawlJob.attempts + 1, heartbeat_at=func.now())
+        .returning(CrawlJob.job_id, CrawlJob.run_id, CrawlJob.kind, CrawlJob.config_key, CrawlJob.url, CrawlJob.attempts)
+        .execution_options(synchronize_session=False)
+    )
+    async with async_session() as session:
+        jobs = [ClaimedJob(*row) for row in (await session.execute(stmt)).all()]
+        await session.commit()
+        return jobs
+
+
+async def heartbeat_jobs(worker_id: str, job_ids: list[int]) -> int:
+    """Продлевает аренду заданий воркера. Возвращает число заданий, которые все еще за ним."""
+    if not job_ids:
+        return 0
+    async with async_session() as session:
+        result = await session.execute(
+            update(CrawlJob)
+            .where(and_(
+                CrawlJob.job_id.in_(job_ids),
+                CrawlJob.worker_id == worker_id,
+                CrawlJob.status == 'running',
+            ))
+            .values(heartbeat_at=func.now())
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def complete_job(job_id: int, worker_id: str, events_found: int | None = None) -> bool:
+    """
+    Отмечает задание выполненным. Возвращает False, если задание уже было отобрано
+    у воркера как зависшее (тогда результат все равно записан, но задание выполнит кто-то еще).
+    """
+    async with async_session() as session:
+        result = await session.execute(
+            update(CrawlJob)
+            .where(and_(CrawlJob.job_id == job_id, CrawlJob.worker_id == worker_id, CrawlJob.status == 'running'))
+            .values(status='done', finished_at=func.now(), events_found=events_found, last_error=None)
+        )
+        await session.commit()
+        return result.rowcount > 0
+
+
+async def fail_job(job_id: int, worker_id: str, error: str) -> str | None:
+    """
+    Записывает ошибку задания. Пока попытки не исчерпаны, задание возвращается в очередь
+    с экспоненциальной паузой, иначе помечается 'failed'. Возвращает новый статус.
+    """
+    async with async_session() as session:
+        job = (await session.execute(
+            select(CrawlJob)
+            .where(and_(CrawlJob.job_id == job_id, CrawlJob.worker_id == worker_id, CrawlJob.status == 'running'))
+            .with_for_update()
+        )).scalar_one_or_none()
+        if job is None:
+            return None
+
+        job.last_error = error[:2000]
+        if job.attempts >= job.max_attempts:
+            job.status = 'failed'
+            job.finished_at = func.now()
+        else:
+            job.status = 'pending'
+            job.worker_id = None
+            job.available_at = func.now() + RETRY_BASE_DELAY * (2 ** (job.attempts - 1))
+        status = job.status
+        await session.commit()
+        return status
+
+
+async def release_jobs(worker_id: str, job_ids: list[int]):
+    """Возвращает задания в очередь без траты попытки (штатная остановка воркера)."""
+    if not job_ids:
+        return
+    async with async_session() as session:
+        await session.execute(
+            update(CrawlJob)
+            .where(and_(CrawlJob.job_id.in_(job_ids), CrawlJob.worker_id == worker_id, CrawlJob.status == 'running'))
+            .values(status='pending', worker_id=None, attempts=CrawlJob.attempts - 1, available_at=func.now())
+        )
+        await session.commit()
+
+
+async def requeue_stalled_jobs(stall_timeout: timedelta = STALL_TIMEOUT) -> tuple[int, int]:
+    """
+    Возвращает в очередь задания упавших/зависших воркеров (heartbeat старше stall_timeout).
+    Задания, исчерпавшие попытки, помечаются 'failed'. Возвращает (возвращено, провалено).
+    """
+    deadline = func.now() - stall_timeout
+    stalled = and_(CrawlJob.status == 'running', or_(CrawlJob.heartbeat_at.is_(None), CrawlJob.heartbeat_at < deadline))
+    async with async_session() as session:
+        failed = await session.execute(
+            update(CrawlJob)
+            .where(and_(stalled, CrawlJob.attempts >= CrawlJob.max_attempts))
+            .values(status='failed', finished_at=func.now(), last_error='Воркер перестал отвечать (heartbeat)')
+        )
+        requeued = await session.execute(
+            update(CrawlJob)
+            .where(stalled)
+            .values(status='pending', worker_id=None, available_at=func.now())
+        )
+        await session.commit()
+        return requeued.rowcount, failed.rowcount
+
+
+async def get_run_progress(run_id: str) -> dict[str, int]:
+    """Количество заданий прогона по статусам: {'pending': .., 'running': .., 'done': .., 'failed': ..}."""
+    async with async_session() as session:
+        rows = await session.execute(
+            select(CrawlJob.status, func.count())
+            .where(CrawlJob.run_id == run_id)
+            .group_by(CrawlJob.status)
+        )
+        return {status: count for status, count in rows.all()}
@@ -0,0 +1,76 @@
+# app/database/requests/requests_fast.py
+#
+# Быстрый путь чтения для частых экранов: список подписок, список избранного.
+# Версии из requests.py идут через ORM: собирают запрос SQLAlchemy и создают объекты
+# Event/Venue/City (с цепочками selectinload - отдельные запросы), хотя экрану нужны
+# несколько строк для текста и кнопок. Афиши здесь нет: requests.get_grouped_events_by_city_and_categories
+# и так один SQL-запрос (text()) к afisha_event_series.
+# Здесь те же выборки одним SQL-запросом на функцию напрямую через asyncpg: asyncpg подготавливает
+# запрос на соединении один раз и дальше берет его из кэша (statement_cache_size), строки
+# сразу превращаются в NamedTuple только с нужными полями.
+# Сигнатуры те же, что у функций requests.py (включая session - сессию апдейта из DbSessionMiddleware),
+# поэтому хэндлер переключается заменой модуля. Сравнение путей: app/database/bench_read_paths.py.
+
+from datetime import datetime
+from typing import NamedTuple
+
+from app.database.query_counters import count_round_trip
+from .requests import session_scope
+
+
+class SubscribedEvent(NamedTuple):
+    """Событие из подписок пользователя и статус его подписки (active/paused)."""
+    event_id: int
+    title: str
+    date_start: datetime | None
+    venue_name: str
+    city_name: str
+    status: str
+
+
+class FavoriteArtist(NamedTuple):
+    artist_id: int
+    name: str
+
+
+SUBSCRIPTIONS_SQL = """
+    SELECT DISTINCT ON (e.date_start, e.event_id)
+           e.event_id, e.title, e.date_start, v.name, c.name, s.status::text
+    FROM subscriptions s
+    JOIN events e ON e.event_id = s.event_id
+    JOIN venues v ON v.venue_id = e.venue_id
+    JOIN cities c ON c.city_id = v.city_id
+    WHERE s.user_id = $1
+    ORDER BY e.date_start, e.event_id
+"""
+
+FAVORITES_SQL = """
+    SELECT a.artist_id, a.name
+    FROM user_favorites f
+    JOIN artists a ON a.artist_id = f.artist_id
+    WHERE f.user_id = $1
+    ORDER BY a.name
+"""
+
+
+async def _fetch(session, query: str, *args) -> list:
+    """Выполняет запрос на asyncpg-соединении сессии (своя сессия, если session=None)."""
+    async with session_scope(session) as session:
+        connection = await session.connection()
+        raw_connection = await connection.get_raw_connection()
+        # Мимо before_cursor_execute - в счетчик запросов апдейта (DbSessionMiddleware) добавляем сами
+        count_round_trip()
+        return await raw_connection.driver_connection.fetch(query, *args)
+
+
+async def get_user_subscriptions(user_id: int, session=None) -> list[SubscribedEvent]:
+    """События, на которые подписан пользователь (по дате), со статусом подписки."""
+    rows = await _fetch(session, SUBSCRIPTIONS_SQL, user_id)
+    return [SubscribedEvent(*row) for row in rows]
+
+
+async def get_user_favorites(user_id: int, session=None) -> list[FavoriteArtist]:
+    """Артисты из избранного пользователя (по имени)."""
+    rows = await _fetch(session, FAVORITES_SQL, user_id)
+    return [FavoriteArtist(*row) for row in rows]
+
@@ -0,0 +1,222 @@
+# app/database/requests/requests_venues.py
+#
+# Поиск места проведения по "сырому" названию от парсера.
+# Раньше create_event_with_artists делал get_or_create(Venue, name=<строка с сайта>), и каждое
+# написание ("Минск-Арена", "Minsk Arena, Минск", "Минск-Арена, пр-т Победителей, 111")
+# становилось отдельным местом. Теперь место ищется по нормализованному ключу
+# (app/services/venues.py) в таблице псевдонимов и в venues.normalized_key.
+#
+# VenueResolver кэширует найденные места на время одного прогона парсера: одни и те же
+# места повторяются в сотнях событий, и после первого события запросов к БД по месту нет.
+# Кэш привязан к сессии прогона - после rollback созданные в нем места недействительны,
+# поэтому резолвер создается заново на каждый прогон (см. run_parser.sync_raw_events).
+
+import logging
+from collections import defaultdict
+from typing import NamedTuple
+
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.dialects.postgresql import insert
+
+from app.services.venues import normalize_venue_name
+from ..models import async_session, Venue, VenueAlias, Event, City
+
+
+class VenueResolver:
+    def __init__(self):
+        # (city_id, нормализованный ключ) -> venue_id
+        self._cache: dict[tuple[int, str], int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.created = 0
+
+    async def resolve(self, session, name: str, city_name: str, city_id: int, country_id: int) -> int:
+        """Возвращает venue_id для названия места (создает место, если такого еще нет)."""
+        key = normalize_venue_name(name, city_name) or name.strip().lower()
+        cache_key = (city_id, key)
+        venue_id = self._cache.get(cache_key)
+        if venue_id is not None:
+            self.hits += 1
+            return venue_id
+        self.misses += 1
+
+        venue_id = await find_venue_id(session, city_id, key, name)
+        if venue_id is None:
+            venue_id = await _create_venue(session, name.strip(), key, city_id, country_id)
+            self.created += 1
+            logging.info(f"  - Добавлено новое место: '{name}' (ключ '{key}')")
+
+        self._cache[cache_key] = venue_id
+        return venue_id
+
+    def log_stats(self):
+        logging.info(f"Места проведения: из кэша {self.hits}, запросов к БД {self.misses}, создано {self.created}")
+
+
+async def find_venue_id(session, city_id: int, key: str, name: str | None = None) -> int | None:
+    """Ищет место по ключу: сначала среди псевдонимов, затем по venues.normalized_key."""
+    venue_id = (await session.execute(
+        select(VenueAlias.venue_id).where(VenueAlias.city_id == city_id, VenueAlias.alias_key == key)
+    )).scalar_one_or_none()
+    if venue_id is not None:
+        return venue_id
+
+    venue_id = (await session.execute(
+        select(Venue.venue_id).where(Venue.city_id == city_id, Venue.normalized_key == key)
+    )).scalar_one_or_none()
+    if venue_id is not None or name is None:
+        return venue_id
+
+    # Место, созданное до появления normalized_key и еще не прошедшее merge_venues.py:
+    # находим его по точному названию и заодно проставляем ключ
+    venue_id = (await session.execute(
+        select(Venue.venue_id)
+        .where(Venue.city_id == city_id, Venue.name == name, Venue.normalized_key.is_(None))
+        .order_by(Venue.venue_id)
+        .limit(1)
+    )).scalar_one_or_none()
+    if venue_id is not None:
+        await session.execute(update(Venue).where(Venue.venue_id == venue_id).values(normalized_key=key))
+    return venue_id
+
+
+async def _create_venue(session, name: str, key: str, city_id: int, country_id: int) -> int:
+    # ON CONFLICT: место с тем же ключом мог только что создать параллельный воркер
+    venue_id = (await session.execute(
+        insert(Venue)
+        .values(name=name, normalized_key=key, city_id=city_id, country_id=country_id)
+        .on_conflict_do_nothing(index_elements=['city_id', 'normalized_key'])
+        .returning(Venue.venue_id)
+    )).scalar_one_or_none()
+    if venue_id is None:
+        venue_id = await find_venue_id(session, city_id, key)
+    return venue_id
+
+
+# --- Слияние дублей (merge_venues.py) ---
+
+class VenueMerge(NamedTuple):
+    city_id: int
+    key: str
+    target_id: int
+    target_name: str
+    duplicate_ids: list[int]
+    duplicate_names: list[str]
+
+
+async def plan_venue_merges() -> tuple[list[VenueMerge], dict[int, str]]:
+    """
+    Группирует все места по (город, нормализованный ключ с учетом псевдонимов).
+    Возвращает слияния для групп из нескольких мест и ключи для всех мест (venue_id -> ключ).
+    В группе остается место с наибольшим числом событий (при равенстве - самое старое).
+    """
+    async with async_session() as session:
+        event_counts = (
+            select(Event.venue_id, func.count().label('events'))
+            .group_by(Event.venue_id)
+            .subquery()
+        )
+        rows = (await session.execute(
+            select(Venue.venue_id, Venue.name, Venue.city_id, City.name.label('city_name'),
+                   func.coalesce(event_counts.c.events, 0).label('events'))
+            .join(City, City.city_id == Venue.city_id)
+            .outerjoin(event_counts, event_counts.c.venue_id == Venue.venue_id)
+        )).all()
+        aliases = {
+            (row.city_id, row.alias_key): row.venue_id
+            for row in (await session.execute(select(VenueAlias.city_id, VenueAlias.alias_key, VenueAlias.venue_id))).all()
+        }
+
+    keys = {row.venue_id: normalize_venue_name(row.name, row.city_name) or row.name.strip().lower() for row in rows}
+    groups: dict[tuple[int, str], list] = defaultdict(list)
+    # Группа -> место, на которое указывает псевдоним (оно и остается после слияния)
+    owners: dict[tuple[int, str], int] = {}
+    for row in rows:
+        group_key = (row.city_id, keys[row.venue_id])
+        owner = aliases.get(group_key)
+        if owner is not None and owner in keys and owner != row.venue_id:
+            # Написание закреплено псевдонимом за другим местом - в группу этого места
+            group_key = (row.city_id, keys[owner])
+            owners[group_key] = owner
+        groups[group_key].append(row)
+
+    merges = []
+    for group_key, members in groups.items():
+        if len(members) < 2:
+            continue
+        city_id = group_key[0]
+        owner = owners.get(group_key)
+        members.sort(key=lambda row: (row.venue_id != owner, -row.events, row.venue_id))
+        target, duplicates = members[0], members[1:]
+        merges.append(VenueMerge(
+            city_id=city_id,
+            key=keys[target.venue_id],
+            target_id=target.venue_id,
+            target_name=target.name,
+            duplicate_ids=[row.venue_id for row in duplicates],
+            duplicate_names=[row.name for row in duplicates],
+        ))
+    return merges, keys
+
+
+async def apply_venue_merges(merges: list[VenueMerge], keys: dict[int, str]) -> int:
+    """
+    Переносит события дублей на оставшееся место, сохраняет ключи дублей как псевдонимы,
+    удаляет дубли и проставляет normalized_key всем местам. Одна транзакция.
+    Возвращает число перенесенных событий.
+    """
+    moved = 0
+    async with async_session() as session:
+        for merge in merges:
+            result = await session.execute(
+                update(Event).where(Event.venue_id.in_(merge.duplicate_ids)).values(venue_id=merge.target_id)
+            )
+            moved += result.rowcount
+            await session.execute(
+                update(VenueAlias).where(VenueAlias.venue_id.in_(merge.duplicate_ids)).values(venue_id=merge.target_id)
+            )
+            alias_rows = [
+                {'venue_id': merge.target_id, 'city_id': merge.city_id, 'alias_key': keys[venue_id], 'name': name}
+                for venue_id, name in zip(merge.duplicate_ids, merge.duplicate_names)
+                if keys[venue_id] != merge.key
+            ]
+            if alias_rows:
+                await session.execute(
+                    insert(VenueAlias).values(alias_rows)
+                    .on_conflict_do_nothing(constraint='uq_venue_aliases_city_alias_key')
+                )
+            await session.execute(delete(Venue).where(Venue.venue_id.in_(merge.duplicate_ids)))
+
+        # Ключи - после удаления дублей, иначе сработает уникальный индекс (city_id, normalized_key).
+        # Сначала сбрасываем все: старый ключ одного места может совпасть с новым ключом другого
+        removed = {venue_id for merge in merges for venue_id in merge.duplicate_ids}
+        await session.execute(update(Venue).values(normalized_key=None))
+        await session.execute(update(Venue), [
+            {'venue_id': venue_id, 'normalized_key': key} for venue_id, key in keys.items() if venue_id not in removed
+        ])
+        await session.commit()
+    return moved
+
+
+async def add_venue_alias(venue_id: int, alias_name: str) -> int | None:
+    """
+    Добавляет написание alias_name как псевдоним места venue_id.
+    Место, которое уже существует под этим ключом, сливается с venue_id при следующем merge_venues.py.
+    Возвращает alias_id или None, если место не найдено.
+    """
+    async with async_session() as session:
+        row = (await session.execute(
+            select(Venue.city_id, City.name).join(City, City.city_id == Venue.city_id).where(Venue.venue_id == venue_id)
+        )).first()
+        if row is None:
+            return None
+        key = normalize_venue_name(alias_name, row.name) or alias_name.strip().lower()
+        alias_id = (await session.execute(
+            insert(VenueAlias)
+            .values(venue_id=venue_id, city_id=row.city_id, alias_key=key, name=alias_name)
+            .on_conflict_do_update(constraint='uq_venue_aliases_city_alias_key',
+                                   set_={'venue_id': venue_id, 'name': alias_name})
+            .returning(VenueAlias.alias_id)
+        )).scalar_one()
+        await session.commit()
+        return alias_id
@@ -13,6 +13,8 @@ from aiogram.exceptions import TelegramBadRequest
 from ..database.requests import requests as db
 from app import keyboards as kb
 from ..lexicon import Lexicon
+from ..middlewares import UserContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.utils.utils import format_events_with_headers, format_events_for_response
 
 router = Router()
@@ -150,10 +152,9 @@ async def process_month_choice(callback: CallbackQuery, state: FSMContext):
 
 
 @router.callback_query(AfishaFlowFSM.choosing_filter_type, F.data == "filter_type:my_prefs")
-async def afisha_by_my_prefs(callback: CallbackQuery, state: FSMContext):
-    user_id = callback.from_user.id
+async def afisha_by_my_prefs(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user_ctx: UserContext):
     lexicon = Lexicon(callback.from_user.language_code)
-    user_prefs = await db.get_user_preferences(user_id)
+    user_prefs = await user_ctx.preferences()
     
     if not user_prefs or not user_prefs.get("home_city") or not user_prefs.get("preferred_event_types"):
         await callback.answer(lexicon.get('afisha_prefs_not_configured_alert'), show_alert=True)
@@ -163,10 +164,9 @@ async def afisha_by_my_prefs(callback: CallbackQuery, state: FSMContext):
     date_from, date_to = data.get("date_from"), data.get("date_to")
     city_name, event_types = user_prefs["home_city"], user_prefs["preferred_event_types"]
 
-    events_by_category = {}
-    for etype in event_types:
-        events = await db.get_grouped_events_by_city_and_category(city_name, etype, date_from, date_to)
-        if events: events_by_category[etype] = events
+    events_by_category = await db.get_grouped_events_by_city_and_categories(
+        city_name, event_types, date_from, date_to, session=session
+    )
             
     response_text, event_ids = await format_events_with_headers(events_by_category)
     
@@ -186,10 +186,10 @@ async def afisha_by_my_prefs(callback: CallbackQuery, state: FSMContext):
     )
 
 @router.callback_query(AfishaFlowFSM.choosing_filter_type, F.data == "filter_type:temporary")
-async def afisha_by_temporary_prefs_start(callback: CallbackQuery, state: FSMContext):
+async def afisha_by_temporary_prefs_start(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     await state.set_state(AfishaFlowFSM.temp_choosing_city)
     lexicon = Lexicon(callback.from_user.language_code)
-    user_prefs = await db.get_user_preferences(callback.from_user.id)
+    user_prefs = await user_ctx.preferences()
     country_name = user_prefs.get('home_country') if user_prefs else lexicon.get('default_country_for_temp_search')
     
     await state.update_data(temp_country=country_name)
@@ -236,7 +236,7 @@ async def temp_toggle_type(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(AfishaFlowFSM.temp_choosing_event_types, F.data.startswith("finish_preferences_selection:"))
-async def temp_finish_and_display(callback: CallbackQuery, state: FSMContext): 
+async def temp_finish_and_display(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     data = await state.get_data()
     lexicon = Lexicon(callback.from_user.language_code)
     
@@ -248,10 +248,9 @@ async def temp_finish_and_display(callback: CallbackQuery, state: FSMContext):
         await callback.answer(lexicon.get('select_at_least_one_event_type_alert'), show_alert=True)
         return
         
-    events_by_category = {}
-    for etype in event_types:
-        events = await db.get_grouped_events_by_city_and_category(city_name, etype, date_from, date_to)
-        if events: events_by_category[etype] = events
+    events_by_category = await db.get_grouped_events_by_city_and_categories(
+        city_name, event_types, date_from, date_to, session=session
+    )
             
     response_text, event_ids = await format_events_with_headers(events_by_category)
     
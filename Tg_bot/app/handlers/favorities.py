@@ -7,9 +7,11 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.utils.markdown import hbold
 
 from ..database.requests import requests as db
+from ..database.requests import requests_fast as db_fast
 from app import keyboards as kb
 from ..lexicon import Lexicon
 from ..database.models import Artist
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = Router()
 
@@ -20,14 +22,15 @@ class FavoritesFSM(StatesGroup):
 
 # --- ХЕЛПЕРЫ ДЛЯ ПОКАЗА ЭКРАНОВ ---
 
-async def show_favorites_list(callback_or_message: Message | CallbackQuery, state: FSMContext):
+async def show_favorites_list(callback_or_message: Message | CallbackQuery, state: FSMContext,
+                              session: AsyncSession | None = None):
     """Отображает главный экран "Избранного" со списком артистов."""
     await state.set_state(FavoritesFSM.viewing_list)
     
     target_obj = callback_or_message.message if isinstance(callback_or_message, CallbackQuery) else callback_or_message
     lexicon = Lexicon(callback_or_message.from_user.language_code)
     # --- ИЗМЕНЕНИЕ --- Удален отладочный print()
-    favorites = await db.get_user_favorites(callback_or_message.from_user.id)
+    favorites = await db_fast.get_user_favorites(callback_or_message.from_user.id, session=session)
     
     
     text = lexicon.get('favorites_list_prompt') if favorites else lexicon.get('favorites_menu_header_empty')
@@ -74,10 +77,10 @@ async def show_single_favorite_menu(callback: CallbackQuery, state: FSMContext):
 # --- ХЭНДЛЕРЫ ---
 
 @router.message(F.text.in_(["⭐ Избранное", "⭐ Favorites"]))
-async def menu_favorites(message: Message, state: FSMContext):
+async def menu_favorites(message: Message, state: FSMContext, session: AsyncSession):
     """Точка входа в раздел. Очищает состояние."""
     await state.clear()
-    await show_favorites_list(message, state)
+    await show_favorites_list(message, state, session)
 
 @router.callback_query(FavoritesFSM.viewing_list, F.data.startswith("view_favorite:"))
 async def cq_view_favorite_artist(callback: CallbackQuery, state: FSMContext):
@@ -87,12 +90,12 @@ async def cq_view_favorite_artist(callback: CallbackQuery, state: FSMContext):
     await show_single_favorite_menu(callback, state)
 
 @router.callback_query(F.data == "back_to_favorites_list")
-async def cq_back_to_favorites_list(callback: CallbackQuery, state: FSMContext):
+async def cq_back_to_favorites_list(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Возврат из меню артиста в общий список."""
-    await show_favorites_list(callback, state)
+    await show_favorites_list(callback, state, session)
 
 @router.callback_query(FavoritesFSM.viewing_artist, F.data.startswith("delete_favorite:"))
-async def cq_delete_favorite_artist(callback: CallbackQuery, state: FSMContext):
+async def cq_delete_favorite_artist(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Удаляет артиста и возвращает в обновленный общий список."""
     data = await state.get_data()
     artist_id = data.get("current_artist_id")
@@ -100,7 +103,7 @@ async def cq_delete_favorite_artist(callback: CallbackQuery, state: FSMContext):
     
     lexicon = Lexicon(callback.from_user.language_code)
     await callback.answer(lexicon.get('favorites_removed_alert'), show_alert=True)
-    await show_favorites_list(callback, state)
+    await show_favorites_list(callback, state, session)
 
 
 @router.callback_query(FavoritesFSM.editing_mobility, F.data.startswith("toggle_region:"))
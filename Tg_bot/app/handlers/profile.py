@@ -8,8 +8,11 @@ from aiogram.types import Message, CallbackQuery
 from aiogram.utils.markdown import hbold
 
 from ..database.requests import requests as db
+from ..database.requests import requests_fast as db_fast
 from app import keyboards as kb
 from ..lexicon import Lexicon
+from ..middlewares import UserContext
+from sqlalchemy.ext.asyncio import AsyncSession
 from .subscriptions import SubscriptionFlow 
 from ..database.models import Event, Subscription # Импортируем модели для type hinting
 
@@ -156,13 +159,13 @@ async def cq_back_to_edit_city_list(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(EditMainGeoFSM.choosing_city, F.data.startswith("edit_city:"))
-async def cq_edit_city_selected(callback: CallbackQuery, state: FSMContext):
+async def cq_edit_city_selected(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Обрабатывает выбор города в режиме редактирования."""
     city_name = callback.data.split(":", 1)[1]
     await state.update_data(home_city=city_name)
     await state.set_state(EditMainGeoFSM.choosing_event_types)
     lexicon = Lexicon(callback.from_user.language_code)
-    prefs = await db.get_user_preferences(callback.from_user.id)
+    prefs = await user_ctx.preferences()
     current_types = prefs.get("preferred_event_types", []) if prefs else []
     await state.update_data(selected_event_types=current_types)
     text = lexicon.get('edit_geo_event_types_prompt').format(city_name=hbold(city_name))    
@@ -208,14 +211,14 @@ async def cq_edit_finish(callback: CallbackQuery, state: FSMContext):
 
 # --- Флоу редактирования ОБЩЕЙ МОБИЛЬНОСТИ ---
 @router.callback_query(F.data == "edit_general_mobility")
-async def cq_edit_general_mobility(callback: CallbackQuery, state: FSMContext):
+async def cq_edit_general_mobility(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Начинает флоу редактирования общей мобильности, используя СВОЮ FSM."""
     # Устанавливаем состояние из НАШЕЙ новой FSM
     await state.set_state(EditMobilityFSM.selecting_regions)
     user_lang = callback.message.from_user.language_code
     lexicon = Lexicon(user_lang)
     
-    current_regions = await db.get_general_mobility(callback.from_user.id) or []
+    current_regions = await user_ctx.general_mobility() or []
     await state.update_data(selected_regions=current_regions) # Сохраняем текущий выбор
     all_countries = await db.get_countries()
     
@@ -249,13 +252,14 @@ async def cq_finish_general_edit_from_profile(callback: CallbackQuery, state: FS
 
 
 # --- Флоу управления ПОДПИСКАМИ ---
-async def show_subscriptions_list(callback_or_message: Message | CallbackQuery, state: FSMContext):
+async def show_subscriptions_list(callback_or_message: Message | CallbackQuery, state: FSMContext,
+                                  session: AsyncSession | None = None):
     """Показывает список подписок на события."""
     await state.clear() 
     user_id = callback_or_message.from_user.id
     lexicon = Lexicon(callback_or_message.from_user.language_code)
     
-    subs = await db.get_user_subscriptions(user_id)
+    subs = await db_fast.get_user_subscriptions(user_id, session=session)
     
     text = lexicon.get('subs_menu_header_active')
     if not subs:
@@ -273,15 +277,15 @@ async def show_subscriptions_list(callback_or_message: Message | CallbackQuery,
         await callback_or_message.answer(text=text, reply_markup=markup)
 
 @router.callback_query(F.data == "manage_my_subscriptions")
-async def cq_manage_my_subscriptions(callback: CallbackQuery, state: FSMContext):
-    await show_subscriptions_list(callback, state)
+async def cq_manage_my_subscriptions(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    await show_subscriptions_list(callback, state, session)
     
 @router.callback_query(F.data == "back_to_subscriptions_list")
-async def cq_back_to_subscriptions_list(callback: CallbackQuery, state: FSMContext):
-    await show_subscriptions_list(callback, state)
+async def cq_back_to_subscriptions_list(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
+    await show_subscriptions_list(callback, state, session)
 
 @router.callback_query(F.data.startswith("view_subscription:"))
-async def cq_view_subscription(callback: CallbackQuery, state: FSMContext):
+async def cq_view_subscription(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Показывает детальную информацию по одной подписке."""
     lexicon = Lexicon(callback.from_user.language_code)
     try:
@@ -290,15 +294,15 @@ async def cq_view_subscription(callback: CallbackQuery, state: FSMContext):
         await callback.answer(lexicon.get('invalid_event_id_error'), show_alert=True)
         return
 
-    sub_details = await db.get_subscription_details(callback.from_user.id, event_id)
+    sub_details = await db.get_subscription_details(callback.from_user.id, event_id, session=session)
     
     # Получаем детали события напрямую, без новой функции
-    async with db.async_session() as session:
-        event_details = await session.get(Event, event_id)
+    event_details = await session.get(Event, event_id)
+    await db.end_read(session)
 
     if not sub_details or not event_details:
         await callback.answer(lexicon.get('sub_or_event_not_found_error'), show_alert=True)
-        await show_subscriptions_list(callback, state)
+        await show_subscriptions_list(callback, state, session)
         return
 
     lexicon = Lexicon(callback.from_user.language_code)
@@ -319,7 +323,7 @@ async def cq_view_subscription(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 @router.callback_query(F.data.startswith("toggle_sub_status:"))
-async def cq_toggle_subscription_status(callback: CallbackQuery, state: FSMContext):
+async def cq_toggle_subscription_status(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     """Переключает статус подписки (active/paused)."""
     lexicon = Lexicon(callback.from_user.language_code)
     try:
@@ -341,12 +345,12 @@ async def cq_toggle_subscription_status(callback: CallbackQuery, state: FSMConte
         await callback.answer(alert_text, show_alert=True)
         
         # ИЗМЕНЕНИЕ: Передаем сам объект callback, а не callback.message
-        await show_subscriptions_list(callback, state)
+        await show_subscriptions_list(callback, state, session)
     else:
         await callback.answer(lexicon.get('subs_not_found_alert'), show_alert=True)
 
 @router.callback_query(F.data.startswith("delete_subscription:"))
-async def cq_delete_subscription(callback: CallbackQuery, state: FSMContext):
+async def cq_delete_subscription(callback: CallbackQuery, state: FSMContext, session: AsyncSession):
     lexicon = Lexicon(callback.from_user.language_code)
     try:
         event_id = int(callback.data.split(":", 1)[1])
@@ -363,7 +367,7 @@ async def cq_delete_subscription(callback: CallbackQuery, state: FSMContext):
     
     # 3. Обновляем список подписок, чтобы пользователь увидел изменения
     # ВАЖНО: Мы должны передать state, так как show_subscriptions_list его ожидает
-    await show_subscriptions_list(callback, state)  
+    await show_subscriptions_list(callback, state, session)  
 
 
 
@@ -12,6 +12,8 @@ from app import keyboards as kb
 from app.utils.utils import format_events_for_response
 from .favorities import show_favorites_list 
 from ..lexicon import Lexicon
+from ..middlewares import UserContext
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from aiogram.enums import ParseMode
 from app.utils.utils import format_events_by_artist # Наш новый форматер
@@ -38,13 +40,12 @@ class RecommendationFlow(StatesGroup):
 
 
 @router.message(F.text.in_(['➕ Найти/добавить артиста', '➕ Find/Add Artist', '➕ Знайсці/дадаць выканаўцу'])) 
-async def menu_add_subscriptions(message: Message, state: FSMContext):
+async def menu_add_subscriptions(message: Message, state: FSMContext, user_ctx: UserContext):
     """
     Точка входа в флоу ДОБАВЛЕНИЯ подписки.
     """
     await state.clear()
-    user_id = message.from_user.id
-    onboarding_done = await db.check_general_geo_onboarding_status(user_id)
+    onboarding_done = await user_ctx.general_geo_completed()
     user_lang = message.from_user.language_code
     lexicon = Lexicon(user_lang)
 
@@ -57,7 +58,7 @@ async def menu_add_subscriptions(message: Message, state: FSMContext):
         )
     else:
         # Пользователь уже проходил онбординг.
-        general_mobility_regions = await db.get_general_mobility(user_id)
+        general_mobility_regions = await user_ctx.general_mobility()
         await state.set_state(SubscriptionFlow.waiting_for_action)
         await state.update_data(pending_favorites=[])
 
@@ -85,10 +86,9 @@ async def menu_add_subscriptions(message: Message, state: FSMContext):
 #     await callback.answer()
 
 @router.callback_query(F.data == "add_new_subscription")
-async def start_subscription_add_flow(callback: CallbackQuery, state: FSMContext):
+async def start_subscription_add_flow(callback: CallbackQuery, state: FSMContext, user_ctx: UserContext):
     """Начало флоу добавления подписки."""
-    user_id = callback.from_user.id
-    onboarding_done = await db.check_general_geo_onboarding_status(user_id)
+    onboarding_done = await user_ctx.general_geo_completed()
     user_lang = callback.message.from_user.language_code
     lexicon = Lexicon(user_lang)
     if not onboarding_done:
@@ -322,13 +322,13 @@ async def process_artist_search(message: Message, state: FSMContext):
                              reply_markup=kb.found_artists_keyboard(found_artists, lexicon))
 
 @router.callback_query(F.data.startswith("subscribe_to_artist:"))
-async def cq_subscribe_to_artist(callback: CallbackQuery, state: FSMContext):
+async def cq_subscribe_to_artist(callback: CallbackQuery, state: FSMContext, session: AsyncSession, user_ctx: UserContext):
     artist_id = int(callback.data.split(":", 1)[1])
     user_lang = callback.message.from_user.language_code
     lexicon = Lexicon(user_lang)
     # Нам нужно получить имя артиста для сообщений пользователю
-    async with db.async_session() as session:
-        artist = await session.get(db.Artist, artist_id)
+    artist = await session.get(db.Artist, artist_id)
+    await db.end_read(session)
     
     if not artist:
         await callback.answer(lexicon.get('artist_not_found_error'), show_alert=True)
@@ -337,7 +337,7 @@ async def cq_subscribe_to_artist(callback: CallbackQuery, state: FSMContext):
     # Сохраняем в state и ID, и имя
     await state.update_data(current_artist_id=artist.artist_id, current_artist=artist.name)
     
-    general_mobility = await db.get_general_mobility(callback.from_user.id)
+    general_mobility = await user_ctx.general_mobility()
     if general_mobility:
         await state.set_state(SubscriptionFlow.choosing_mobility_type)
         await callback.message.edit_text(
@@ -24,13 +24,8 @@ def get_manage_subscriptions_keyboard(subscriptions: list, lexicon) -> InlineKey
     builder = InlineKeyboardBuilder()
     if subscriptions:
         for sub_event in subscriptions:
-            # Ищем подписку текущего пользователя среди всех подписок на это событие
-            # (в 99% случаев она будет одна, но это самый надежный способ)
-            user_subscription = next((sub for sub in sub_event.subscriptions), None)
-            
-            status_emoji = ""
-            if user_subscription:
-                status_emoji = "▶️" if user_subscription.status == 'active' else "⏸️"
+            # sub_event - requests_fast.SubscribedEvent: статус подписки именно этого пользователя
+            status_emoji = "▶️" if sub_event.status == 'active' else "⏸️"
 
             button_text = f"{status_emoji} {sub_event.title}"
             
@@ -0,0 +1,4 @@
+# app/middlewares/__init__.py
+
+from .db_session import DbSessionMiddleware, UserContext, log_db_stats
+from .latency import LatencyMiddleware, log_latency_stats
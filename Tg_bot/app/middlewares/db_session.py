@@ -0,0 +1,132 @@
+# app/middlewares/db_session.py
+#
+# Одна сессия БД на апдейт и контекст пользователя.
+# Раньше хэндлер делал несколько запросов подряд (check_general_geo_onboarding_status, затем
+# get_general_mobility; get_user_preferences, затем афиша), и каждый открывал свою сессию -
+# то есть заново брал соединение из пула.
+# DbSessionMiddleware кладет в данные хэндлера:
+#   session  - AsyncSession апдейта (закрывается после хэндлера); функции чтения из app/database/requests
+#              принимают ее параметром session и после чтения завершают транзакцию (requests.end_read),
+#              чтобы соединение не держалось открытым во время вызовов Telegram API;
+#   user_ctx - UserContext: строка users читается один раз за апдейт (при первом обращении).
+# Хэндлер получает их, объявив одноименные аргументы.
+#
+# Заодно считаются выдачи соединений из пула и запросы к БД (round trip) за апдейт - и через
+# общую сессию, и через функции, открывающие свою (счетчики - app/database/query_counters.py).
+# log_db_stats() пишет в лог среднее и максимум по каждой метке (как в latency.py) и начинает
+# новый период (main.py вызывает его по расписанию).
+#
+# Переменные окружения:
+#   DB_ROUND_TRIPS_WARN - апдейт с большим числом запросов к БД пишется в лог сразу (по умолчанию 10)
+
+import logging
+import os
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+
+from app.database.models import async_session
+from app.database.query_counters import QueryCounters, current_counters
+from app.database.requests import requests as db
+from .latency import _label
+
+DB_ROUND_TRIPS_WARN = int(os.getenv('DB_ROUND_TRIPS_WARN', 10))
+
+
+class UserContext:
+    """Настройки пользователя апдейта. Снимок на момент первого чтения - после записи в users не обновляется."""
+
+    __slots__ = ('user_id', 'session', '_row', '_loaded')
+
+    def __init__(self, user_id: int | None, session):
+        self.user_id = user_id
+        self.session = session
+        self._row = None
+        self._loaded = False
+
+    async def load(self):
+        """Строка настроек (db.get_user_settings) или None, если пользователя еще нет."""
+        if not self._loaded and self.user_id is not None:
+            self._row = await db.get_user_settings(self.user_id, session=self.session)
+            self._loaded = True
+        return self._row
+
+    async def preferences(self) -> dict | None:
+        """То же, что db.get_user_preferences."""
+        row = await self.load()
+        if row is None:
+            return None
+        return {
+            "home_country": row.home_country,
+            "home_city": row.home_city,
+            "preferred_event_types": row.preferred_event_types
+        }
+
+    async def main_geo_completed(self) -> bool:
+        row = await self.load()
+        return bool(row and row.main_geo_completed)
+
+    async def general_geo_completed(self) -> bool:
+        row = await self.load()
+        return bool(row and row.general_geo_completed)
+
+    async def general_mobility(self) -> list | None:
+        """То же, что db.get_general_mobility."""
+        row = await self.load()
+        return (row.general_mobility_regions or None) if row else None
+
+
+class _LabelStats:
+    __slots__ = ('updates', 'checkouts', 'round_trips', 'max_round_trips')
+
+    def __init__(self):
+        self.updates = 0
+        self.checkouts = 0
+        self.round_trips = 0
+        self.max_round_trips = 0
+
+    def add(self, counters: QueryCounters):
+        self.updates += 1
+        self.checkouts += counters.checkouts
+        self.round_trips += counters.round_trips
+        self.max_round_trips = max(self.max_round_trips, counters.round_trips)
+
+
+_stats: dict[str, _LabelStats] = {}
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        counters = QueryCounters()
+        token = current_counters.set(counters)
+        try:
+            async with async_session() as session:
+                from_user = getattr(event, 'from_user', None)
+                data['session'] = session
+                data['user_ctx'] = UserContext(from_user.id if from_user else None, session)
+                return await handler(event, data)
+        finally:
+            current_counters.reset(token)
+            label = _label(event)
+            _stats.setdefault(label, _LabelStats()).add(counters)
+            if counters.round_trips >= DB_ROUND_TRIPS_WARN:
+                logging.warning(f"[db] апдейт {label}: {counters.round_trips} запросов к БД, "
+                                f"{counters.checkouts} соединений из пула")
+
+
+def log_db_stats():
+    """Пишет статистику обращений к БД за период и сбрасывает ее."""
+    if not _stats:
+        return
+    lines = []
+    for label, stats in sorted(_stats.items(), key=lambda item: -item[1].round_trips):
+        lines.append(f"  {label}: {stats.updates} шт., запросов в среднем {stats.round_trips / stats.updates:.1f} "
+                     f"(макс {stats.max_round_trips}), соединений из пула в среднем {stats.checkouts / stats.updates:.1f}")
+    logging.info("[db] Обращения к БД на апдейт:\n" + "\n".join(lines))
+    _stats.clear()
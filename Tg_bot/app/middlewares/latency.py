@@ -0,0 +1,79 @@
+# app/middlewares/latency.py
+#
+# Замер времени обработки апдейтов (от входа в middleware до возврата из хэндлера).
+# Статистика копится по "меткам": для callback - префикс callback_data до ':'
+# (toggle_region, subscribe_to_artist, ...), для сообщений - 'message'.
+# log_latency_stats() пишет в лог число вызовов, медиану, p95 и максимум по каждой метке
+# и начинает новый период (main.py вызывает его по расписанию).
+# Медленные апдейты (дольше HANDLER_SLOW_MS) пишутся в лог сразу.
+
+import logging
+import os
+import statistics
+import time
+from collections import defaultdict, deque
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+HANDLER_SLOW_MS = float(os.getenv('HANDLER_SLOW_MS', 500))
+# Сколько последних замеров на метку хранить для перцентилей
+SAMPLES_PER_LABEL = 1000
+
+
+class _LabelStats:
+    __slots__ = ('count', 'max_ms', 'samples')
+
+    def __init__(self):
+        self.count = 0
+        self.max_ms = 0.0
+        self.samples: deque[float] = deque(maxlen=SAMPLES_PER_LABEL)
+
+    def add(self, elapsed_ms: float):
+        self.count += 1
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.samples.append(elapsed_ms)
+
+
+_stats: dict[str, _LabelStats] = defaultdict(_LabelStats)
+
+
+def _label(event: TelegramObject) -> str:
+    if isinstance(event, CallbackQuery):
+        return (event.data or '').split(':', 1)[0] or 'callback'
+    if isinstance(event, Message):
+        return 'message'
+    return type(event).__name__
+
+
+class LatencyMiddleware(BaseMiddleware):
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            label = _label(event)
+            _stats[label].add(elapsed_ms)
+            if elapsed_ms >= HANDLER_SLOW_MS:
+                logging.warning(f"[latency] медленный апдейт {label}: {elapsed_ms:.0f} мс")
+
+
+def log_latency_stats():
+    """Пишет статистику за период и сбрасывает ее."""
+    if not _stats:
+        return
+    lines = []
+    for label, stats in sorted(_stats.items(), key=lambda item: -item[1].count):
+        samples = sorted(stats.samples)
+        p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+        lines.append(f"  {label}: {stats.count} шт., медиана {statistics.median(samples):.1f} мс, "
+                     f"p95 {p95:.1f} мс, макс {stats.max_ms:.1f} мс")
+    logging.info("[latency] Время обработки апдейтов:\n" + "\n".join(lines))
+    _stats.clear()
@@ -0,0 +1,112 @@
+# app/services/artist_index.py
+#
+# Индекс артистов в памяти процесса для поиска по имени (подписка на артиста).
+# Раньше find_artists_fuzzy на каждый запрос загружал из БД всех артистов (10k+ объектов Artist)
+# и сравнивал запрос с каждым именем в чистом Python (thefuzz).
+# Теперь имена загружаются один раз при старте бота, новые артисты дописываются инкрементально
+# (add / load_artist_index, с окном перечитывания последних id), а поиск идет без обращения к БД:
+#   1. префильтр по триграммам - кандидаты, у которых с запросом достаточно общих триграмм;
+#   2. оценка кандидатов rapidfuzz (WRatio, как у thefuzz.process.extract) - пакетно, в C.
+# Если префильтр никого не нашел (сильная опечатка), оцениваются все имена.
+
+import re
+from collections import Counter
+from typing import NamedTuple
+
+from rapidfuzz import fuzz, process
+
+NGRAM_SIZE = 3
+# Сколько кандидатов с наибольшим числом общих триграмм отдавать на точную оценку
+MAX_CANDIDATES = 2000
+# Доля триграмм запроса, которые должны найтись в имени кандидата
+MIN_SHARED_RATIO = 0.3
+
+
+class ArtistMatch(NamedTuple):
+    artist_id: int
+    name: str
+    score: float
+
+
+def normalize_artist_name(name: str) -> str:
+    """Регистр, ё, знаки препинания и лишние пробелы не влияют на поиск."""
+    text = name.lower().replace('ё', 'е')
+    text = re.sub(r'[^\w\s]|_', ' ', text)
+    return ' '.join(text.split())
+
+
+def _ngrams(text: str) -> set[str]:
+    padded = f' {text} '
+    return {padded[i:i + NGRAM_SIZE] for i in range(max(1, len(padded) - NGRAM_SIZE + 1))}
+
+
+class ArtistIndex:
+    def __init__(self):
+        # Позиция в списках -> артист; удаленные позиции остаются с пустым именем
+        self._ids: list[int] = []
+        self._names: list[str] = []
+        self._keys: list[str] = []
+        self._positions: dict[int, int] = {}
+        # триграмма -> позиции имен, в которых она встречается
+        self._postings: dict[str, list[int]] = {}
+        self.max_artist_id = 0
+        self.loaded = False
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def add(self, artist_id: int, name: str):
+        """Добавляет артиста (или обновляет имя уже известного)."""
+        if not name:
+            return
+        key = normalize_artist_name(name)
+        position = self._positions.get(artist_id)
+        if position is not None:
+            if self._keys[position] == key:
+                self._names[position] = name
+                return
+            # Переименование: старую позицию гасим, имя встанет в конец
+            self._keys[position] = ''
+        position = len(self._ids)
+        self._ids.append(artist_id)
+        self._names.append(name)
+        self._keys.append(key)
+        self._positions[artist_id] = position
+        for gram in _ngrams(key):
+            self._postings.setdefault(gram, []).append(position)
+        self.max_artist_id = max(self.max_artist_id, artist_id)
+
+    def add_many(self, rows):
+        """rows - итерируемое из (artist_id, name)."""
+        for artist_id, name in rows:
+            self.add(artist_id, name)
+
+    def _candidates(self, key: str) -> list[int]:
+        grams = _ngrams(key)
+        shared = Counter()
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings:
+                shared.update(postings)
+        min_shared = max(1, int(len(grams) * MIN_SHARED_RATIO))
+        return [position for position, count in shared.most_common(MAX_CANDIDATES) if count >= min_shared]
+
+    def search(self, query: str, limit: int = 5, score_cutoff: float = 0) -> list[ArtistMatch]:
+        key = normalize_artist_name(query)
+        if not key or not self._positions:
+            return []
+        positions = self._candidates(key)
+        if not positions:
+            positions = range(len(self._keys))
+        # Погашенные позиции (старые имена переименованных) имеют пустой ключ и не набирают баллов
+        choices = [self._keys[position] for position in positions]
+        found = process.extract(key, choices, scorer=fuzz.WRatio, processor=None,
+                                limit=limit, score_cutoff=max(score_cutoff, 1))
+        return [
+            ArtistMatch(self._ids[positions[index]], self._names[positions[index]], score)
+            for _, score, index in found
+        ]
+
+
+# Индекс процесса: заполняется при старте бота (app/database/requests/requests.py: load_artist_index)
+artist_index = ArtistIndex()
@@ -0,0 +1,66 @@
+# app/services/city_catalog.py
+#
+# Кэш городов по странам для выбора города (онбординг, редактирование профиля).
+# Раньше каждое сообщение с названием города заново выбирало из БД города страны,
+# а каждый показ экрана выбора - список "популярных" городов.
+# Теперь каталог страны загружается один раз при первом обращении (load_city_catalog в
+# app/database/requests/requests.py) и живет в памяти процесса:
+#   - top(n)    - первые города страны (порядок как у прежнего запроса: по city_id);
+#   - search(q) - сначала города, начинающиеся с запроса, затем нечеткие совпадения (rapidfuzz).
+# При любом изменении таблиц cities/countries каталоги сбрасываются вместе с остальными
+# справочниками (app/services/reference_data.py: NOTIFY от триггеров -> invalidate()).
+
+from rapidfuzz import fuzz, process
+
+
+def normalize_city_name(name: str) -> str:
+    return ' '.join(name.lower().replace('ё', 'е').replace('-', ' ').split())
+
+
+class CityCatalog:
+    def __init__(self, rows):
+        """rows - (city_id, name), упорядоченные по city_id."""
+        self.names: list[str] = [name for _, name in rows]
+        self._keys: list[str] = [normalize_city_name(name) for name in self.names]
+
+    def top(self, limit: int) -> list[str]:
+        return self.names[:limit]
+
+    def search(self, query: str, limit: int = 3, score_cutoff: float = 85) -> list[str]:
+        key = normalize_city_name(query)
+        if not key:
+            return []
+        # Точное совпадение и начало названия ("мин" -> "Минск") - без нечеткой оценки
+        exact = [name for name, city_key in zip(self.names, self._keys) if city_key == key]
+        prefix = [name for name, city_key in zip(self.names, self._keys) if city_key.startswith(key) and city_key != key]
+        found = exact + sorted(prefix, key=len)
+        if len(found) < limit:
+            fuzzy = process.extract(key, self._keys, scorer=fuzz.WRatio, processor=None,
+                                    limit=limit, score_cutoff=score_cutoff)
+            found += [self.names[index] for _, _, index in fuzzy if self.names[index] not in found]
+        return found[:limit]
+
+
+# Каталоги процесса: название страны -> CityCatalog
+_catalogs: dict[str, CityCatalog] = {}
+# Увеличивается при каждой инвалидации: каталог, загрузка которого началась раньше, не сохраняется
+_generation = 0
+
+
+def get(country_name: str) -> CityCatalog | None:
+    return _catalogs.get(country_name)
+
+
+def generation() -> int:
+    return _generation
+
+
+def store(country_name: str, catalog: CityCatalog, loaded_generation: int):
+    if loaded_generation == _generation:
+        _catalogs[country_name] = catalog
+
+
+def invalidate():
+    global _generation
+    _generation += 1
+    _catalogs.clear()
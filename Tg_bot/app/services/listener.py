@@ -14,6 +14,7 @@ from app.lexicon import Lexicon
 # Правильный импорт вашей функции
 from app.services.recommendation import get_recommended_artists
 from app.handlers.subscriptions import RecommendationFlow # Импортируем наш новый FSM
+from app.services import reference_data
 from aiogram.fsm.storage.redis import RedisStorage # Или ваш FSM Storage
 from app.keyboards import keyboards as kb
 import logging # Добавьте импорт в начало файла
@@ -183,6 +184,12 @@ async def listen_for_db_notifications(bot: Bot, storage: RedisStorage):
             favorite_handler_with_bot = lambda c, p, ch, pl: asyncio.create_task(favorite_notification_handler(bot, storage, c, p, ch, pl))
             await asyncpg_conn.add_listener("user_favorite_added_channel", favorite_handler_with_bot)
             print("✅ Подписка на канал 'user_favorite_added_channel' выполнена.")
+
+            # 3. Изменения справочников (страны, города, типы событий) - сбрасываем кэш
+            await asyncpg_conn.add_listener(reference_data.REFERENCE_DATA_CHANNEL, reference_data.notification_handler)
+            # Пока слушателя не было, справочники могли измениться
+            reference_data.invalidate()
+            print(f"✅ Подписка на канал '{reference_data.REFERENCE_DATA_CHANNEL}' выполнена.")
             
             print("\nСлушатель готов к работе. Ожидание уведомлений...")
             while True:
@@ -0,0 +1,68 @@
+# app/services/reference_data.py
+#
+# Кэш справочников (страны, типы событий) в памяти процесса бота.
+# Раньше get_countries() ходил в БД на каждое нажатие галочки региона - только чтобы заново
+# нарисовать ту же клавиатуру, хотя список стран меняется раз в месяц.
+# Значение живет REFERENCE_DATA_TTL секунд (страховка) и сбрасывается сразу при изменении
+# таблицы: триггеры шлют NOTIFY в REFERENCE_DATA_CHANNEL с именем таблицы (migrations/m0001_baseline.py),
+# слушатель бота (app/services/listener.py) вызывает invalidate(<таблица>).
+# Каталоги городов (app/services/city_catalog.py) сбрасываются тем же уведомлением для cities.
+#
+# Переменные окружения:
+#   REFERENCE_DATA_TTL - время жизни значения в секундах (по умолчанию 1 час)
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from app.services import city_catalog
+
+REFERENCE_DATA_TTL = float(os.getenv('REFERENCE_DATA_TTL', 60 * 60))
+REFERENCE_DATA_CHANNEL = 'reference_data_changed_channel'
+
+T = TypeVar('T')
+
+# ключ -> (время загрузки, значение)
+_values: dict[str, tuple[float, object]] = {}
+# ключ -> таблицы, от которых зависит значение
+_tables: dict[str, tuple[str, ...]] = {}
+_locks: dict[str, asyncio.Lock] = {}
+# Увеличивается при каждой инвалидации: значение, загрузка которого началась раньше, не сохраняется
+_generation = 0
+
+
+async def get_or_load(key: str, loader: Callable[[], Awaitable[T]], tables: tuple[str, ...]) -> T:
+    """Значение из кэша; если его нет или оно старше TTL - loader() (один на ключ, даже при параллельных вызовах)."""
+    cached = _values.get(key)
+    if cached is not None and time.monotonic() - cached[0] < REFERENCE_DATA_TTL:
+        return cached[1]
+    lock = _locks.setdefault(key, asyncio.Lock())
+    async with lock:
+        # Пока ждали блокировку, значение мог загрузить другой обработчик
+        cached = _values.get(key)
+        if cached is not None and time.monotonic() - cached[0] < REFERENCE_DATA_TTL:
+            return cached[1]
+        loaded_generation = _generation
+        value = await loader()
+        _tables[key] = tables
+        if loaded_generation == _generation:
+            _values[key] = (time.monotonic(), value)
+        return value
+
+
+def invalidate(table: str | None = None):
+    """Сбрасывает значения, зависящие от таблицы (None - все)."""
+    global _generation
+    _generation += 1
+    for key in [key for key in _values if table is None or table in _tables.get(key, ())]:
+        del _values[key]
+    if table is None or table in ('cities', 'countries'):
+        city_catalog.invalidate()
+    logging.info(f"Справочники сброшены: {table or 'все'}")
+
+
+def notification_handler(connection, pid, channel, payload):
+    """Обработчик NOTIFY для asyncpg: payload - имя измененной таблицы."""
+    invalidate(payload or None)
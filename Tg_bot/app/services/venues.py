@@ -0,0 +1,76 @@
+# app/services/venues.py
+#
+# Нормализация названий мест проведения. Парсеры отдают место "как на сайте":
+# "Минск-Арена", "Minsk Arena, Минск", "Минск-Арена, пр-т Победителей, 111" - это одно место,
+# но раньше для каждого варианта создавалась своя строка в venues.
+# normalize_venue_name() сводит такие варианты к одному ключу (venues.normalized_key):
+# регистр, ё, кавычки, дефисы, хвосты с городом и адресом, латиница/кириллица.
+
+import re
+
+# Города, которые парсеры дописывают к названию места через запятую или в скобках
+KNOWN_CITIES = (
+    'минск', 'брест', 'витебск', 'гомель', 'гродно', 'могилев', 'лида', 'молодечно', 'сморгонь', 'несвиж',
+    'minsk', 'brest', 'vitebsk', 'gomel', 'grodno', 'mogilev',
+)
+
+# Части через запятую, начинающиеся с этих слов, - адрес, а не название
+ADDRESS_MARKERS = re.compile(
+    r'^(ул|улица|пр|пр-т|пр-кт|проспект|пер|переулок|пл|площадь|бул|бульвар|тракт|ш|шоссе|наб|набережная|'
+    r'д|дом|г|город|st|str|street|ave|avenue|pr)\b\.?'
+)
+
+# ... или заканчивающиеся ими: "Октябрьская пл.", "Победителей пр-т"
+ADDRESS_SUFFIX_MARKERS = re.compile(
+    r'\s(ул|улица|пр|пр-т|пр-кт|проспект|пер|переулок|пл|площадь|бул|бульвар|тракт|ш|шоссе|наб|набережная|'
+    r'st|str|street|ave|avenue)\.?$'
+)
+
+# Части через запятую с номером, которые все же относятся к названию: "Prime Hall, зал 1"
+HALL_MARKERS = re.compile(r'\b(зал|hall|сцена|stage|студия|studio|павильон|pavilion)\b')
+
+_CYRILLIC_TO_LATIN = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z', 'и': 'i',
+    'й': 'i', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p', 'р': 'r', 'с': 's',
+    'т': 't', 'у': 'u', 'ф': 'f', 'х': 'h', 'ц': 'ts', 'ч': 'ch', 'ш': 'sh', 'щ': 'sch', 'ъ': '',
+    'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya', 'і': 'i', 'ў': 'u',
+}
+_TRANSLIT = str.maketrans(_CYRILLIC_TO_LATIN)
+
+# Сочетания, которые по-разному пишут латиницей: "Kh" / "H", "Tz" / "Ts", окончания "-iy" / "-y".
+# Одиночную "c" не трогаем: правило c -> ts портило и исходную латиницу ("Club" -> "tslub")
+_LATIN_SIMPLIFY = ((re.compile(r'(kh|h)'), 'h'), (re.compile(r'(ts|tz)'), 'ts'), (re.compile(r'(iy|yi|ii|y)\b'), 'i'))
+
+
+def _is_city(part: str, city_name: str | None) -> bool:
+    cleaned = re.sub(r'^(г\.|г\s|город\s)\s*', '', part).strip(' .')
+    return cleaned in KNOWN_CITIES or (city_name is not None and cleaned == city_name.lower().replace('ё', 'е'))
+
+
+def normalize_venue_name(name: str | None, city_name: str | None = None) -> str:
+    """
+    Ключ для сравнения мест: "Minsk Arena, Минск" и "Минск-Арена" -> "minsk arena".
+    Первая часть до запятой - всегда название; следующие части отбрасываются, если это город или адрес.
+    """
+    if not name:
+        return ''
+    text = name.lower().replace('ё', 'е')
+    # Город в скобках: "Минск-Арена (Минск)"
+    text = re.sub(r'\(([^)]*)\)', lambda m: '' if _is_city(m.group(1).strip(), city_name) else f' {m.group(1)} ', text)
+
+    parts = [part.strip() for part in text.split(',')]
+    kept = parts[:1]
+    for part in parts[1:]:
+        if not part or _is_city(part, city_name):
+            continue
+        if ADDRESS_MARKERS.match(part) or ADDRESS_SUFFIX_MARKERS.search(part) or (re.search(r'\d', part) and not HALL_MARKERS.search(part)):
+            break  # адрес; все, что после него (дом, корпус, этаж), - тоже адрес
+        kept.append(part)
+
+    text = ' '.join(kept)
+    text = re.sub(r'[«»"“”„\'`]', '', text)
+    text = re.sub(r'[^\w\s]|_', ' ', text)
+    text = text.translate(_TRANSLIT)
+    for pattern, replacement in _LATIN_SIMPLIFY:
+        text = pattern.sub(replacement, text)
+    return ' '.join(text.split())[:500]
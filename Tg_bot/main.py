@@ -1,9 +1,11 @@
 import asyncio
 from aiogram import Bot, Dispatcher
 from app.database.models import async_main
+from app.database.requests.requests import load_artist_index
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 from app.handlers  import main_router as router
+from app.middlewares import DbSessionMiddleware, LatencyMiddleware, log_db_stats, log_latency_stats
 from app.services.listener import listen_for_db_notifications
 from app.services.notifier import send_reminders
 from aiogram.fsm.storage.redis import RedisStorage
@@ -17,14 +19,27 @@ load_dotenv()
 async def main():
     bot = Bot(token=os.getenv("BOT_TOKEN"))
     await async_main()
+    # Индекс для поиска артистов по имени; артистов, добавленных парсером, дочитываем по расписанию
+    await load_artist_index()
     storage = RedisStorage.from_url('redis://localhost:6379/0')
     listener_task = asyncio.create_task(listen_for_db_notifications(bot, storage))
     scheduler = AsyncIOScheduler(timezone="Europe/Minsk") # Укажите ваш часовой пояс
     scheduler.add_job(send_reminders, 'interval', seconds=30, args=(bot,))
+    scheduler.add_job(load_artist_index, 'interval', minutes=5)
+    scheduler.add_job(load_artist_index, 'interval', hours=1, kwargs={'full': True})
+    scheduler.add_job(log_latency_stats, 'interval', minutes=10)
+    scheduler.add_job(log_db_stats, 'interval', minutes=10)
     scheduler.start()
     print("Планировщик уведомлений запущен.")
     print("Слушатель уведомлений от базы данных запущен в фоновом режиме.")
     dp = Dispatcher(storage=storage)
+    # Время обработки апдейтов (в т.ч. ожидание FSM-хранилища) - см. app/middlewares/latency.py
+    dp.callback_query.outer_middleware(LatencyMiddleware())
+    dp.message.outer_middleware(LatencyMiddleware())
+    # Сессия БД и контекст пользователя на апдейт - см. app/middlewares/db_session.py.
+    # Внутренний middleware: работает только для апдейтов, у которых нашелся хэндлер
+    dp.callback_query.middleware(DbSessionMiddleware())
+    dp.message.middleware(DbSessionMiddleware())
     dp.include_router(router)
     await dp.start_polling(bot)
     
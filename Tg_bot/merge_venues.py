@@ -0,0 +1,66 @@
+# Файл: merge_venues.py
+#
+# Разовое слияние дублей мест проведения, накопившихся до нормализации названий
+# ("Минск-Арена", "Minsk Arena, Минск", "Минск-Арена, пр-т Победителей, 111" -> одно место).
+# Заодно проставляет venues.normalized_key всем местам - после этого новые события
+# находят место по ключу (app/database/requests/requests_venues.py).
+#
+# Запуск из папки Tg_bot:
+#   python merge_venues.py merge                  # показать, что будет слито (ничего не меняет)
+#   python merge_venues.py merge --apply          # слить
+#   python merge_venues.py alias 42 "Palace of the Republic"   # закрепить написание за местом 42
+#
+# Псевдоним нужен, когда нормализация сама не сводит написания (перевод, а не транслитерация);
+# места с таким написанием сливаются с указанным при следующем merge --apply.
+
+import argparse
+import asyncio
+
+from app.database.models import async_main
+from app.database.requests.requests_venues import add_venue_alias, apply_venue_merges, plan_venue_merges
+
+
+async def merge(apply: bool):
+    # Колонка normalized_key и таблица venue_aliases должны существовать
+    await async_main()
+
+    merges, keys = await plan_venue_merges()
+    duplicates = sum(len(merge.duplicate_ids) for merge in merges)
+    print(f"\nМест всего: {len(keys)}, групп с дублями: {len(merges)}, дублей: {duplicates}")
+    for merge in sorted(merges, key=lambda m: -len(m.duplicate_ids)):
+        print(f"\n  [{merge.target_id}] {merge.target_name}  (ключ '{merge.key}', город {merge.city_id})")
+        for venue_id, name in zip(merge.duplicate_ids, merge.duplicate_names):
+            print(f"      <- [{venue_id}] {name}")
+
+    if not apply:
+        print("\nЭто пробный запуск. Для слияния: python merge_venues.py merge --apply")
+        return
+    moved = await apply_venue_merges(merges, keys)
+    print(f"\nГотово: удалено дублей {duplicates}, перенесено событий {moved}.")
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description="Слияние дублей мест проведения")
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    merge_cmd = subparsers.add_parser('merge', help='Слить места с одинаковым нормализованным названием')
+    merge_cmd.add_argument('--apply', action='store_true', help='Применить (без флага - только показать)')
+
+    alias_cmd = subparsers.add_parser('alias', help='Закрепить написание названия за местом')
+    alias_cmd.add_argument('venue_id', type=int)
+    alias_cmd.add_argument('name')
+
+    args = arg_parser.parse_args()
+    if args.command == 'merge':
+        await merge(args.apply)
+    elif args.command == 'alias':
+        alias_id = await add_venue_alias(args.venue_id, args.name)
+        if alias_id is None:
+            print(f"Место {args.venue_id} не найдено.")
+        else:
+            print(f"Псевдоним '{args.name}' закреплен за местом {args.venue_id}. "
+                  f"Чтобы слить уже существующие места: python merge_venues.py merge --apply")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,146 @@
+# Файл: parsers/bench_extract.py
+#
+# Бенчмарк: прежний разбор карточек на BeautifulSoup против скомпилированных селекторов lxml
+# (parsers/fast_extract.py) на сохраненных страницах.
+#
+# Запуск из папки Tg_bot:
+#   python -m parsers.bench_extract --yandex saved/yandex_*.html --bezkassira saved/bezkassira_*.html
+#   python -m parsers.bench_extract --synthetic 300      # без сохраненных страниц: сгенерированная страница Яндекса
+#
+# Страницы Яндекса удобно сохранять из Selenium: open(path, 'wb').write(driver.page_source.encode('utf-8')).
+
+import argparse
+import glob
+import re
+import statistics
+import time
+
+from bs4 import BeautifulSoup
+
+from parsers import yandex_parser, bezkassira_parser
+from parsers.configs.yandex_by_concert import CONFIG as YANDEX_CONFIG
+from parsers.configs.bezkassira_by_sport import CONFIG as BEZKASSIRA_CONFIG
+from parsers.raw_event import RawEvent
+
+
+# --- Эталон: прежний код на BeautifulSoup (до перехода на fast_extract) ---
+def yandex_cards_bs4(html: bytes) -> list[RawEvent]:
+    soup = BeautifulSoup(html, 'lxml')
+    events = []
+    for card in soup.find_all("div", attrs={"data-test-id": "eventCard.root"}):
+        title_element = card.find("h2", attrs={"data-test-id": "eventCard.eventInfoTitle"})
+        title = title_element.get_text(strip=True) if title_element else "Название не найдено"
+        link_element = card.find("a", attrs={"data-test-id": "eventCard.link"})
+        link = "https://afisha.yandex.ru" + link_element['href'] if link_element else "Ссылка не найдена"
+        details_list = card.find("ul", attrs={"data-test-id": "eventCard.eventInfoDetails"})
+        place = "Место не указано"
+        date_str = "Дата не указана"
+        if details_list:
+            details_items = details_list.find_all("li")
+            if len(details_items) > 0:
+                date_str = details_items[0].get_text(strip=True)
+            if len(details_items) > 1:
+                place_link = details_items[1].find('a')
+                place = place_link.get_text(strip=True) if place_link else details_items[1].get_text(strip=True)
+        price_min = None
+        price_element = card.find("span", string=re.compile(r'от \d+'))
+        if price_element:
+            price_match = re.search(r'\d+', price_element.get_text(strip=True).replace(' ', ''))
+            if price_match:
+                price_min = float(price_match.group(0))
+        events.append(RawEvent(title=title, place=place, time_str=date_str, link=link, price_min=price_min))
+    return events
+
+
+def bezkassira_cards_bs4(html: bytes) -> list[RawEvent]:
+    selectors = BEZKASSIRA_CONFIG['selectors']
+    soup = BeautifulSoup(html, 'lxml')
+    events = []
+    for card in soup.select(selectors['event_card']):
+        caption_div = card.select_one(selectors['caption'])
+        if not caption_div:
+            continue
+        title_element = caption_div.select_one(selectors['title'])
+        link_element = caption_div.select_one(selectors['link'])
+        date_element = card.select_one(selectors['date'])
+        place_element = card.select_one(selectors['place'])
+        if not all([title_element, link_element, date_element, place_element]):
+            continue
+        link = link_element['href']
+        if not link.startswith('http'):
+            link = "https://bezkassira.by" + link
+        dt_object = bezkassira_parser.parse_date(date_element.get_text(strip=True))
+        events.append(RawEvent(title=title_element.get_text(strip=True),
+                               place=place_element.get_text(separator=" ", strip=True),
+                               time_str="Время уточняйте на сайте", link=link,
+                               timestamp=int(dt_object.timestamp()) if dt_object else None))
+    return events
+
+
+def synthetic_yandex_page(cards: int) -> bytes:
+    """Страница, повторяющая разметку карточек Яндекс.Афиши, с "шумом" вокруг, как на реальной странице."""
+    noise = '<div class="Noise-sc-1"><span>реклама</span><a href="/x">ссылка</a></div>' * 5
+    card = (
+        '<div data-test-id="eventCard.root" class="Root-sc-1">{noise}'
+        '<a data-test-id="eventCard.link" href="/moscow/concert/event-{i}"><img src="/i.png"/></a>'
+        '<h2 data-test-id="eventCard.eventInfoTitle">Концерт номер {i}</h2>'
+        '<ul data-test-id="eventCard.eventInfoDetails"><li>{day} июля, 19:00</li>'
+        '<li><a href="/places/{i}">Клуб {i}</a></li></ul>'
+        '<div><span>от {price} ₽</span></div></div>'
+    )
+    body = ''.join(card.format(i=i, day=1 + i % 28, price=500 + i, noise=noise) for i in range(cards))
+    return f'<html><head><meta charset="utf-8"></head><body>{noise * 50}{body}</body></html>'.encode('utf-8')
+
+
+def bench(name: str, func, pages: list[bytes], repeat: int) -> float:
+    """Возвращает медианное время разбора одной страницы (мс)."""
+    timings = []
+    for _ in range(repeat):
+        for html in pages:
+            started = time.perf_counter()
+            func(html)
+            timings.append((time.perf_counter() - started) * 1000)
+    median = statistics.median(timings)
+    print(f"  {name:<28} медиана {median:8.2f} мс/стр, p95 {sorted(timings)[int(len(timings) * 0.95) - 1]:8.2f} мс/стр")
+    return median
+
+
+def compare(site: str, pages: list[bytes], old_func, new_func, repeat: int):
+    if not pages:
+        return
+    print(f"\n{site}: {len(pages)} стр., {sum(map(len, pages)) / 1024:.0f} КБ")
+
+    def as_dicts(events):
+        return [event.to_dict() for event in events]
+
+    mismatches = sum(1 for html in pages if as_dicts(old_func(html)) != as_dicts(new_func(html)))
+    if mismatches:
+        print(f"  ВНИМАНИЕ: результаты расходятся на {mismatches} стр.")
+    old = bench('BeautifulSoup (прежний код)', old_func, pages, repeat)
+    new = bench('lxml + скомпилированный XPath', new_func, pages, repeat)
+    print(f"  Ускорение: x{old / new:.1f}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument('--yandex', nargs='*', default=[], help='Сохраненные страницы списка Яндекс.Афиши')
+    arg_parser.add_argument('--bezkassira', nargs='*', default=[], help='Сохраненные страницы списка Bezkassira')
+    arg_parser.add_argument('--synthetic', type=int, default=0, help='Сгенерировать страницу Яндекса с N карточками')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    def load(patterns):
+        return [open(path, 'rb').read() for pattern in patterns for path in sorted(glob.glob(pattern))]
+
+    yandex_pages = load(args.yandex)
+    if args.synthetic:
+        yandex_pages.append(synthetic_yandex_page(args.synthetic))
+
+    compare('Yandex.Afisha', yandex_pages, yandex_cards_bs4,
+            lambda html: yandex_parser.extract_cards(html, YANDEX_CONFIG['selectors']), args.repeat)
+    compare('Bezkassira', load(args.bezkassira), bezkassira_cards_bs4,
+            lambda html: bezkassira_parser.extract_cards(html, BEZKASSIRA_CONFIG['selectors']), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+# Файл: parsers/bench_json_blob.py
+#
+# Бенчмарк: прежнее ленивое регулярное выражение для window.concertsListEvents
+# против parsers/json_blob.py на больших страницах списка.
+#
+# Запуск из папки Tg_bot:
+#   python -m parsers.bench_json_blob                       # сгенерированные страницы на 100/1000/5000 событий
+#   python -m parsers.bench_json_blob --pages saved/kvitki_*.html
+
+import argparse
+import glob
+import json
+import re
+import statistics
+import time
+
+from parsers.json_blob import find_window_blob
+
+OLD_REGEX = r'window\.concertsListEvents\s*=\s*(\[.*?\]);'
+
+
+def old_extract(page: bytes):
+    """Прежний код kvitki_parser: декодирование всей страницы + ленивый regex + json.loads группы."""
+    match = re.search(OLD_REGEX, page.decode('utf-8'))
+    return json.loads(match.group(1)) if match else None
+
+
+def synthetic_listing_page(events: int) -> bytes:
+    """Страница, похожая на список Kvitki: много разметки, затем большой JSON-массив в <script>."""
+    items = [{
+        'id': i,
+        'title': f'Концерт {i}',
+        'venueDescription': 'Минск-Арена, Минск',
+        'localisedStartDate': '24 июля 2025, 19:00',
+        'shortUrl': f'/rus/bileti/muzyka/event-{i}/',
+        'description': 'Программа: часть 1; часть 2 ' * 10,
+        'tags': ['музыка', 'концерт'],
+        'startTime': {'stamp': 1753372800 + i},
+    } for i in range(events)]
+    markup = '<div class="event_short"><a href="/x">Событие</a></div>\n' * (events * 3)
+    script = f'<script>window.concertsListEvents = {json.dumps(items, ensure_ascii=False)};</script>'
+    return f'<html><head><meta charset="utf-8"></head><body>{markup}{script}{markup}</body></html>'.encode('utf-8')
+
+
+def bench(func, page: bytes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(page)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument('--pages', nargs='*', default=[], help='Сохраненные страницы списка Kvitki')
+    arg_parser.add_argument('--sizes', nargs='*', type=int, default=[100, 1000, 5000], help='Размеры сгенерированных страниц')
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    pages = [(path, open(path, 'rb').read()) for pattern in args.pages for path in sorted(glob.glob(pattern))]
+    if not pages:
+        pages = [(f'синтетическая, {n} событий', synthetic_listing_page(n)) for n in args.sizes]
+
+    # Корректность: "];" внутри строки обрывает JSON для старого регулярного выражения
+    tricky = 'window.concertsListEvents = [{"title": "Акустика ]; live"}];'.encode('utf-8')
+    try:
+        old_extract(tricky)
+        print('regex: "];" внутри строки обработан')
+    except json.JSONDecodeError:
+        print('regex: "];" внутри строки ломает разбор')
+    print(f'json_blob: {find_window_blob(tricky, "concertsListEvents")}\n')
+
+    for label, page in pages:
+        new_result = find_window_blob(page, 'concertsListEvents')
+        old_result = old_extract(page)
+        same = 'совпадают' if old_result == new_result else 'РАСХОДЯТСЯ'
+        old_ms = bench(old_extract, page, args.repeat)
+        new_bytes_ms = bench(lambda p: find_window_blob(p, 'concertsListEvents'), page, args.repeat)
+        text = page.decode('utf-8')
+        new_text_ms = bench(lambda p: find_window_blob(p, 'concertsListEvents'), text, args.repeat)
+        print(f"{label} ({len(page) / 1024 / 1024:.1f} МБ, результаты {same}):\n"
+              f"  regex:               {old_ms:8.2f} мс\n"
+              f"  json_blob (bytes):   {new_bytes_ms:8.2f} мс  (x{old_ms / new_bytes_ms:.1f})\n"
+              f"  json_blob (str):     {new_text_ms:8.2f} мс  (x{old_ms / new_text_ms:.1f})")
+
+
+if __name__ == '__main__':
+    main()
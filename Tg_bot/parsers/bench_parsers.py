@@ -0,0 +1,189 @@
+# Файл: parsers/bench_parsers.py
+#
+# Бенчмарк парсеров на записанных фикстурах (parsers/fixtures.py) - без сети.
+# Для каждого конфига: страниц/сек, событий/сек и пиковая память (RSS).
+# Каждый парсер запускается в отдельном процессе, чтобы пиковая память не смешивалась между парсерами.
+#
+# Запуск из папки Tg_bot:
+#   python -m parsers.bench_parsers record --config "Kvitki.by (Музыка)"   # один раз записать набор с живого сайта
+#   python -m parsers.bench_parsers run                                    # все конфиги, для которых есть наборы
+#   python -m parsers.bench_parsers run --save-baseline bench_baseline.json
+#   python -m parsers.bench_parsers run --baseline bench_baseline.json     # сравнить с эталоном, код 1 при регрессии
+#
+# Наборы хранятся в <fixture-dir>/<имя конфига>/ (по умолчанию parsers/fixtures_data/).
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+from parsers import fixtures, registry
+
+
+def bundle_dir(fixture_dir: str, key: str) -> str:
+    slug = re.sub(r'[^\w.-]+', '_', key, flags=re.UNICODE).strip('_')
+    return os.path.join(fixture_dir, slug)
+
+
+def run_parser(config: dict) -> list:
+    # Модуль парсера импортируется только здесь, в процессе, который его запускает
+    return asyncio.run(registry.get_parser(config['parsing_method'])(config))
+
+
+def child_main(key: str, mode: str, directory: str):
+    """Запуск одного парсера в текущем процессе; результат - одна строка JSON в stdout."""
+    config = registry.all_configs()[key]
+    bundle = fixtures.set_mode(mode, directory)
+
+    started = time.perf_counter()
+    events = run_parser(config)
+    elapsed = time.perf_counter() - started
+
+    if mode == 'record':
+        fixtures.save()
+    fixtures.stop_replay_server()
+    try:
+        from parsers.parse_pool import shutdown_pool
+        shutdown_pool()
+    except ImportError:
+        pass
+
+    # ru_maxrss в Linux - в КБ. CHILDREN - максимум среди завершенных дочерних процессов (браузер, разборщики)
+    print(json.dumps({
+        'elapsed': elapsed,
+        'pages': bundle.hits if mode == 'replay' else len(bundle),
+        'misses': bundle.misses,
+        'events': len(events),
+        'rss_self_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'rss_children_mb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }))
+
+
+def spawn(key: str, mode: str, directory: str) -> dict | None:
+    proc = subprocess.run(
+        [sys.executable, '-m', 'parsers.bench_parsers', '_child', '--config', key, '--mode', mode, '--dir', directory],
+        capture_output=True, text=True,
+    )
+    lines = [line for line in proc.stdout.splitlines() if line.startswith('{')]
+    if proc.returncode != 0 or not lines:
+        print(f"  ОШИБКА ({key}): {proc.stderr.strip().splitlines()[-1:] or proc.returncode}")
+        return None
+    return json.loads(lines[-1])
+
+
+def bench_config(key: str, directory: str, repeat: int) -> dict | None:
+    runs = [run for run in (spawn(key, 'replay', directory) for _ in range(repeat)) if run]
+    if not runs:
+        return None
+    elapsed = statistics.median(run['elapsed'] for run in runs)
+    last = runs[-1]
+    return {
+        'pages': last['pages'],
+        'misses': last['misses'],
+        'events': last['events'],
+        'elapsed': elapsed,
+        'pages_per_sec': last['pages'] / elapsed if elapsed else 0.0,
+        'events_per_sec': last['events'] / elapsed if elapsed else 0.0,
+        'peak_rss_mb': max(run['rss_self_mb'] for run in runs),
+        'peak_child_rss_mb': max(run['rss_children_mb'] for run in runs),
+    }
+
+
+def compare_with_baseline(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Регрессия: пропускная способность упала или память выросла больше, чем на tolerance."""
+    problems = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        for metric in ('pages_per_sec', 'events_per_sec'):
+            if previous[metric] and current[metric] < previous[metric] * (1 - tolerance):
+                problems.append(f"{key}: {metric} {previous[metric]:.1f} -> {current[metric]:.1f}")
+        if previous['peak_rss_mb'] and current['peak_rss_mb'] > previous['peak_rss_mb'] * (1 + tolerance):
+            problems.append(f"{key}: peak_rss_mb {previous['peak_rss_mb']:.0f} -> {current['peak_rss_mb']:.0f}")
+        if current['events'] != previous['events']:
+            problems.append(f"{key}: событий {previous['events']} -> {current['events']}")
+    return problems
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Бенчмарк парсеров на записанных фикстурах")
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    record_cmd = subparsers.add_parser('record', help='Записать наборы с живых сайтов')
+    run_cmd = subparsers.add_parser('run', help='Прогнать парсеры на наборах')
+    for cmd in (record_cmd, run_cmd):
+        cmd.add_argument('--config', nargs='*', default=[], help='site_name конфигов (по умолчанию - все)')
+        cmd.add_argument('--fixture-dir', default=fixtures.DEFAULT_FIXTURE_DIR)
+    run_cmd.add_argument('--repeat', type=int, default=3)
+    run_cmd.add_argument('--baseline', help='JSON с эталонными результатами для сравнения')
+    run_cmd.add_argument('--save-baseline', help='Сохранить результаты как эталон')
+    run_cmd.add_argument('--tolerance', type=float, default=0.2, help='Допустимое ухудшение (доля)')
+
+    child_cmd = subparsers.add_parser('_child')
+    child_cmd.add_argument('--config', required=True)
+    child_cmd.add_argument('--mode', required=True)
+    child_cmd.add_argument('--dir', required=True)
+
+    args = arg_parser.parse_args()
+
+    if args.command == '_child':
+        child_main(args.config, args.mode, args.dir)
+        return
+
+    configs = registry.all_configs()
+    keys = args.config or sorted(configs)
+    unknown = [key for key in keys if key not in configs]
+    if unknown:
+        sys.exit(f"Неизвестные конфиги: {unknown}. Доступны: {sorted(configs)}")
+
+    if args.command == 'record':
+        for key in keys:
+            if not registry.is_registered(configs[key].get('parsing_method')):
+                continue
+            print(f"Запись: {key}")
+            result = spawn(key, 'record', bundle_dir(args.fixture_dir, key))
+            if result:
+                print(f"  записано ответов: {result['pages']}, событий: {result['events']}")
+        return
+
+    results = {}
+    print(f"{'конфиг':<34} {'стр.':>5} {'событ.':>6} {'стр/с':>8} {'событ/с':>8} {'RSS, МБ':>8} {'дочерн., МБ':>11}")
+    for key in keys:
+        directory = bundle_dir(args.fixture_dir, key)
+        if not registry.is_registered(configs[key].get('parsing_method')) or not os.path.exists(os.path.join(directory, 'index.json')):
+            continue
+        result = bench_config(key, directory, args.repeat)
+        if result is None:
+            continue
+        results[key] = result
+        print(f"{key:<34} {result['pages']:>5} {result['events']:>6} {result['pages_per_sec']:>8.1f} "
+              f"{result['events_per_sec']:>8.1f} {result['peak_rss_mb']:>8.0f} {result['peak_child_rss_mb']:>11.0f}"
+              + (f"  (нет в наборе: {result['misses']})" if result['misses'] else ''))
+
+    if not results:
+        print("Нет записанных наборов. Сначала: python -m parsers.bench_parsers record --config <site_name>")
+        return
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\nЭталон сохранен: {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            problems = compare_with_baseline(results, json.load(f), args.tolerance)
+        if problems:
+            print("\nРЕГРЕССИЯ относительно эталона:\n  " + "\n  ".join(problems))
+            sys.exit(1)
+        print("\nРегрессий относительно эталона нет.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+# Файл: parsers/bench_startup.py
+#
+# Замер стоимости запуска run_parser.py: время импорта и память процесса (RSS) после импорта.
+#   eager        - как было до реестра: все модули парсеров и AI импортируются сразу;
+#   lazy         - текущий run_parser (парсеры грузятся через parsers/registry.py по требованию);
+#   lazy+<метод> - текущий run_parser + загрузка одного парсера (то, что реально нужно прогону).
+# Каждый вариант - в новом процессе, берется медиана по нескольким запускам.
+#
+# Запуск из папки Tg_bot:
+#   python -m parsers.bench_startup
+#   python -m parsers.bench_startup --repeat 7 --method selenium_yandex
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Что импортировал run_parser.py до перехода на ленивый реестр
+EAGER_MODULES = [
+    'parsers.test_parser',
+    'parsers.test_ai',
+    'parsers.kvitki_parser',
+    'parsers.bezkassira_parser',
+    'parsers.liveball_parser',
+    'parsers.yandex_parser',
+]
+
+CHILD_CODE = r'''
+import importlib, json, resource, sys, time
+modules, method = json.loads(sys.argv[1]), sys.argv[2]
+started = time.perf_counter()
+missing = []
+for name in modules:
+    try:
+        importlib.import_module(name)
+    except ImportError as e:
+        missing.append(f"{name}: {e}")
+import run_parser
+if method:
+    from parsers import registry
+    registry.get_parser(method)
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    'elapsed': elapsed,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'modules': len(sys.modules),
+    'missing': missing,
+}))
+'''
+
+
+def measure(modules: list[str], method: str, repeat: int) -> dict:
+    tg_bot_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=tg_bot_dir)
+    # Подключение к БД при импорте не открывается, но переменные должны быть заданы
+    for name, value in (('DB_HOST', 'localhost'), ('DB_PORT', '5432'), ('DB_NAME', 'bench'),
+                        ('DB_USER', 'bench'), ('DB_PASS', 'bench')):
+        env.setdefault(name, value)
+
+    runs = []
+    # Отдельная рабочая папка: run_parser при импорте открывает logs.txt
+    with tempfile.TemporaryDirectory() as workdir:
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, '-c', CHILD_CODE, json.dumps(modules), method or ''],
+                                  capture_output=True, text=True, env=env, cwd=workdir)
+            if proc.returncode != 0:
+                return {'error': proc.stderr.strip().splitlines()[-1]}
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return {
+        'elapsed_ms': statistics.median(run['elapsed'] for run in runs) * 1000,
+        'rss_mb': statistics.median(run['rss_mb'] for run in runs),
+        'modules': runs[-1]['modules'],
+        'missing': runs[-1]['missing'],
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Время импорта и память run_parser.py")
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    arg_parser.add_argument('--method', default='bs4_bezkassira', help='Метод для варианта lazy+<метод>')
+    args = arg_parser.parse_args()
+
+    variants = [
+        ('eager', EAGER_MODULES, ''),
+        ('lazy', [], ''),
+        (f'lazy+{args.method}', [], args.method),
+    ]
+    print(f"{'вариант':<28} {'импорт, мс':>11} {'RSS, МБ':>8} {'модулей':>8}")
+    for name, modules, method in variants:
+        result = measure(modules, method, args.repeat)
+        if 'error' in result:
+            print(f"{name:<28} ошибка: {result['error']}")
+            continue
+        print(f"{name:<28} {result['elapsed_ms']:>11.0f} {result['rss_mb']:>8.1f} {result['modules']:>8}")
+        for missing in result['missing']:
+            print(f"    (не установлен: {missing})")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,14 @@
 # --- START OF FILE parsers/bezkassira_parser.py ---
 
 import requests
-from bs4 import BeautifulSoup
 from datetime import datetime
 import locale
-import time
+
+from parsers.rate_limiter import fetch
+from parsers.parse_pool import parse_html_sync
+from parsers.fast_extract import get_card_extractor
+from parsers.raw_event import RawEvent, intern_config
+from parsers import metrics
 
 # Устанавливаем русскую локаль для корректного парсинга названий месяцев
 try:
@@ -25,11 +29,38 @@ def parse_date(date_str: str) -> datetime | None:
         return None
 
 
-def parse(config: dict) -> list[dict]:
+def extract_cards(html: bytes, selectors: dict, config_id: int = -1) -> list[RawEvent]:
+    """
+    Разбирает страницу списка Bezkassira в список RawEvent.
+    Выполняется в процессе-разборщике (parsers/parse_pool.py).
+    """
+    events = []
+    for fields in get_card_extractor(selectors).extract(html):
+        if not all([fields['title'], fields['link'], fields['date'], fields['place']]):
+            continue
+
+        link = fields['link']
+        if not link.startswith('http'):
+            link = "https://bezkassira.by" + link
+
+        dt_object = parse_date(fields['date'])
+        timestamp = int(dt_object.timestamp()) if dt_object else None
+
+        # Цены не парсим с главной, оставляем None
+        events.append(RawEvent(
+            title=fields['title'],
+            place=fields['place'],
+            time_str="Время уточняйте на сайте",
+            link=link,
+            timestamp=timestamp,
+            config_id=config_id,
+        ))
+    return events
+
+
+def parse(config: dict) -> list[RawEvent]:
     site_name = config['site_name']
     url = config['url']
-    final_events = []
-
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
     }
@@ -37,64 +68,19 @@ def parse(config: dict) -> list[dict]:
     print(f"Начинаю парсинг BS4: {site_name}")
 
     try:
-        response = requests.get(url, headers=headers)
+        with metrics.stage('list_scan', site_name):
+            response = fetch(url, headers=headers)
         response.raise_for_status()
     except requests.RequestException as e:
         print(f"  - Ошибка при запросе к сайту {site_name}: {e}")
         return []
 
-    soup = BeautifulSoup(response.text, 'lxml')
     selectors = config['selectors']
+    final_events = parse_html_sync(extract_cards, response.content, selectors, intern_config(config))
 
-    # Теперь мы ищем родительскую карточку
-    event_cards = soup.select(selectors['event_card'])
-
-    if not event_cards:
+    if not final_events:
         print(f"  - Не найдено карточек событий для {site_name} по селектору '{selectors['event_card']}'.")
         return []
 
-    print(f"  - Найдено {len(event_cards)} событий для {site_name}. Начинаю обработку...")
-
-    for i, card in enumerate(event_cards):
-        # Ищем элементы внутри родительской карточки
-        caption_div = card.select_one(selectors['caption'])
-        if not caption_div:
-            continue
-
-        title_element = caption_div.select_one(selectors['title'])
-        link_element = caption_div.select_one(selectors['link'])
-        date_element = card.select_one(selectors['date'])
-        place_element = card.select_one(selectors['place'])
-
-        if not all([title_element, link_element, date_element, place_element]):
-            # print(f"  - Пропускаю карточку {i+1}, не все данные найдены.")
-            continue
-
-        title = title_element.get_text(strip=True)
-        link = link_element['href']
-
-        if not link.startswith('http'):
-            link = "https://bezkassira.by" + link
-
-        date_str = date_element.get_text(strip=True)
-        place_str = place_element.get_text(separator=" ", strip=True)
-
-        dt_object = parse_date(date_str)
-        timestamp = int(dt_object.timestamp()) if dt_object else None
-
-        # Цены не парсим с главной, оставляем None
-        event_info = {
-            'title': title,
-            'place': place_str,
-            'time': "Время уточняйте на сайте",
-            'link': link,
-            'timestamp': timestamp,
-            'price_min': None,
-            'price_max': None
-        }
-        final_events.append(event_info)
-        # print(f"    - Обработка {i + 1}/{len(event_cards)}: {title}")
-        time.sleep(0.1)  # Небольшая задержка
-
     print(f"Сайт {site_name} спарсен. Найдено событий: {len(final_events)}")
     return final_events
\ No newline at end of file
@@ -0,0 +1,254 @@
+# Файл: parsers/browser_watchdog.py
+#
+# Сторож памяти браузера. Chromium за длинный прогон (сотни вкладок в одном браузере Playwright,
+# 10 страниц в одном драйвере Selenium) разрастается без ограничений, и на машине с 4 ГБ
+# прогон убивает OOM killer. Сторож периодически измеряет RSS всех процессов браузера и
+# перезапускает браузер/контекст, когда превышен порог памяти или число открытых страниц.
+#
+# Политика:
+#   - мягкий порог (BROWSER_MAX_RSS_MB) или лимит страниц (BROWSER_MAX_PAGES): новые вкладки
+#     не открываются, пока не закроются текущие, затем браузер перезапускается - ничего не теряется;
+#   - жесткий порог (BROWSER_HARD_RSS_MB): браузер перезапускается сразу, обработка открытых
+#     вкладок обрывается, а их ссылки повторяются на новом браузере (см. test_parser.parse_site).
+# Пиковая память (high-water mark) запоминается по каждому конфигу и пишется в лог и в метрики прогона.
+
+import asyncio
+import itertools
+import logging
+import os
+from typing import Awaitable, Callable, Optional
+
+import psutil
+
+from parsers import metrics
+from parsers.raw_event import config_key
+
+logger = logging.getLogger()
+
+BROWSER_MAX_RSS_MB = float(os.getenv('BROWSER_MAX_RSS_MB', 1200))
+BROWSER_HARD_RSS_MB = float(os.getenv('BROWSER_HARD_RSS_MB', 2000))
+BROWSER_MAX_PAGES = int(os.getenv('BROWSER_MAX_PAGES', 150))
+SAMPLE_INTERVAL = 5.0  # сек, для фонового замера Playwright
+
+# Процессы браузера среди потомков нашего процесса (процессы-разборщики parse_pool не считаются)
+BROWSER_PROCESS_MARKERS = ('chrome', 'chromium', 'headless_shell')
+
+# Пиковая память браузера по конфигам за прогон, МБ
+_high_water: dict[str, float] = {}
+
+# Метка в командной строке браузера (Chromium игнорирует незнакомые ключи): по ней находится
+# корневой процесс конкретного браузера, когда в процессе открыто несколько браузеров
+BROWSER_TAG_SWITCH = '--watchdog-tag='
+_browser_tags = itertools.count(1)
+
+
+def browser_rss_mb(root_pid: Optional[int] = None) -> float:
+    """
+    Суммарный RSS процессов браузера, МБ.
+    root_pid - корневой процесс браузера (например, chromedriver у Selenium): считаются он и все его потомки.
+    Без root_pid - все процессы Chromium среди потомков текущего процесса.
+    """
+    try:
+        if root_pid is not None:
+            root = psutil.Process(root_pid)
+            processes = [root] + root.children(recursive=True)
+        else:
+            processes = [
+                p for p in psutil.Process().children(recursive=True)
+                if any(marker in p.name().lower() for marker in BROWSER_PROCESS_MARKERS)
+            ]
+    except psutil.Error:
+        return 0.0
+
+    total = 0
+    for process in processes:
+        try:
+            total += process.memory_info().rss
+        except psutil.Error:
+            continue  # процесс успел завершиться
+    return total / (1024 * 1024)
+
+
+def find_tagged_browser_pid(tag: str) -> Optional[int]:
+    """Корневой процесс браузера с меткой tag среди потомков текущего процесса (или None)."""
+    switch = f"{BROWSER_TAG_SWITCH}{tag}"
+    tagged = {}
+    for process in psutil.Process().children(recursive=True):
+        try:
+            if switch in process.cmdline():
+                tagged[process.pid] = process.ppid()
+        except psutil.Error:
+            continue
+    # Дочерние процессы могут унаследовать ключ - корень тот, чей родитель без метки
+    return next((pid for pid, parent in tagged.items() if parent not in tagged), None)
+
+
+def get_high_water() -> dict[str, float]:
+    return dict(_high_water)
+
+
+def log_high_water():
+    for name, peak in sorted(_high_water.items(), key=lambda item: -item[1]):
+        logger.info(f"[watchdog] Пик памяти браузера: {name}: {peak:.0f} МБ")
+
+
+class BrowserWatchdog:
+    """Счетчики и пороги для одного браузера (одного конфига)."""
+
+    def __init__(self, name: str, max_rss_mb: float = BROWSER_MAX_RSS_MB, hard_rss_mb: float = BROWSER_HARD_RSS_MB,
+                 max_pages: int = BROWSER_MAX_PAGES, root_pid: Optional[int] = None):
+        self.name = name
+        self.max_rss_mb = max_rss_mb
+        self.hard_rss_mb = max(hard_rss_mb, max_rss_mb)
+        self.max_pages = max_pages
+        self.root_pid = root_pid
+        self.pages = 0
+        self.last_rss_mb = 0.0
+        self.high_water_mb = 0.0
+        self.recycles = 0
+
+    @classmethod
+    def for_config(cls, config: dict, root_pid: Optional[int] = None) -> 'BrowserWatchdog':
+        """Пороги можно переопределить в конфиге: browser_max_rss_mb, browser_max_pages."""
+        return cls(
+            name=config_key(config),
+            max_rss_mb=config.get('browser_max_rss_mb', BROWSER_MAX_RSS_MB),
+            max_pages=config.get('browser_max_pages', BROWSER_MAX_PAGES),
+            root_pid=root_pid,
+        )
+
+    def sample(self) -> float:
+        rss = browser_rss_mb(self.root_pid)
+        self.last_rss_mb = rss
+        if rss > self.high_water_mb:
+            self.high_water_mb = rss
+            if rss > _high_water.get(self.name, 0.0):
+                _high_water[self.name] = rss
+                metrics.gauge_max(f'browser_rss_peak_mb:{self.name}', round(rss))
+        return rss
+
+    def page_opened(self):
+        self.pages += 1
+
+    def soft_reason(self) -> Optional[str]:
+        """Причина для мягкого перезапуска (по последнему замеру) или None."""
+        if self.pages >= self.max_pages:
+            return f"открыто страниц: {self.pages}"
+        if self.last_rss_mb >= self.max_rss_mb:
+            return f"память браузера {self.last_rss_mb:.0f} МБ >= {self.max_rss_mb:.0f} МБ"
+        return None
+
+    def hard_exceeded(self) -> bool:
+        return self.last_rss_mb >= self.hard_rss_mb
+
+    def recycled(self, reason: str):
+        self.recycles += 1
+        logger.warning(f"[watchdog] {self.name}: перезапуск браузера #{self.recycles} ({reason}), "
+                       f"пик {self.high_water_mb:.0f} МБ")
+        metrics.increment('browser_recycles')
+        self.pages = 0
+        self.last_rss_mb = 0.0
+
+
+class PlaywrightRecycler:
+    """
+    Замена Browser/BrowserContext для парсеров Playwright: тот же new_page(), но браузер
+    перезапускается по решению сторожа. generation увеличивается при каждом перезапуске -
+    по нему вызывающий код понимает, что вкладку оборвал перезапуск, и повторяет ссылку
+    (см. test_parser.parse_site).
+    """
+
+    def __init__(self, playwright, watchdog: BrowserWatchdog,
+                 setup_context: Optional[Callable[[object], Awaitable]] = None, **launch_kwargs):
+        self.playwright = playwright
+        self.watchdog = watchdog
+        self.setup_context = setup_context
+        self.launch_kwargs = {'headless': True, **launch_kwargs}
+        self.browser = None
+        self.context = None
+        self.generation = 0
+        self._open_pages: set = set()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._lock = asyncio.Lock()
+        self._monitor: Optional[asyncio.Task] = None
+        # Память считается по дереву процессов именно этого браузера (watchdog.root_pid)
+        self._tag = str(next(_browser_tags))
+        self.launch_kwargs['args'] = [*self.launch_kwargs.get('args', []), f"{BROWSER_TAG_SWITCH}{self._tag}"]
+
+    async def start(self) -> 'PlaywrightRecycler':
+        await self._launch()
+        self._monitor = asyncio.create_task(self._watch())
+        return self
+
+    async def _launch(self):
+        self.browser = await self.playwright.chromium.launch(**self.launch_kwargs)
+        self.watchdog.root_pid = find_tagged_browser_pid(self._tag)
+        self.context = await self.browser.new_context()
+        if self.setup_context is not None:
+            await self.setup_context(self.context)
+        self.generation += 1
+
+    def _is_alive(self) -> bool:
+        return self.context is not None and self.browser is not None and self.browser.is_connected()
+
+    async def _shutdown_browser(self):
+        browser, self.browser, self.context = self.browser, None, None
+        self._open_pages.clear()
+        self._idle.set()
+        if browser is not None:
+            try:
+                await browser.close()
+            except Exception as e:
+                logger.warning(f"[watchdog] {self.watchdog.name}: ошибка при закрытии браузера: {e}")
+
+    async def _recycle(self, reason: str):
+        self.watchdog.recycled(reason)
+        await self._shutdown_browser()
+        await self._launch()
+
+    def _on_page_close(self, page):
+        self._open_pages.discard(page)
+        if not self._open_pages:
+            self._idle.set()
+
+    async def new_page(self):
+        async with self._lock:
+            if not self._is_alive():
+                # Браузер упал или прошлый перезапуск не смог его запустить - открытых вкладок уже нет
+                await self._recycle("браузер отключился")
+            else:
+                reason = self.watchdog.soft_reason()
+                if reason:
+                    # Мягкий перезапуск: ждем, пока закроются уже открытые вкладки
+                    await self._idle.wait()
+                    await self._recycle(reason)
+            page = await self.context.new_page()
+            self._open_pages.add(page)
+            self._idle.clear()
+            page.once('close', self._on_page_close)
+            self.watchdog.page_opened()
+            return page
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(SAMPLE_INTERVAL)
+            # Ошибка перезапуска не должна останавливать замеры: следующий new_page запустит браузер заново
+            try:
+                self.watchdog.sample()
+                if self.watchdog.hard_exceeded():
+                    async with self._lock:
+                        if self.watchdog.hard_exceeded():
+                            await self._recycle(f"жесткий порог: {self.watchdog.last_rss_mb:.0f} МБ")
+            except Exception as e:
+                logger.error(f"[watchdog] {self.watchdog.name}: ошибка сторожа браузера: {type(e).__name__}: {e}")
+
+    async def close(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        self.watchdog.sample()
+        await self._shutdown_browser()
+        logger.info(f"[watchdog] {self.watchdog.name}: пик памяти браузера {self.watchdog.high_water_mb:.0f} МБ, "
+                    f"перезапусков: {self.watchdog.recycles}")
+
@@ -21,6 +21,17 @@ from .yandex_by_cinema import CONFIG as yandex_by_cinema_config
 from .yandex_by_concert import CONFIG as yandex_by_concert_config
 
 
+# parsing_method -> "модуль:функция". Модули парсеров импортируются лениво, только когда метод
+# впервые нужен (parsers/registry.py). Новый парсер = строка здесь (или ключ 'parser' в своем конфиге).
+PARSERS = {
+    'playwright_kvitki': 'parsers.test_parser:parse_site',
+    'selenium_yandex': 'parsers.yandex_parser:parse',
+    'json': 'parsers.kvitki_parser:parse_site',
+    'bs4_bezkassira': 'parsers.bezkassira_parser:parse',
+    'bs4_liveball': 'parsers.liveball_parser:parse',
+}
+
+
 ALL_CONFIGS = [
     # ... (все старые конфиги) ...
     kvitki_by_music_config,
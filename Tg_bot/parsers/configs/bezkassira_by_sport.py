@@ -11,6 +11,13 @@ CONFIG = {
         'title': 'a',                   # Название внутри caption
         'link': 'a',                    # Ссылка внутри caption
         'date': 'div.date',             # Дата
-        'place': 'small.hint'           # Место
+        'place': 'small.hint',          # Место
+        # Те же поля в формате быстрого извлечения (parsers/fast_extract.py)
+        'fields': {
+            'title': 'div.caption a',
+            'link': {'sel': 'div.caption a', 'attr': 'href'},
+            'date': 'div.date',
+            'place': {'sel': 'small.hint', 'sep': ' '},
+        }
     }
 }
\ No newline at end of file
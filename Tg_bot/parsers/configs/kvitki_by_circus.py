@@ -6,7 +6,7 @@ CONFIG = {
     'category_name': 'Музыка Playwright',
     'parsing_method': 'playwright_kvitki',
     # 'parsing_method': 'json',
-    # 'json_regex': r'window\.concertsListEvents\s*=\s*(\[.*?\]);',
+    # 'json_blob': 'concertsListEvents',  # window.concertsListEvents = [...] (parsers/json_blob.py)
     # 'json_keys': {
     #     'title': 'title',
     #     'place': 'venueDescription',
@@ -5,8 +5,10 @@ CONFIG = {
     'country_name': 'Беларусь', # <-- ОБЯЗАТЕЛЬНОЕ ПОЛЕ
     'category_name': 'Музыка Playwright',
     'parsing_method': 'playwright_kvitki',
+    # 'discovery': 'sitemap',  # ссылки на события из sitemap сайта (parsers/sitemap.py); без sitemap - листание page:N/
+    # 'sitemap_skip_unchanged': True,
     # 'parsing_method': 'json',
-    # 'json_regex': r'window\.concertsListEvents\s*=\s*(\[.*?\]);',
+    # 'json_blob': 'concertsListEvents',  # window.concertsListEvents = [...] (parsers/json_blob.py)
     # 'json_keys': {
     #     'title': 'title',
     #     'place': 'venueDescription',
@@ -1,4 +1,6 @@
 # --- START OF FILE parsers/configs/yandex_by_art.py ---
+from .yandex_selectors import YANDEX_SELECTORS
+
 CONFIG = {
     'site_name': 'Yandex.Afisha (Выставки)',
     'url': 'https://afisha.yandex.ru/moscow/art',
@@ -7,4 +9,5 @@ CONFIG = {
     'event_type': 'Выставка',
     'period': 365,
     'parsing_method': 'selenium_yandex',
+    'selectors': YANDEX_SELECTORS,
 }
\ No newline at end of file
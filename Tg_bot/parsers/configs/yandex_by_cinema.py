@@ -1,4 +1,6 @@
 # --- START OF FILE parsers/configs/yandex_by_cinema.py ---
+from .yandex_selectors import YANDEX_SELECTORS
+
 CONFIG = {
     'site_name': 'Yandex.Afisha (Кино)',
     'url': 'https://afisha.yandex.ru/moscow/cinema',
@@ -7,4 +9,5 @@ CONFIG = {
     'event_type': 'Кино', # Можно добавить новый тип, если нужно
     'period': 30, # Для кино нет смысла смотреть на год вперед
     'parsing_method': 'selenium_yandex',
+    'selectors': YANDEX_SELECTORS,
 }
\ No newline at end of file
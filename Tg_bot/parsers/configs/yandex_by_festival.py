@@ -1,4 +1,6 @@
 # --- START OF FILE parsers/configs/yandex_by_festival.py ---
+from .yandex_selectors import YANDEX_SELECTORS
+
 CONFIG = {
     'site_name': 'Yandex.Afisha (Фестивали)',
     'url': 'https://afisha.yandex.ru/moscow/festival',
@@ -7,4 +9,5 @@ CONFIG = {
     'event_type': 'Фестиваль',
     'period': 365,
     'parsing_method': 'selenium_yandex',
+    'selectors': YANDEX_SELECTORS,
 }
\ No newline at end of file
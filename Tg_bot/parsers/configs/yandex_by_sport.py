@@ -1,4 +1,6 @@
 # --- START OF FILE parsers/configs/yandex_by_sport.py ---
+from .yandex_selectors import YANDEX_SELECTORS
+
 CONFIG = {
     'site_name': 'Yandex.Afisha (Спорт)',
     'url': 'https://afisha.yandex.ru/moscow/sport',
@@ -7,4 +9,5 @@ CONFIG = {
     'event_type': 'Спорт',
     'period': 365,
     'parsing_method': 'selenium_yandex', # Уникальный метод для этого парсера
+    'selectors': YANDEX_SELECTORS,
 }
\ No newline at end of file
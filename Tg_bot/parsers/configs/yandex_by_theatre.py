@@ -1,4 +1,6 @@
 # --- START OF FILE parsers/configs/yandex_by_theatre.py ---
+from .yandex_selectors import YANDEX_SELECTORS
+
 CONFIG = {
     'site_name': 'Yandex.Afisha (Театр)',
     'url': 'https://afisha.yandex.ru/moscow/theatre',
@@ -7,4 +9,5 @@ CONFIG = {
     'event_type': 'Театр',
     'period': 365,
     'parsing_method': 'selenium_yandex',
+    'selectors': YANDEX_SELECTORS,
 }
\ No newline at end of file
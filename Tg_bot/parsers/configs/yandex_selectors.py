@@ -0,0 +1,16 @@
+# --- START OF FILE parsers/configs/yandex_selectors.py ---
+# Разметка карточек у всех разделов Яндекс.Афиши одна - конфиги yandex_by_* ссылаются на этот словарь.
+# Карточка события и ее поля (parsers/fast_extract.py)
+YANDEX_SELECTORS = {
+    'event_card': 'div[data-test-id="eventCard.root"]',
+    'fields': {
+        'title': 'h2[data-test-id="eventCard.eventInfoTitle"]',
+        'link': {'sel': 'a[data-test-id="eventCard.link"]', 'attr': 'href'},
+        'date': "xpath:((.//ul[@data-test-id='eventCard.eventInfoDetails'])[1]//li)[1]",
+        'place': {'sel': [
+            "xpath:((.//ul[@data-test-id='eventCard.eventInfoDetails'])[1]//li)[2]//a",
+            "xpath:((.//ul[@data-test-id='eventCard.eventInfoDetails'])[1]//li)[2]",
+        ]},
+        'price': r"xpath:.//span[re:test(text(), 'от \d+')]",
+    }
+}
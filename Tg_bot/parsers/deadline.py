@@ -0,0 +1,162 @@
+# Файл: parsers/deadline.py
+#
+# Бюджет времени прогона и его передача вниз по вызовам.
+# Один зависший конфиг (страница Яндекса, которая не отрисовывается; iframe кассы Kvitki, который
+# отваливается по таймауту фрейм за фреймом) раньше растягивал прогон без ограничений.
+# Теперь у прогона есть общий бюджет, у каждого конфига - свой (не больше остатка общего),
+# и текущий дедлайн виден всем вложенным вызовам через contextvar:
+#   - таймауты навигации, ожиданий и HTTP-запросов обрезаются до остатка (clip / clip_ms);
+#   - паузы между повторами не выходят за дедлайн;
+#   - циклы парсеров проверяют expired() и возвращают то, что успели собрать (частичный результат);
+#   - вызовы AI оборачиваются в wait_for().
+# Конфиг, который не уложился в бюджет, отмечается как частичный (mark_partial) - это попадает
+# в лог и в отчет прогона (parsers/metrics.py).
+#
+# Переменные окружения (секунды, 0 - без ограничения):
+#   PARSER_RUN_BUDGET     - весь прогон run_parser.py (по умолчанию 2 часа)
+#   PARSER_CONFIG_BUDGET  - один конфиг (по умолчанию 20 минут); в конфиге можно задать 'time_budget'
+#
+# contextvar копируется в задачи asyncio и в asyncio.to_thread, но НЕ в loop.run_in_executor -
+# синхронные парсеры нужно запускать через to_thread.
+
+import asyncio
+import contextvars
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Optional, TypeVar
+
+from parsers import metrics
+
+logger = logging.getLogger()
+
+RUN_BUDGET = float(os.getenv('PARSER_RUN_BUDGET', 2 * 60 * 60))
+CONFIG_BUDGET = float(os.getenv('PARSER_CONFIG_BUDGET', 20 * 60))
+# Сколько ждать после дедлайна, пока парсер сам вернет частичный результат, прежде чем отменить его
+GRACE_PERIOD = 30.0
+# Минимальный таймаут для операций, которые все равно нужно выполнить (например, закрыть страницу)
+MIN_TIMEOUT = 0.5
+
+T = TypeVar('T')
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Deadline:
+    __slots__ = ('name', 'expires_at')
+
+    def __init__(self, name: str, expires_at: float):
+        self.name = name
+        self.expires_at = expires_at
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return time.monotonic() >= self.expires_at
+
+    def __repr__(self):
+        return f"Deadline({self.name!r}, осталось {self.remaining():.1f} с)"
+
+
+_current: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar('parser_deadline', default=None)
+
+
+def current() -> Optional[Deadline]:
+    return _current.get()
+
+
+@contextmanager
+def budget(seconds: Optional[float], name: str):
+    """
+    Устанавливает дедлайн на блок: не позже, чем через seconds, и не позже внешнего дедлайна.
+    seconds=None или 0 - собственного ограничения нет, действует только внешний.
+    """
+    parent = _current.get()
+    expires_at = time.monotonic() + seconds if seconds else float('inf')
+    if parent is not None and parent.expires_at <= expires_at:
+        deadline = Deadline(parent.name, parent.expires_at)
+    else:
+        deadline = Deadline(name, expires_at)
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def config_budget(config: dict) -> float:
+    return float(config.get('time_budget', CONFIG_BUDGET))
+
+
+def remaining() -> Optional[float]:
+    """Остаток текущего дедлайна в секундах или None, если дедлайна нет."""
+    deadline = _current.get()
+    if deadline is None or deadline.expires_at == float('inf'):
+        return None
+    return deadline.remaining()
+
+
+def expired() -> bool:
+    deadline = _current.get()
+    return deadline is not None and deadline.expired()
+
+
+def check():
+    """Бросает DeadlineExceeded, если дедлайн уже наступил."""
+    deadline = _current.get()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(f"Исчерпан бюджет времени: {deadline.name}")
+
+
+def clip(timeout: float) -> float:
+    """Таймаут операции в секундах, обрезанный до остатка дедлайна."""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(MIN_TIMEOUT, min(timeout, left))
+
+
+def clip_ms(timeout_ms: float) -> float:
+    """То же для Playwright (таймауты в миллисекундах)."""
+    return clip(timeout_ms / 1000) * 1000
+
+
+async def wait_for(awaitable: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """asyncio.wait_for с таймаутом не дальше дедлайна. По дедлайну - DeadlineExceeded."""
+    left = remaining()
+    if left is None:
+        return await asyncio.wait_for(awaitable, timeout)
+    limit = left if timeout is None else min(timeout, left)
+    try:
+        return await asyncio.wait_for(awaitable, max(limit, 0.0))
+    except asyncio.TimeoutError:
+        if timeout is None or left <= timeout:
+            raise DeadlineExceeded(f"Исчерпан бюджет времени: {_current.get().name}") from None
+        raise
+
+
+async def guard(awaitable: Awaitable[T], name: str) -> Optional[T]:
+    """
+    Страховка на уровне конфига: парсер сам останавливается по дедлайну и возвращает частичный
+    результат; если он не вернулся и через GRACE_PERIOD после дедлайна - отменяем его.
+    Возвращает результат или None (конфиг отменен / бросил DeadlineExceeded).
+    Синхронный парсер в потоке отмена не останавливает - он завершится на ближайшей проверке expired().
+    """
+    left = remaining()
+    try:
+        return await asyncio.wait_for(awaitable, None if left is None else left + GRACE_PERIOD)
+    except DeadlineExceeded as e:  # до asyncio.TimeoutError - это его подкласс
+        mark_partial(name, str(e))
+    except asyncio.TimeoutError:
+        mark_partial(name, f"отменен: не завершился через {GRACE_PERIOD:.0f} с после дедлайна")
+    return None
+
+
+def mark_partial(name: str, reason: str):
+    """Отмечает конфиг, результат которого неполный из-за бюджета времени (в отчет прогона - первая причина)."""
+    if metrics.get_run().note_partial(name, reason):
+        logger.warning(f"[deadline] {name}: частичный результат ({reason})")
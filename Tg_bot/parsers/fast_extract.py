@@ -0,0 +1,113 @@
+# Файл: parsers/fast_extract.py
+#
+# Быстрое извлечение полей карточек на lxml с заранее скомпилированными XPath-выражениями.
+# Селекторы объявляются в конфиге (словарь 'selectors'), компилируются один раз на процесс
+# и затем применяются к каждой карточке. Никакого BeautifulSoup-дерева не строится:
+# страница разбирается libxml2 один раз, а поля каждой карточки вытаскиваются
+# проходом только по поддереву этой карточки.
+#
+# Формат селектора:
+#   'div.caption a'                         - CSS (по умолчанию), берется текст первого совпадения
+#   'xpath:.//h2[@data-test-id="title"]'    - XPath
+#   {'sel': 'div.caption a', 'attr': 'href'}           - значение атрибута
+#   {'sel': 'small.hint', 'sep': ' '}                  - текст с разделителем (как get_text(separator=' '))
+#   {'sel': ['xpath:./li[2]//a', 'xpath:./li[2]']}     - список запасных вариантов, побеждает первый найденный
+
+from functools import lru_cache
+import json
+
+from lxml import etree, html as lxml_html
+from cssselect import GenericTranslator
+
+# Пространства имен для XPath: позволяют использовать регулярные выражения (re:test)
+XPATH_NAMESPACES = {'re': 'http://exslt.org/regular-expressions'}
+
+_css_translator = GenericTranslator()
+_utf8_parser = lxml_html.HTMLParser(encoding='utf-8')
+
+
+@lru_cache(maxsize=None)
+def compile_selector(selector: str) -> etree.XPath:
+    """Компилирует CSS или 'xpath:...' в объект etree.XPath, относительный к элементу."""
+    if selector.startswith('xpath:'):
+        expression = selector[len('xpath:'):]
+    else:
+        expression = _css_translator.css_to_xpath(selector, prefix='descendant-or-self::')
+    return etree.XPath(expression, namespaces=XPATH_NAMESPACES)
+
+
+def parse_document(html: bytes):
+    """
+    Разбирает страницу в lxml-дерево.
+    Если в начале документа не указана кодировка, считаем его UTF-8 (иначе libxml2 прочитает его как latin-1).
+    """
+    if b'charset' in html[:4096].lower():
+        return lxml_html.document_fromstring(html)
+    return lxml_html.document_fromstring(html, parser=_utf8_parser)
+
+
+def element_text(element, sep: str = '') -> str:
+    """Аналог BeautifulSoup get_text(separator=sep, strip=True)."""
+    if isinstance(element, str):
+        return element.strip()
+    return sep.join(part for part in (s.strip() for s in element.itertext()) if part)
+
+
+class FieldSelector:
+    """Одно поле карточки: скомпилированные выражения + способ получить значение."""
+    __slots__ = ('name', 'paths', 'attr', 'sep')
+
+    def __init__(self, name: str, spec):
+        if isinstance(spec, str):
+            spec = {'sel': spec}
+        sels = spec['sel'] if isinstance(spec['sel'], (list, tuple)) else [spec['sel']]
+        self.name = name
+        self.paths = [compile_selector(s) for s in sels]
+        self.attr = spec.get('attr')
+        self.sep = spec.get('sep', '')
+
+    def first(self, element):
+        for path in self.paths:
+            found = path(element)
+            if found:
+                return found[0]
+        return None
+
+    def value(self, element) -> str | None:
+        node = self.first(element)
+        if node is None:
+            return None
+        if self.attr:
+            return node.get(self.attr)
+        return element_text(node, self.sep)
+
+
+class CardExtractor:
+    """
+    Извлекает все поля всех карточек страницы.
+    selectors['event_card'] - селектор карточки, selectors['fields'] - {имя_поля: селектор}.
+    """
+
+    def __init__(self, selectors: dict):
+        self.card_path = compile_selector(selectors['event_card'])
+        self.fields = [FieldSelector(name, spec) for name, spec in selectors['fields'].items()]
+
+    def iter_cards(self, html: bytes):
+        root = parse_document(html)
+        for card in self.card_path(root):
+            yield card, {field.name: field.value(card) for field in self.fields}
+
+    def extract(self, html: bytes) -> list[dict]:
+        return [values for _, values in self.iter_cards(html)]
+
+
+_extractors: dict[str, CardExtractor] = {}
+
+
+def get_card_extractor(selectors: dict) -> CardExtractor:
+    """Кэширует скомпилированный CardExtractor на процесс (ключ - содержимое словаря селекторов)."""
+    key = json.dumps(selectors, sort_keys=True, ensure_ascii=False)
+    extractor = _extractors.get(key)
+    if extractor is None:
+        extractor = _extractors[key] = CardExtractor(selectors)
+    return extractor
@@ -0,0 +1,273 @@
+# Файл: parsers/fixtures.py
+#
+# Запись и воспроизведение ответов сайтов ("фикстуры") для запуска парсеров без сети.
+#
+# Режим задается переменными окружения (или set_mode() из кода):
+#   PARSER_FIXTURE_MODE=record  - парсеры работают с живыми сайтами, ответы сохраняются в набор;
+#   PARSER_FIXTURE_MODE=replay  - ответы берутся только из набора, в сеть не уходит ни один запрос;
+#   PARSER_FIXTURE_DIR=<папка>  - папка набора (по умолчанию parsers/fixtures_data).
+#
+# Набор = index.json (url -> статус, content-type, имя файла) + тела ответов в отдельных файлах.
+# Подключение:
+#   - requests-парсеры (kvitki, bezkassira, liveball) - через rate_limiter.fetch;
+#   - Playwright - обработчик маршрутов контекста (attach_playwright);
+#   - Selenium (Яндекс) - локальный HTTP-сервер (browser_url), который отдает записанные страницы.
+#
+# Пример:
+#   PARSER_FIXTURE_MODE=record PARSER_FIXTURE_DIR=fixtures/kvitki python -m parsers.test_parser
+#   PARSER_FIXTURE_MODE=replay PARSER_FIXTURE_DIR=fixtures/kvitki python -m parsers.test_parser
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qs, quote, urlparse
+
+import requests
+
+logger = logging.getLogger()
+
+DEFAULT_FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures_data')
+
+# Какие ответы Playwright записываем: сама страница, данные и скрипты (без них не соберется window.*)
+RECORDED_RESOURCE_TYPES = {'document', 'xhr', 'fetch', 'script'}
+
+_SCRIPT_RE = re.compile(rb'<script\b[^>]*>.*?</script>', re.IGNORECASE | re.DOTALL)
+
+
+class RecordedResponse(NamedTuple):
+    url: str
+    status: int
+    content_type: str
+    body: bytes
+
+
+class FixtureMiss(requests.RequestException):
+    """В режиме replay запрошен URL, которого нет в наборе."""
+
+
+def _normalize(url: str) -> str:
+    return url.split('#', 1)[0]
+
+
+class FixtureBundle:
+    """Набор записанных ответов в одной папке. Потокобезопасен (Selenium-парсеры работают в потоках)."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self._lock = threading.Lock()
+        self._index: dict[str, dict] = {}
+        self.hits = 0
+        self.misses = 0
+        if os.path.exists(self.index_path):
+            with open(self.index_path, encoding='utf-8') as f:
+                self._index = json.load(f)
+
+    def __len__(self):
+        return len(self._index)
+
+    def get(self, url: str) -> Optional[RecordedResponse]:
+        url = _normalize(url)
+        entry = self._index.get(url)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        with open(os.path.join(self.directory, entry['file']), 'rb') as f:
+            body = f.read()
+        return RecordedResponse(url, entry['status'], entry['content_type'], body)
+
+    def put(self, url: str, status: int, content_type: str, body: bytes):
+        url = _normalize(url)
+        file_name = hashlib.sha1(url.encode('utf-8')).hexdigest() + '.bin'
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, file_name), 'wb') as f:
+                f.write(body)
+            self._index[url] = {'status': status, 'content_type': content_type or '', 'file': file_name}
+
+    def save(self):
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f, ensure_ascii=False, indent=1, sort_keys=True)
+
+
+# --- Текущий режим ---
+_mode = os.getenv('PARSER_FIXTURE_MODE', '').strip().lower()
+_bundle: Optional[FixtureBundle] = None
+_server: Optional['ReplayServer'] = None
+
+
+def set_mode(mode: str, directory: Optional[str] = None) -> Optional[FixtureBundle]:
+    """Включает 'record' / 'replay' (или выключает: '') для набора в directory."""
+    global _mode, _bundle
+    if _mode == 'record' and _bundle is not None:
+        _bundle.save()
+    stop_replay_server()
+    _mode = mode
+    _bundle = FixtureBundle(directory or os.getenv('PARSER_FIXTURE_DIR', DEFAULT_FIXTURE_DIR)) if mode else None
+    if mode:
+        logger.info(f"[fixtures] Режим '{mode}', набор: {_bundle.directory} ({len(_bundle)} ответов)")
+    return _bundle
+
+
+def get_bundle() -> Optional[FixtureBundle]:
+    global _bundle
+    if _mode and _bundle is None:
+        _bundle = FixtureBundle(os.getenv('PARSER_FIXTURE_DIR', DEFAULT_FIXTURE_DIR))
+    return _bundle
+
+
+def is_recording() -> bool:
+    return _mode == 'record'
+
+
+def is_replaying() -> bool:
+    return _mode == 'replay'
+
+
+def save():
+    """Сохраняет индекс записываемого набора (вызывать в конце прогона в режиме record)."""
+    if is_recording() and get_bundle() is not None:
+        _bundle.save()
+
+
+# --- requests ---
+def replay_response(url: str) -> requests.Response:
+    """Собирает requests.Response из записанного ответа. Бросает FixtureMiss, если записи нет."""
+    recorded = get_bundle().get(url)
+    if recorded is None:
+        raise FixtureMiss(f"Нет записанного ответа для {url}")
+    response = requests.Response()
+    response.url = recorded.url
+    response.status_code = recorded.status
+    response.headers['Content-Type'] = recorded.content_type
+    response._content = recorded.body
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers) or 'utf-8'
+    return response
+
+
+def record_response(url: str, response: requests.Response):
+    get_bundle().put(url, response.status_code, response.headers.get('Content-Type', ''), response.content)
+
+
+def record_page(url: str, html: bytes, strip_scripts: bool = True):
+    """
+    Сохраняет уже отрисованный браузером DOM (Selenium page_source).
+    Скрипты вырезаются: при воспроизведении страница должна остаться такой, какой ее видел парсер.
+    """
+    if strip_scripts:
+        html = _SCRIPT_RE.sub(b'', html)
+    get_bundle().put(url, 200, 'text/html; charset=utf-8', html)
+
+
+# --- Playwright ---
+async def attach_playwright(context):
+    """
+    Подключает запись/воспроизведение к BrowserContext (или Page) Playwright.
+    replay: все запросы обслуживаются обработчиком маршрутов из набора; чего нет - страницы
+    получают 404, картинки/шрифты/счетчики просто отменяются. record: ответы сохраняются в набор.
+    """
+    if is_replaying():
+        bundle = get_bundle()
+
+        async def _route(route):
+            request = route.request
+            recorded = bundle.get(request.url)
+            if recorded is not None:
+                await route.fulfill(status=recorded.status, body=recorded.body,
+                                    headers={'content-type': recorded.content_type})
+            elif request.resource_type in RECORDED_RESOURCE_TYPES:
+                await route.fulfill(status=404, body=b'')
+            else:
+                await route.abort()
+
+        await context.route('**/*', _route)
+
+    elif is_recording():
+        bundle = get_bundle()
+
+        async def _on_response(response):
+            if response.request.resource_type not in RECORDED_RESOURCE_TYPES:
+                return
+            try:
+                body = await response.body()
+            except Exception:
+                return  # редиректы и прерванные ответы тела не имеют
+            bundle.put(response.url, response.status, response.headers.get('content-type', ''), body)
+
+        context.on('response', _on_response)
+
+
+# --- Локальный HTTP-сервер (для Selenium, у которого нет перехвата маршрутов) ---
+class _ReplayHandler(BaseHTTPRequestHandler):
+    bundle: FixtureBundle = None
+
+    def do_GET(self):
+        original_url = parse_qs(urlparse(self.path).query).get('url', [''])[0]
+        recorded = self.bundle.get(original_url) if original_url else None
+        if recorded is None:
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(recorded.status)
+        self.send_header('Content-Type', recorded.content_type or 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(recorded.body)))
+        self.end_headers()
+        self.wfile.write(recorded.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer:
+    """HTTP-сервер на 127.0.0.1, отдающий записанные ответы по адресу /replay?url=<исходный URL>."""
+
+    def __init__(self, bundle: FixtureBundle):
+        handler = type('ReplayHandler', (_ReplayHandler,), {'bundle': bundle})
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url_for(self, url: str) -> str:
+        return f"{self.base_url}/replay?url={quote(url, safe='')}"
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+_server_lock = threading.Lock()
+
+
+def browser_url(url: str) -> str:
+    """В режиме replay подменяет URL для браузера на адрес локального сервера; иначе возвращает как есть."""
+    global _server
+    if not is_replaying():
+        return url
+    with _server_lock:
+        if _server is None:
+            _server = ReplayServer(get_bundle())
+            logger.info(f"[fixtures] Локальный сервер воспроизведения: {_server.base_url}")
+    return _server.url_for(url)
+
+
+def stop_replay_server():
+    global _server
+    with _server_lock:
+        if _server is not None:
+            _server.stop()
+            _server = None
@@ -0,0 +1,55 @@
+# Файл: parsers/json_blob.py
+#
+# Извлечение JSON-объектов, встроенных в страницу через "window.X = ...;".
+# Вместо ленивого регулярного выражения по всей странице (которое откатывается на больших
+# страницах и обрывает JSON на первом "];" внутри строки) находим маркер присваивания
+# один раз и декодируем ровно одно JSON-значение с этой позиции через JSONDecoder.raw_decode.
+
+import json
+import re
+from functools import lru_cache
+from typing import Any
+
+_decoder = json.JSONDecoder()
+
+
+class BlobNotFound(ValueError):
+    """На странице нет присваивания window.X = ..."""
+
+
+@lru_cache(maxsize=None)
+def _marker(name: str, binary: bool) -> re.Pattern:
+    # window.X = ...  или  window["X"] = ...  (но не сравнение window.X == ...)
+    pattern = rf'window(?:\.{re.escape(name)}|\[["\']{re.escape(name)}["\']\])\s*=(?!=)\s*'
+    return re.compile(pattern.encode() if binary else pattern)
+
+
+def find_window_blob(page: str | bytes, name: str, encoding: str = 'utf-8') -> Any:
+    """
+    Возвращает значение window.<name> со страницы.
+
+    page может быть str (разбор идет прямо по исходной строке, без копирования)
+    или bytes (например, response.content): тогда в строку декодируется только хвост,
+    начиная со значения, а не вся страница.
+    Бросает BlobNotFound, если маркера нет, и json.JSONDecodeError, если значение повреждено.
+    """
+    binary = isinstance(page, (bytes, bytearray, memoryview))
+    match = _marker(name, binary).search(page)
+    if not match:
+        raise BlobNotFound(f"window.{name} не найден на странице")
+
+    if binary:
+        # str() читает memoryview напрямую, без промежуточной копии байтов
+        tail = str(memoryview(page)[match.end():], encoding)
+        value, _ = _decoder.raw_decode(tail)
+    else:
+        value, _ = _decoder.raw_decode(page, match.end())
+    return value
+
+
+def find_window_blob_or_none(page: str | bytes, name: str, encoding: str = 'utf-8') -> Any | None:
+    """То же, что find_window_blob, но вместо исключений возвращает None."""
+    try:
+        return find_window_blob(page, name, encoding)
+    except (BlobNotFound, json.JSONDecodeError, UnicodeDecodeError):
+        return None
@@ -1,41 +1,53 @@
 import requests
-import json
 import re
 from bs4 import BeautifulSoup
-import time
+
+from parsers.rate_limiter import fetch
+from parsers.parse_pool import parse_html_sync
+from parsers.json_blob import find_window_blob_or_none
+from parsers.raw_event import RawEvent, intern_config
+from parsers import deadline, metrics
 
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
 }
 
 
-def get_price_from_detail_page(url: str) -> tuple[float | None, float | None]:
-    try:
-        response = requests.get(url, headers=HEADERS, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, 'lxml')
+def extract_prices(html: bytes) -> tuple[float | None, float | None]:
+    """Достает мин./макс. цену со страницы события. Выполняется в процессе-разборщике."""
+    soup = BeautifulSoup(html, 'lxml')
+
+    price_tag = soup.select_one("span.concert_details_pricing_value")
+    if not price_tag:
+        return None, None
+
+    price_text = price_tag.get_text(strip=True).replace(',', '.')
+    prices = re.findall(r'\d+\.\d+', price_text)
 
-        price_tag = soup.select_one("span.concert_details_pricing_value")
-        if not price_tag:
-            return None, None
+    if len(prices) == 2:
+        return float(prices[0]), float(prices[1])
+    elif len(prices) == 1:
+        return float(prices[0]), None
+    else:
+        return None, None
 
-        price_text = price_tag.get_text(strip=True).replace(',', '.')
-        prices = re.findall(r'\d+\.\d+', price_text)
 
-        if len(prices) == 2:
-            return float(prices[0]), float(prices[1])
-        elif len(prices) == 1:
-            return float(prices[0]), None
-        else:
-            return None, None
+def get_price_from_detail_page(url: str, site_name: str | None = None) -> tuple[float | None, float | None]:
+    try:
+        with metrics.stage('detail_fetch', site_name):
+            response = fetch(url, headers=HEADERS, timeout=10)
+        response.raise_for_status()
+        return parse_html_sync(extract_prices, response.content)
     except Exception as e:
         print(f"  - Ошибка при парсинге цены для {url}: {e}")
         return None, None
 
 
-def parse_site(config: dict) -> list[dict]:
+def parse_site(config: dict) -> list[RawEvent]:
     site_name = config['site_name']
+    config_id = intern_config(config)
     url = config['url']
+    blob_name = config.get('json_blob', 'concertsListEvents')
     all_events_data = []
     page_num = 1
 
@@ -44,22 +56,26 @@ def parse_site(config: dict) -> list[dict]:
     # Этап 1: Сбор базовой информации и ссылок со всех страниц
     print("  - Этап 1: Сбор ссылок со страниц списка...")
     while True:
+        if deadline.expired():
+            deadline.mark_partial(site_name, f"список остановлен на странице {page_num}")
+            break
         paginated_url = f"{url}page:{page_num}/"
         print(f"    - Сканирую страницу: {page_num}")
 
         try:
-            response = requests.get(paginated_url, headers=HEADERS, timeout=20)
+            with metrics.stage('list_scan', site_name):
+                response = fetch(paginated_url, headers=HEADERS, timeout=20)
             if response.status_code != 200: break
 
-            match = re.search(r'window\.concertsListEvents\s*=\s*(\[.*?\]);', response.text)
-            if not match: break
-
-            events_on_page = json.loads(match.group(1))
+            # Имя объекта на странице берем из конфига (по умолчанию - список концертов Kvitki)
+            events_on_page = find_window_blob_or_none(response.content, blob_name)
             if not events_on_page: break
 
             all_events_data.extend(events_on_page)
             page_num += 1
-            time.sleep(1)
+        except deadline.DeadlineExceeded as e:
+            deadline.mark_partial(site_name, f"список остановлен на странице {page_num}: {e}")
+            break
         except requests.RequestException as e:
             print(f"  - Ошибка при запросе к странице {page_num}: {e}")
             break
@@ -69,6 +85,7 @@ def parse_site(config: dict) -> list[dict]:
     # Этап 2: Заход на каждую страницу для сбора цен
     print("  - Этап 2: Сбор цен с детальных страниц...")
     final_events = []
+    prices_skipped = 0
     for i, event_info in enumerate(all_events_data):
         keys = config['json_keys']
         link = event_info.get(keys['link'])
@@ -77,22 +94,29 @@ def parse_site(config: dict) -> list[dict]:
         if not link.startswith('http'):
             link = 'https://www.kvitki.by' + link
 
-        print(f"    - Обработка {i + 1}/{len(all_events_data)}: {event_info.get('title')}")
-        price_min, price_max = get_price_from_detail_page(link)
+        if deadline.expired():
+            # Бюджет исчерпан: события из списка сохраняем, но без цен со страниц событий
+            prices_skipped += 1
+            price_min, price_max = None, None
+        else:
+            print(f"    - Обработка {i + 1}/{len(all_events_data)}: {event_info.get('title')}")
+            price_min, price_max = get_price_from_detail_page(link, site_name)
 
         start_time_data = event_info.get('startTime', {})
         timestamp = start_time_data.get('stamp') if isinstance(start_time_data, dict) else None
 
-        final_events.append({
-            'title': event_info.get(keys['title']),
-            'place': event_info.get(keys['place']),
-            'time': event_info.get(keys['time']),
-            'link': link,
-            'timestamp': timestamp,
-            'price_min': price_min,
-            'price_max': price_max
-        })
-        time.sleep(0.5)
-
+        final_events.append(RawEvent(
+            title=event_info.get(keys['title']),
+            place=event_info.get(keys['place']),
+            time_str=event_info.get(keys['time']),
+            link=link,
+            timestamp=timestamp,
+            price_min=price_min,
+            price_max=price_max,
+            config_id=config_id,
+        ))
+
+    if prices_skipped:
+        deadline.mark_partial(site_name, f"без цен: {prices_skipped} из {len(all_events_data)} событий")
     print(f"Сайт {site_name} спарсен. Найдено событий: {len(final_events)}")
     return final_events
\ No newline at end of file
@@ -1,10 +1,14 @@
 # --- START OF FILE parsers/liveball_parser.py ---
 
 import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
 import locale
-import time
+
+from parsers.rate_limiter import fetch
+from parsers.parse_pool import parse_html_sync
+from parsers.fast_extract import compile_selector, element_text, parse_document
+from parsers.raw_event import RawEvent, intern_config
+from parsers import deadline, metrics
 
 try:
     locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
@@ -25,8 +29,54 @@ def combine_date_and_time_str(date_obj: datetime, time_str: str) -> datetime | N
         return None
 
 
-def parse(config: dict) -> list[dict]:
+def extract_upcoming_match_urls(html: bytes, selectors: dict, base_url: str) -> list[str]:
+    """Список ссылок на еще не начавшиеся матчи со страницы дня. Выполняется в процессе-разборщике."""
+    root = parse_document(html)
+    score_indicator = compile_selector(selectors['list_score_indicator'])
+    urls = []
+    for link_tag in compile_selector(selectors['list_item'])(root):
+        if score_indicator(link_tag):
+            continue
+        urls.append(base_url + link_tag.get('href'))
+    return urls
+
+
+def _first(element, selector: str):
+    found = compile_selector(selector)(element)
+    return found[0] if found else None
+
+
+def extract_match_details(html: bytes, selectors: dict) -> tuple[str, str | None] | None:
+    """
+    Достает со страницы матча заголовок и строку времени.
+    Возвращает (title, time_str) или None, если страница не похожа на матч.
+    """
+    main_info_block = _first(parse_document(html), selectors['detail_main_info_block'])
+    if main_info_block is None:
+        return None
+
+    league_tour_element = _first(main_info_block, selectors['detail_league_tour'])
+    left_team_element = _first(main_info_block, selectors['detail_left_team'])
+    right_team_element = _first(main_info_block, selectors['detail_right_team'])
+
+    if left_team_element is None or right_team_element is None:
+        return None
+
+    league_tour = element_text(league_tour_element) if league_tour_element is not None else "Турнир"
+    title = f"{league_tour}: {element_text(left_team_element)} - {element_text(right_team_element)}"
+
+    time_str = None
+    info_vs_block = _first(main_info_block, selectors['detail_vs_block'])
+    if info_vs_block is not None:
+        time_element = _first(info_vs_block, selectors['detail_time'])
+        if time_element is not None:
+            time_str = element_text(time_element)
+    return title, time_str
+
+
+def parse(config: dict) -> list[RawEvent]:
     site_name = config['site_name']
+    config_id = intern_config(config)
     base_url = "https://liveball.my"
     final_events = []
 
@@ -42,76 +92,62 @@ def parse(config: dict) -> list[dict]:
     dates_to_parse = [today, tomorrow]
 
     for date_obj in dates_to_parse:
+        if deadline.expired():
+            deadline.mark_partial(site_name, f"не обработаны даты с {date_obj:%Y-%m-%d}")
+            break
         date_str_url = date_obj.strftime("%Y-%m-%d")
         list_url = f"{config['url']}{date_str_url}"
 
         try:
-            response = requests.get(list_url, headers=headers, timeout=10)
+            with metrics.stage('list_scan', site_name):
+                response = fetch(list_url, headers=headers, timeout=10)
             response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'lxml')
+        except deadline.DeadlineExceeded as e:
+            deadline.mark_partial(site_name, f"не обработаны даты с {date_obj:%Y-%m-%d}: {e}")
+            break
         except requests.RequestException:
             continue
 
-        match_links = soup.select(selectors['list_item'])
-
-        upcoming_matches_urls = []
-        for link_tag in match_links:
-            if link_tag.select_one(selectors['list_score_indicator']):
-                continue
-            upcoming_matches_urls.append(base_url + link_tag['href'])
+        upcoming_matches_urls = parse_html_sync(extract_upcoming_match_urls, response.content, selectors, base_url)
 
         for detail_url in upcoming_matches_urls:
+            if deadline.expired():
+                deadline.mark_partial(site_name, f"не обработаны матчи за {date_obj:%Y-%m-%d}")
+                break
             try:
-                detail_response = requests.get(detail_url, headers=headers, timeout=10)
+                with metrics.stage('detail_fetch', site_name):
+                    detail_response = fetch(detail_url, headers=headers, timeout=10)
                 detail_response.raise_for_status()
-                detail_soup = BeautifulSoup(detail_response.text, 'lxml')
-
-                main_info_block = detail_soup.select_one(selectors['detail_main_info_block'])
-                if not main_info_block:
-                    continue
-
-                league_tour_element = main_info_block.select_one(selectors['detail_league_tour'])
-                left_team_element = main_info_block.select_one(selectors['detail_left_team'])
-                right_team_element = main_info_block.select_one(selectors['detail_right_team'])
-
-                if not (left_team_element and right_team_element):
+                details = parse_html_sync(extract_match_details, detail_response.content, selectors)
+                if not details:
                     continue
 
-                league_tour = league_tour_element.get_text(strip=True) if league_tour_element else "Турнир"
-                left_team = left_team_element.get_text(strip=True)
-                right_team = right_team_element.get_text(strip=True)
-                title = f"{league_tour}: {left_team} - {right_team}"
+                title, time_str = details
 
                 time_str_for_user = "Время уточняйте"
                 dt_object = None
                 timestamp = None
 
-                info_vs_block = main_info_block.select_one(selectors['detail_vs_block'])
-                if info_vs_block:
-                    time_element = info_vs_block.select_one(selectors['detail_time'])
-                    if time_element:
-                        time_str = time_element.get_text(strip=True)
-                        time_str_for_user = time_str.split('<')[0].strip()
-                        dt_object = combine_date_and_time_str(date_obj, time_str)
-                        if dt_object:
-                            timestamp = int(dt_object.timestamp())
+                if time_str:
+                    time_str_for_user = time_str.split('<')[0].strip()
+                    dt_object = combine_date_and_time_str(date_obj, time_str)
+                    if dt_object:
+                        timestamp = int(dt_object.timestamp())
 
                 if not dt_object:
                     # Если время не найдено, ставим полночь дня, за который парсим
                     dt_object = date_obj.replace(hour=0, minute=0, second=0, microsecond=0)
                     timestamp = int(dt_object.timestamp())
 
-                event_info = {
-                    'title': title,
-                    'place': "Место не указано",  # <- значение по умолчанию
-                    'time': time_str_for_user,  # <- чистое время или "Время уточняйте"
-                    'link': detail_url,
-                    'timestamp': timestamp,
-                    'price_min': None,
-                    'price_max': None
-                }
+                event_info = RawEvent(
+                    title=title,
+                    place="Место не указано",  # <- значение по умолчанию
+                    time_str=time_str_for_user,  # <- чистое время или "Время уточняйте"
+                    link=detail_url,
+                    timestamp=timestamp,
+                    config_id=config_id,
+                )
                 final_events.append(event_info)
-                time.sleep(0.1)
 
             except Exception:
                 continue
@@ -0,0 +1,289 @@
+# Файл: parsers/metrics.py
+#
+# Метрики прогона парсера по этапам: сколько времени, сколько раз, сколько ошибок.
+# Этапы: list_scan (страницы списка), detail_fetch (страницы событий), ticket_fetch (страница покупки),
+# ai_extraction (поиск артистов), db_lookup, db_write, а также config_total (весь конфиг целиком).
+# Все замеры раскладываются по конфигам (site_name) и по этапам; в конце прогона пишется JSON-отчет
+# и, при желании, textfile для Prometheus (node_exporter --collector.textfile).
+#
+# Использование:
+#   with metrics.stage('list_scan') as st:      # работает и в async-коде, и в потоках
+#       ...
+#       st.items += len(events_on_page)        # сколько "полезного" дал этот шаг
+#
+# Переменные окружения:
+#   PARSER_METRICS_DIR   - папка для JSON-отчетов (по умолчанию reports/)
+#   PARSER_METRICS_PROM  - путь к .prom файлу (если не задан - не пишется)
+#
+# Воркер очереди (run_crawl_worker.py) живет сутками, поэтому на этап хранится не больше
+# STAGE_SAMPLES последних замеров (для перцентилей), а число, сумма и максимум считаются по всем.
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger()
+
+METRICS_DIR = os.getenv('PARSER_METRICS_DIR', 'reports')
+PROMETHEUS_TEXTFILE = os.getenv('PARSER_METRICS_PROM')
+
+# Сколько последних замеров на (конфиг, этап) хранить для перцентилей
+STAGE_SAMPLES = 1000
+
+STAGES = ('list_scan', 'detail_fetch', 'ticket_fetch', 'ai_extraction', 'db_lookup', 'db_write', 'config_total')
+
+# Конфиг, к которому относятся замеры текущей задачи (asyncio копирует контекст в задачи сам;
+# для потоков run_in_executor конфиг передается в stage() явно)
+current_config: contextvars.ContextVar[str] = contextvars.ContextVar('parser_metrics_config', default='-')
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Перцентиль по отсортированному списку (линейная интерполяция)."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+
+class StageStats:
+    __slots__ = ('count', 'total', 'max', 'durations', 'errors', 'items')
+
+    def __init__(self, samples: int = STAGE_SAMPLES):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.durations: deque[float] = deque(maxlen=samples)
+        self.errors = 0
+        self.items = 0
+
+    def add(self, duration: float):
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        self.durations.append(duration)
+
+    def merge(self, other: 'StageStats'):
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.durations.extend(other.durations)
+        self.errors += other.errors
+        self.items += other.items
+
+    def summary(self) -> dict:
+        # Перцентили - по последним замерам, остальное - по всем
+        ordered = sorted(self.durations)
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'items': self.items,
+            'total_s': round(self.total, 3),
+            'p50_ms': round(percentile(ordered, 0.5) * 1000, 1),
+            'p95_ms': round(percentile(ordered, 0.95) * 1000, 1),
+            'max_ms': round(self.max * 1000, 1),
+        }
+
+
+class StageTimer:
+    """То, что отдает `with stage(...) as st` - можно добавить число обработанных элементов."""
+    __slots__ = ('items',)
+
+    def __init__(self):
+        self.items = 0
+
+
+class RunMetrics:
+    def __init__(self, run_id: Optional[str] = None):
+        self.run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+        self.started_at = datetime.now()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        # (config, stage) -> StageStats
+        self._stats: dict[tuple[str, str], StageStats] = {}
+        self.counters: dict[str, int] = {}
+        # Максимумы за прогон (например, пиковая память браузера)
+        self.gauges: dict[str, float] = {}
+        # Конфиги с неполным результатом (не уложились в бюджет времени): конфиг -> причина
+        self.partial: dict[str, str] = {}
+
+    def record(self, name: str, duration: float, config: Optional[str] = None, ok: bool = True, items: int = 0):
+        key = (config or current_config.get(), name)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = StageStats()
+            stats.add(duration)
+            stats.items += items
+            if not ok:
+                stats.errors += 1
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge_max(self, name: str, value: float):
+        with self._lock:
+            if value > self.gauges.get(name, float('-inf')):
+                self.gauges[name] = value
+
+    def note_partial(self, config: str, reason: str) -> bool:
+        """Запоминает первую причину неполного результата конфига. True - если конфиг отмечен впервые."""
+        with self._lock:
+            if config in self.partial:
+                return False
+            self.partial[config] = reason
+            return True
+
+    @contextmanager
+    def stage(self, name: str, config: Optional[str] = None):
+        timer = StageTimer()
+        started = time.perf_counter()
+        try:
+            yield timer
+        except BaseException:
+            self.record(name, time.perf_counter() - started, config, ok=False, items=timer.items)
+            raise
+        self.record(name, time.perf_counter() - started, config, ok=True, items=timer.items)
+
+    def report(self) -> dict:
+        with self._lock:
+            items = list(self._stats.items())
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            partial = dict(self.partial)
+
+        by_stage: dict[str, StageStats] = {}
+        by_config: dict[str, dict[str, dict]] = {}
+        for (config, name), stats in items:
+            # Сводка по этапу - по всем конфигам; окно без ограничения, в нем до STAGE_SAMPLES замеров на конфиг
+            by_stage.setdefault(name, StageStats(samples=None)).merge(stats)
+            by_config.setdefault(config, {})[name] = stats.summary()
+
+        return {
+            'run_id': self.run_id,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now().isoformat(timespec='seconds'),
+            'duration_s': round(time.perf_counter() - self._started, 3),
+            'counters': counters,
+            'gauges': gauges,
+            'partial': partial,
+            'stages': {name: stats.summary() for name, stats in sorted(by_stage.items())},
+            'configs': dict(sorted(by_config.items())),
+        }
+
+    def log_summary(self, report: Optional[dict] = None):
+        report = report or self.report()
+        logger.info(f"[metrics] Прогон {report['run_id']}: {report['duration_s']:.1f} с")
+        for name, s in report['stages'].items():
+            logger.info(f"[metrics]   {name:<14} n={s['count']:<5} ошибок={s['errors']:<4} всего={s['total_s']:>8.1f} с "
+                        f"p50={s['p50_ms']:>8.0f} мс p95={s['p95_ms']:>8.0f} мс элементов={s['items']}")
+        for config, reason in report['partial'].items():
+            logger.warning(f"[metrics]   частичный результат: {config} ({reason})")
+
+    def write_json(self, directory: str = METRICS_DIR, report: Optional[dict] = None) -> str:
+        report = report or self.report()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"parser_run_{report['run_id']}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return path
+
+    def write_prometheus(self, path: str, report: Optional[dict] = None):
+        """Textfile для node_exporter. Пишется атомарно (через временный файл), чтобы коллектор не прочитал половину."""
+        report = report or self.report()
+
+        def label(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+        lines = [
+            '# HELP parser_stage_duration_seconds Время этапов парсера за последний прогон.',
+            '# TYPE parser_stage_duration_seconds summary',
+        ]
+        for config, stages in report['configs'].items():
+            for name, s in stages.items():
+                labels = f'stage="{name}",config="{label(config)}"'
+                lines.append(f'parser_stage_duration_seconds{{{labels},quantile="0.5"}} {s["p50_ms"] / 1000}')
+                lines.append(f'parser_stage_duration_seconds{{{labels},quantile="0.95"}} {s["p95_ms"] / 1000}')
+                lines.append(f'parser_stage_duration_seconds_sum{{{labels}}} {s["total_s"]}')
+                lines.append(f'parser_stage_duration_seconds_count{{{labels}}} {s["count"]}')
+        lines += ['# HELP parser_stage_errors Ошибки этапов за последний прогон.', '# TYPE parser_stage_errors gauge']
+        for config, stages in report['configs'].items():
+            for name, s in stages.items():
+                lines.append(f'parser_stage_errors{{stage="{name}",config="{label(config)}"}} {s["errors"]}')
+        lines += ['# HELP parser_stage_items Обработано элементов за последний прогон.', '# TYPE parser_stage_items gauge']
+        for config, stages in report['configs'].items():
+            for name, s in stages.items():
+                lines.append(f'parser_stage_items{{stage="{name}",config="{label(config)}"}} {s["items"]}')
+        lines += ['# TYPE parser_run_counter gauge']
+        for name, value in report['counters'].items():
+            lines.append(f'parser_run_counter{{name="{label(name)}"}} {value}')
+        lines += ['# TYPE parser_run_gauge gauge']
+        for name, value in report['gauges'].items():
+            lines.append(f'parser_run_gauge{{name="{label(name)}"}} {value}')
+        lines += ['# HELP parser_config_partial Конфиг не уложился в бюджет времени (результат неполный).',
+                  '# TYPE parser_config_partial gauge']
+        for config in report['partial']:
+            lines.append(f'parser_config_partial{{config="{label(config)}"}} 1')
+        lines += [
+            '# TYPE parser_run_duration_seconds gauge',
+            f'parser_run_duration_seconds {report["duration_s"]}',
+            '# TYPE parser_run_finished_timestamp_seconds gauge',
+            f'parser_run_finished_timestamp_seconds {int(time.time())}',
+        ]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmp_path, path)
+
+
+# --- Текущий прогон (один на процесс) ---
+_run = RunMetrics()
+
+
+def start_run(run_id: Optional[str] = None) -> RunMetrics:
+    global _run
+    _run = RunMetrics(run_id)
+    return _run
+
+
+def get_run() -> RunMetrics:
+    return _run
+
+
+def stage(name: str, config: Optional[str] = None):
+    return _run.stage(name, config)
+
+
+def increment(name: str, value: int = 1):
+    _run.increment(name, value)
+
+
+def gauge_max(name: str, value: float):
+    _run.gauge_max(name, value)
+
+
+def finish_run() -> dict:
+    """Пишет отчет текущего прогона (JSON + Prometheus, если настроен) и выводит сводку в лог."""
+    report = _run.report()
+    _run.log_summary(report)
+    try:
+        path = _run.write_json(report=report)
+        logger.info(f"[metrics] Отчет сохранен: {path}")
+        if PROMETHEUS_TEXTFILE:
+            _run.write_prometheus(PROMETHEUS_TEXTFILE, report=report)
+    except OSError as e:
+        logger.error(f"[metrics] Не удалось сохранить отчет: {e}")
+    return report
@@ -0,0 +1,89 @@
+# Файл: parsers/parse_pool.py
+#
+# Пул процессов для CPU-тяжелого разбора HTML.
+# BeautifulSoup/lxml над целой страницей занимает десятки-сотни миллисекунд и держит GIL,
+# поэтому при параллельном обходе сайтов разбор не должен выполняться ни в event loop,
+# ни в потоках. Сюда передаются сырые байты страницы, обратно приходят компактные записи событий.
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+
+logger = logging.getLogger()
+
+# Количество процессов-разборщиков. По умолчанию оставляем одно ядро под event loop и браузеры.
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+
+_pool: ProcessPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+# Статистика по задачам: имя функции -> счетчики
+_stats: dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+
+def get_pool(workers: int | None = None) -> ProcessPoolExecutor:
+    """Возвращает общий пул процессов (создается лениво при первом обращении)."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            max_workers = workers or PARSE_WORKERS
+            _pool = ProcessPoolExecutor(max_workers=max_workers)
+            logger.info(f"[parse-pool] Запущен пул разбора HTML: {max_workers} процесс(ов)")
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+
+
+def _timed_call(func: Callable, html: bytes, args: tuple):
+    """Выполняется в процессе-разборщике: вызывает func и замеряет чистое время разбора."""
+    started = time.perf_counter()
+    result = func(html, *args)
+    return result, time.perf_counter() - started
+
+
+def _record(name: str, size: int, parse_time: float, total_time: float):
+    with _stats_lock:
+        s = _stats.setdefault(name, {'tasks': 0, 'bytes': 0, 'parse_time': 0.0, 'total_time': 0.0, 'max_parse_time': 0.0})
+        s['tasks'] += 1
+        s['bytes'] += size
+        s['parse_time'] += parse_time
+        s['total_time'] += total_time
+        s['max_parse_time'] = max(s['max_parse_time'], parse_time)
+
+
+def parse_html_sync(func: Callable, html: bytes, *args):
+    """
+    Разбирает html функцией func(html, *args) в пуле процессов и ждет результат.
+    func должна быть функцией уровня модуля (ее передают в другой процесс по имени).
+    Вызывается из синхронных парсеров, работающих в потоках (registry запускает их через asyncio.to_thread).
+    """
+    started = time.perf_counter()
+    result, parse_time = get_pool().submit(_timed_call, func, html, args).result()
+    _record(func.__qualname__, len(html), parse_time, time.perf_counter() - started)
+    return result
+
+
+def get_stats() -> dict[str, dict]:
+    with _stats_lock:
+        return {name: dict(s) for name, s in _stats.items()}
+
+
+def log_stats():
+    for name, s in get_stats().items():
+        avg_parse = s['parse_time'] / s['tasks'] * 1000
+        avg_total = s['total_time'] / s['tasks'] * 1000
+        logger.info(
+            f"[parse-pool] {name}: задач={s['tasks']}, {s['bytes'] / 1024 / 1024:.1f} МБ HTML, "
+            f"разбор ~{avg_parse:.1f} мс/стр (макс {s['max_parse_time'] * 1000:.1f} мс), "
+            f"с учетом передачи ~{avg_total:.1f} мс/стр"
+        )
@@ -0,0 +1,358 @@
+# Файл: parsers/rate_limiter.py
+#
+# Общий "вежливый" ограничитель запросов для всех парсеров.
+# Для каждого хоста держим:
+#   - token bucket (ограничение частоты запросов, req/s);
+#   - AIMD-окно параллельности: окно медленно растет, пока сайт отвечает быстро и без ошибок,
+#     и резко уменьшается вдвое при ошибках, капче/429 или сильном росте задержки.
+# Работает и из async-кода (Playwright), и из синхронных парсеров, запущенных в потоках.
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+import requests
+
+from parsers import deadline, fixtures
+
+logger = logging.getLogger()
+
+# --- Настройки по умолчанию ---
+DEFAULT_RATE = 2.0            # запросов в секунду на хост
+DEFAULT_BURST = 4             # максимальный запас токенов
+DEFAULT_MIN_WINDOW = 1        # минимальное окно параллельности
+DEFAULT_MAX_WINDOW = 8        # максимальное окно параллельности
+DEFAULT_TARGET_LATENCY = 5.0  # "нормальная" задержка ответа, сек
+DEFAULT_RETRIES = 3
+BACKOFF_BASE = 1.0            # базовая задержка для экспоненциального backoff, сек
+BACKOFF_CAP = 30.0
+THROUGHPUT_WINDOW = 60.0      # за какой период считаем текущую пропускную способность, сек
+
+# Индивидуальные лимиты для известных хостов (переопределяют значения по умолчанию)
+HOST_LIMITS = {
+    'afisha.yandex.ru': {'rate': 0.5, 'burst': 1, 'max_window': 1},
+    'www.kvitki.by': {'rate': 3.0, 'burst': 5, 'max_window': 8},
+}
+
+THROTTLE_STATUSES = {429, 503}
+CAPTCHA_MARKERS = ('showcaptcha', 'smartcaptcha', 'g-recaptcha', 'captcha-page')
+
+
+class HostThrottled(requests.RequestException):
+    """
+    Сайт явно просит нас притормозить: 429/503 или страница с капчей.
+    Наследуемся от RequestException, чтобы существующие обработчики в парсерах ловили и ее.
+    """
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class HostLimiter:
+    """Token bucket + AIMD-окно параллельности для одного хоста."""
+
+    def __init__(
+        self,
+        host: str,
+        rate: float = DEFAULT_RATE,
+        burst: int = DEFAULT_BURST,
+        min_window: int = DEFAULT_MIN_WINDOW,
+        max_window: int = DEFAULT_MAX_WINDOW,
+        target_latency: float = DEFAULT_TARGET_LATENCY,
+    ):
+        self.host = host
+        self.max_rate = rate
+        self.min_rate = rate / 8
+        self.rate = rate
+        self.burst = burst
+        self.min_window = min_window
+        self.max_window = max_window
+        self.target_latency = target_latency
+
+        self.tokens = float(burst)
+        self.window = float(min(max(2, min_window), max_window))
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+
+        self.completed = 0
+        self.errors = 0
+        self.throttled = 0
+        self._recent = deque()  # время завершения последних запросов (для throughput)
+        self._last_refill = time.monotonic()
+        # threading.Lock, т.к. лимитер делят async-парсеры и синхронные парсеры в потоках.
+        # Критические секции очень короткие, event loop они не блокируют.
+        self._lock = threading.Lock()
+
+    # --- Внутренняя логика ---
+    def _refill(self, now: float):
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+
+    def _try_acquire(self) -> float:
+        """Пытается занять слот. Возвращает 0, если слот получен, иначе сколько подождать."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.in_flight >= int(self.window):
+                return 0.05
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+            self.in_flight += 1
+            return 0.0
+
+    def release(self, latency: float, ok: bool = True, throttled: bool = False):
+        """Освобождает слот и подстраивает окно/частоту по результату запроса."""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            now = time.monotonic()
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+
+            if throttled:
+                self.throttled += 1
+                self.errors += 1
+                self.window = max(self.min_window, self.window / 2)
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0.0)
+            elif not ok:
+                self.errors += 1
+                self.window = max(self.min_window, self.window / 2)
+            elif self.latency_ewma > 2 * self.target_latency:
+                # Сайт заметно "просел" - уменьшаем нагрузку, но мягче, чем при ошибке
+                self.completed += 1
+                self.window = max(self.min_window, self.window * 0.75)
+            else:
+                self.completed += 1
+                # Additive increase: примерно +1 к окну за одно "полное окно" успешных запросов
+                self.window = min(self.max_window, self.window + 1 / self.window)
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+            self._recent.append(now)
+            while self._recent and now - self._recent[0] > THROUGHPUT_WINDOW:
+                self._recent.popleft()
+
+    # --- Публичный API ---
+    async def acquire(self):
+        while (wait := self._try_acquire()) > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self):
+        while (wait := self._try_acquire()) > 0:
+            time.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self):
+        """async with limiter.slot(): ... - занимает слот и сам отчитывается о результате."""
+        await self.acquire()
+        started = time.monotonic()
+        ok, throttled = True, False
+        try:
+            yield
+        except HostThrottled:
+            ok, throttled = False, True
+            raise
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.release(time.monotonic() - started, ok=ok, throttled=throttled)
+
+    @contextmanager
+    def slot_sync(self):
+        """Синхронный вариант slot() для парсеров на requests/Selenium."""
+        self.acquire_sync()
+        started = time.monotonic()
+        ok, throttled = True, False
+        try:
+            yield
+        except HostThrottled:
+            ok, throttled = False, True
+            raise
+        except Exception:
+            ok = False
+            raise
+        finally:
+            self.release(time.monotonic() - started, ok=ok, throttled=throttled)
+
+    def stats(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            recent = [t for t in self._recent if now - t <= THROUGHPUT_WINDOW]
+            span = min(THROUGHPUT_WINDOW, now - recent[0]) if recent else 0
+            return {
+                'host': self.host,
+                'throughput_rps': round(len(recent) / span, 2) if span > 0 else 0.0,
+                'rate': round(self.rate, 2),
+                'window': round(self.window, 2),
+                'in_flight': self.in_flight,
+                'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                'completed': self.completed,
+                'errors': self.errors,
+                'throttled': self.throttled,
+            }
+
+
+# --- Реестр лимитеров по хостам ---
+_limiters: dict[str, HostLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(url_or_host: str, **overrides) -> HostLimiter:
+    """Возвращает общий лимитер для хоста (создает при первом обращении)."""
+    host = urlparse(url_or_host).netloc or url_or_host
+    with _registry_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            params = {**HOST_LIMITS.get(host, {}), **overrides}
+            limiter = HostLimiter(host, **params)
+            _limiters[host] = limiter
+        return limiter
+
+
+def get_all_stats() -> list[dict]:
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return [limiter.stats() for limiter in limiters]
+
+
+def log_stats():
+    for s in get_all_stats():
+        logger.info(
+            f"[rate] {s['host']}: {s['throughput_rps']} req/s, окно={s['window']}, rate={s['rate']}/s, "
+            f"в работе={s['in_flight']}, задержка~{s['latency_ewma']}s, ок={s['completed']}, "
+            f"ошибок={s['errors']} (из них троттлинг={s['throttled']})"
+        )
+
+
+async def report_stats_periodically(interval: float = 30.0):
+    """Фоновая задача: периодически пишет в лог текущую пропускную способность по хостам."""
+    while True:
+        await asyncio.sleep(interval)
+        log_stats()
+
+
+# --- Повторы с jitter-backoff ---
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """Full jitter: случайная задержка от 0 до base * 2^attempt (но не меньше Retry-After)."""
+    delay = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        delay = max(delay, min(retry_after, BACKOFF_CAP))
+    return delay
+
+
+def looks_like_captcha(text_or_url: str) -> bool:
+    sample = (text_or_url or '')[:20000].lower()
+    return any(marker in sample for marker in CAPTCHA_MARKERS)
+
+
+def _retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get('Retry-After')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def _check_backoff(delay: float):
+    """Пауза перед повтором не должна выходить за дедлайн - иначе повтор бессмысленен."""
+    left = deadline.remaining()
+    if left is not None and delay >= left:
+        raise deadline.DeadlineExceeded(f"Нет времени на повтор через {delay:.1f}s (осталось {left:.1f}s)")
+
+
+def fetch(url: str, headers: dict = None, timeout: float = 20, retries: int = DEFAULT_RETRIES,
+          session: requests.Session = None, stream: bool = False) -> requests.Response:
+    """
+    requests.get через лимитер хоста с повторами.
+    Повторяет сетевые ошибки, 5xx, 429 и капчу; 4xx (кроме 429) возвращает как есть.
+    В режиме воспроизведения фикстур (parsers/fixtures.py) отвечает из набора, без сети и лимитов.
+    stream=True: тело не читается (капча проверяется только по адресу) - его читает вызывающий
+    из response.raw и закрывает ответ сам. При записи фикстур тело все же читается целиком.
+    """
+    if fixtures.is_replaying():
+        return fixtures.replay_response(url)
+
+    limiter = get_limiter(url)
+    getter = session.get if session else requests.get
+    last_exc: Exception | None = None
+
+    for attempt in range(retries + 1):
+        retry_after = None
+        # Бюджет времени прогона (parsers/deadline.py): не начинаем запрос после дедлайна
+        # и не ждем ответа дольше остатка
+        deadline.check()
+        try:
+            with limiter.slot_sync():
+                response = getter(url, headers=headers, timeout=deadline.clip(timeout), stream=stream)
+                if response.status_code in THROTTLE_STATUSES:
+                    response.close()
+                    raise HostThrottled(f"HTTP {response.status_code}", _retry_after(response))
+                if response.status_code >= 500:
+                    response.close()
+                    raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+                if looks_like_captcha(response.url) or (not stream and looks_like_captcha(response.text)):
+                    response.close()
+                    raise HostThrottled("Страница с капчей")
+            if fixtures.is_recording():
+                fixtures.record_response(url, response)
+            return response
+        except HostThrottled as e:
+            last_exc, retry_after = e, e.retry_after
+        except requests.RequestException as e:
+            last_exc = e
+
+        if attempt < retries:
+            delay = backoff_delay(attempt, retry_after)
+            _check_backoff(delay)
+            logger.warning(f"[rate] {limiter.host}: {last_exc} при запросе {url}. Повтор через {delay:.1f}s "
+                           f"({attempt + 1}/{retries})")
+            time.sleep(delay)
+
+    raise last_exc
+
+
+def call_with_retries_sync(url: str, func: Callable, retries: int = DEFAULT_RETRIES):
+    """Синхронный вызов func() (например, driver.get) через лимитер хоста url с повторами."""
+    if fixtures.is_replaying():
+        return func()
+    limiter = get_limiter(url)
+    for attempt in range(retries + 1):
+        deadline.check()
+        try:
+            with limiter.slot_sync():
+                return func()
+        except Exception as e:
+            if attempt >= retries:
+                raise
+            delay = backoff_delay(attempt, getattr(e, 'retry_after', None))
+            _check_backoff(delay)
+            logger.warning(f"[rate] {limiter.host}: {e}. Повтор через {delay:.1f}s ({attempt + 1}/{retries})")
+            time.sleep(delay)
+
+
+async def call_with_retries(url: str, coro_factory: Callable, retries: int = DEFAULT_RETRIES,
+                            retry_on: tuple = (Exception,)):
+    """Асинхронный вызов await coro_factory() через лимитер хоста url с повторами."""
+    if fixtures.is_replaying():
+        return await coro_factory()
+    limiter = get_limiter(url)
+    for attempt in range(retries + 1):
+        deadline.check()
+        try:
+            async with limiter.slot():
+                return await coro_factory()
+        except retry_on as e:
+            if attempt >= retries:
+                raise
+            delay = backoff_delay(attempt, getattr(e, 'retry_after', None))
+            _check_backoff(delay)
+            logger.warning(f"[rate] {limiter.host}: {e}. Повтор через {delay:.1f}s ({attempt + 1}/{retries})")
+            await asyncio.sleep(delay)
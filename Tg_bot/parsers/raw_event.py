@@ -0,0 +1,123 @@
+# Файл: parsers/raw_event.py
+#
+# Компактная запись "сырого" события - общий формат для всех парсеров и этапа синхронизации с БД.
+# Вместо словаря на десяток ключей + ссылки на весь конфиг храним объект со __slots__
+# и целочисленный id конфига (конфиги "интернируются" в реестре ниже).
+
+import sys
+from typing import Optional
+
+# --- Реестр конфигов: config_id <-> конфиг ---
+_configs: list[dict] = []
+_config_ids: dict[str, int] = {}
+
+
+def config_key(config: dict) -> str:
+    """Стабильный между процессами ключ конфига (для реестра и очереди заданий)."""
+    return config.get('site_name') or config.get('category_name') or config.get('url')
+
+
+def intern_config(config: dict) -> int:
+    """Регистрирует конфиг (по site_name) и возвращает его постоянный в рамках процесса id."""
+    key = config_key(config)
+    config_id = _config_ids.get(key)
+    if config_id is None:
+        config_id = len(_configs)
+        _configs.append(config)
+        _config_ids[key] = config_id
+    return config_id
+
+
+def get_config(config_id: int) -> dict | None:
+    if 0 <= config_id < len(_configs):
+        return _configs[config_id]
+    return None
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # Места проведения и строки времени сильно повторяются между событиями
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class RawEvent:
+    """Сырые данные одного события, как их отдал парсер."""
+    __slots__ = (
+        'title', 'place', 'time_str', 'link', 'timestamp',
+        'price_min', 'price_max', 'tickets_info', 'full_description', 'config_id',
+    )
+
+    def __init__(
+        self,
+        title: Optional[str] = None,
+        place: Optional[str] = None,
+        time_str: Optional[str] = None,
+        link: Optional[str] = None,
+        timestamp: Optional[int] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        tickets_info: Optional[str] = None,
+        full_description: Optional[str] = None,
+        config_id: int = -1,
+    ):
+        self.title = title
+        self.place = _intern(place)
+        self.time_str = _intern(time_str)
+        self.link = link
+        self.timestamp = timestamp
+        self.price_min = price_min
+        self.price_max = price_max
+        self.tickets_info = _intern(tickets_info)
+        self.full_description = full_description
+        self.config_id = config_id
+
+    def __reduce__(self):
+        # События из процессов-разборщиков (parse_pool) приходят через pickle, а восстановление
+        # __slots__ по умолчанию не вызывает __init__ - строки не интернировались бы
+        return RawEvent, tuple(getattr(self, name) for name in self.__slots__)
+
+    @property
+    def config(self) -> dict | None:
+        return get_config(self.config_id)
+
+    @property
+    def event_type(self) -> str:
+        config = self.config
+        return config.get('event_type', 'Другое') if config else 'Другое'
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RawEvent':
+        return cls(**{name: data.get(name) for name in cls.__slots__ if name in data})
+
+    def __repr__(self):
+        return f"RawEvent(title={self.title!r}, time_str={self.time_str!r}, config_id={self.config_id})"
+
+
+def measure_memory(events: list[RawEvent]) -> dict:
+    """
+    Оценивает память, занимаемую списком событий (объекты + их значения; общие строки считаются один раз),
+    и сравнивает с прежним представлением - словарем на событие.
+    """
+    seen: set[int] = set()
+    total = 0
+    as_dict = 0
+    for event in events:
+        total += sys.getsizeof(event)
+        for name in RawEvent.__slots__:
+            value = getattr(event, name)
+            if value is not None and id(value) not in seen:
+                seen.add(id(value))
+                total += sys.getsizeof(value)
+        # Прежний формат: словарь полей (+ 'event_type' и ссылка на конфиг)
+        as_dict += sys.getsizeof({**event.to_dict(), 'event_type': None, 'config': None})
+
+    count = len(events) or 1
+    return {
+        'events': len(events),
+        'total_bytes': total,
+        'bytes_per_event': total // count,
+        'container_bytes_per_event': sys.getsizeof(events[0]) if events else 0,
+        'dict_container_bytes_per_event': as_dict // count,
+    }
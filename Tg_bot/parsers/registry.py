@@ -0,0 +1,117 @@
+# Файл: parsers/registry.py
+#
+# Реестр парсеров по parsing_method с ленивой загрузкой.
+# Раньше run_parser.py импортировал все парсеры сразу (а с ними Playwright, Selenium,
+# webdriver_manager, BeautifulSoup, google.generativeai), даже если в прогоне нужен один метод.
+# Теперь реестр хранит только строки "модуль:функция", а модуль импортируется при первом
+# обращении к методу.
+#
+# Регистрация (в стиле плагинов):
+#   - словарь PARSERS в parsers/configs/__init__.py: {'parsing_method': 'пакет.модуль:функция'};
+#   - отдельный конфиг может указать свой парсер ключом 'parser': 'пакет.модуль:функция'
+#     (метод берется из его 'parsing_method');
+#   - из кода: registry.register('method', 'пакет.модуль:функция').
+#
+# Все парсеры отдаются как корутины: синхронные запускаются в потоке (asyncio.to_thread).
+
+import asyncio
+import functools
+import importlib
+import inspect
+import logging
+import pkgutil
+import threading
+import time
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger()
+
+# parsing_method -> "модуль:функция"
+_specs: dict[str, str] = {}
+# parsing_method -> загруженная асинхронная функция
+_loaded: dict[str, Callable[[dict], Awaitable[list]]] = {}
+_lock = threading.Lock()
+_configs_registered = False
+
+
+def register(method: str, target: str):
+    """Регистрирует парсер без импорта модуля. Повторная регистрация с другим target заменяет прежнюю."""
+    if ':' not in target:
+        raise ValueError(f"Ожидается 'модуль:функция', получено: {target!r}")
+    with _lock:
+        if _specs.get(method) != target:
+            _specs[method] = target
+            _loaded.pop(method, None)
+
+
+def register_from_configs(configs: Optional[list[dict]] = None):
+    """Регистрирует парсеры из пакета конфигов: общий словарь PARSERS и ключи 'parser' отдельных конфигов."""
+    global _configs_registered
+    from parsers import configs as configs_package
+
+    for method, target in getattr(configs_package, 'PARSERS', {}).items():
+        register(method, target)
+    for config in configs if configs is not None else getattr(configs_package, 'ALL_CONFIGS', []):
+        if config.get('parser') and config.get('parsing_method'):
+            register(config['parsing_method'], config['parser'])
+    _configs_registered = True
+
+
+def all_configs() -> dict[str, dict]:
+    """Все конфиги из parsers/configs (включая отключенные в ALL_CONFIGS), по site_name."""
+    from parsers import configs as configs_package
+    from parsers.raw_event import config_key
+
+    result = {}
+    for module_info in pkgutil.iter_modules(configs_package.__path__):
+        config = getattr(importlib.import_module(f'parsers.configs.{module_info.name}'), 'CONFIG', None)
+        if isinstance(config, dict):
+            result[config_key(config)] = config
+    return result
+
+
+def _ensure_registered():
+    if not _configs_registered:
+        register_from_configs()
+
+
+def is_registered(method: str) -> bool:
+    """Есть ли парсер для метода (без импорта его модуля)."""
+    _ensure_registered()
+    return method in _specs
+
+
+def known_methods() -> list[str]:
+    _ensure_registered()
+    return sorted(_specs)
+
+
+def _load(method: str, target: str) -> Callable[[dict], Awaitable[list]]:
+    module_name, func_name = target.split(':', 1)
+    started = time.perf_counter()
+    func = getattr(importlib.import_module(module_name), func_name)
+    logger.info(f"[registry] Загружен парсер '{method}' ({target}) за {(time.perf_counter() - started) * 1000:.0f} мс")
+
+    if inspect.iscoroutinefunction(func):
+        return func
+
+    @functools.wraps(func)
+    async def run_in_thread(config: dict):
+        return await asyncio.to_thread(func, config)
+    return run_in_thread
+
+
+def get_parser(method: str) -> Optional[Callable[[dict], Awaitable[list]]]:
+    """Возвращает асинхронную функцию-парсер для parsing_method (импортирует модуль при первом вызове) или None."""
+    _ensure_registered()
+    parser = _loaded.get(method)
+    if parser is not None:
+        return parser
+    target = _specs.get(method)
+    if target is None:
+        return None
+    with _lock:
+        parser = _loaded.get(method)
+        if parser is None:
+            parser = _loaded[method] = _load(method, target)
+    return parser
@@ -0,0 +1,305 @@
+# Файл: parsers/sitemap.py
+#
+# Поиск страниц событий по sitemap/лентам сайта вместо листания страниц категории в браузере.
+# Sitemap берется из конфига ('sitemap_url') или из строк "Sitemap:" в robots.txt; поддерживаются
+# индексы sitemap (вложенные sitemap), .xml.gz, а также ленты RSS и Atom.
+# Sitemap скачивается потоком (fetch(stream=True)) и сразу разбирается (lxml.iterparse + очистка
+# разобранных элементов), gzip распаковывается на лету - многомегабайтный sitemap не держится
+# в памяти целиком ни сжатым, ни распакованным. Исключение - запись и воспроизведение фикстур
+# (parsers/fixtures.py): там тело ответа и так целиком в памяти.
+#
+# Кроме ссылок sitemap дает lastmod - по нему можно пропускать страницы, которые не менялись
+# с прошлого прогона (конфиг 'sitemap_skip_unchanged': True). Состояние (url -> lastmod) хранится
+# в PARSER_SITEMAP_STATE (по умолчанию parsers/sitemap_state.json) и обновляется только для
+# страниц, которые удалось разобрать (mark_processed).
+#
+# Включение для конфига: 'discovery': 'sitemap' (или PARSER_DISCOVERY=sitemap для всех).
+# Если sitemap нет или в нем не нашлось подходящих ссылок, discover() возвращает None -
+# вызывающий код листает страницы категории как раньше.
+#
+# Ключи конфига:
+#   sitemap_url            - адрес sitemap/ленты (по умолчанию - из robots.txt)
+#   sitemap_url_pattern    - регулярное выражение для ссылок на события
+#                            (по умолчанию - ссылки глубже адреса категории 'url')
+#   sitemap_skip_unchanged - пропускать страницы с прежним lastmod
+
+import gzip
+import io
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+from typing import Iterator, NamedTuple, Optional
+from urllib.parse import urljoin, urlparse
+
+import requests
+import urllib3
+from lxml import etree
+
+from parsers import deadline, fixtures, metrics
+from parsers.rate_limiter import fetch
+from parsers.raw_event import config_key
+
+logger = logging.getLogger()
+
+DISCOVERY_MODE = os.getenv('PARSER_DISCOVERY')
+STATE_PATH = os.getenv('PARSER_SITEMAP_STATE', os.path.join(os.path.dirname(__file__), 'sitemap_state.json'))
+# Защита от циклов и гигантских индексов
+MAX_SITEMAPS = 200
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
+}
+
+
+class SitemapEntry(NamedTuple):
+    url: str
+    lastmod: Optional[str]
+
+
+def uses_sitemap(config: dict) -> bool:
+    return (config.get('discovery') or DISCOVERY_MODE) == 'sitemap'
+
+
+_local_names: dict[str, str] = {}
+
+
+def _local_name(tag) -> str:
+    # Различных тегов в sitemap единицы, а вызовов - по три на запись
+    name = _local_names.get(tag)
+    if name is None:
+        name = tag[tag.rfind('}') + 1:].lower() if isinstance(tag, str) else ''
+        if isinstance(tag, str):
+            _local_names[tag] = name
+    return name
+
+
+def _fields(element) -> dict[str, str]:
+    """Тексты дочерних элементов записи по локальному имени (первое непустое значение)."""
+    fields = {}
+    for child in element:
+        name = _local_name(child.tag)
+        if name in fields:
+            continue
+        # Atom: <link href="..."/>
+        value = (name == 'link' and child.get('href')) or child.text
+        if value and not value.isspace():
+            fields[name] = value.strip()
+    return fields
+
+
+class _HeadStream:
+    """Поток, у которого уже прочитаны первые байты (сигнатура gzip): отдает их, затем остальное."""
+
+    def __init__(self, head: bytes, stream):
+        self._head = head
+        self._stream = stream
+
+    def read(self, size: int = -1) -> bytes:
+        if self._head:
+            if 0 <= size < len(self._head):
+                chunk, self._head = self._head[:size], self._head[size:]
+                return chunk
+            chunk, self._head = self._head, b''
+            return chunk
+        return self._stream.read(size) or b''
+
+
+def _open_stream(source):
+    """
+    Поток для iterparse из байтов или двоичного файлового объекта (response.raw).
+    .gz распаковывается на лету - по сигнатуре, а не по расширению.
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    head = source.read(2) or b''
+    stream = _HeadStream(head, source)
+    if head == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=stream)
+    return stream
+
+
+def _response_stream(response: requests.Response):
+    """Тело ответа fetch(stream=True) как поток; при записи/воспроизведении фикстур - уже прочитанные байты."""
+    if fixtures.is_replaying() or fixtures.is_recording():
+        return response.content
+    # Content-Encoding (gzip/deflate при передаче) снимает urllib3; сжатие самого файла (.xml.gz) - _open_stream
+    response.raw.decode_content = True
+    return response.raw
+
+
+# Элементы-записи: sitemap (индекс), url (sitemap), item (RSS), entry (Atom) - в любом пространстве имен
+_RECORD_TAGS = ('{*}sitemap', '{*}url', '{*}item', '{*}entry')
+
+
+def iter_sitemap(source) -> Iterator[tuple[str, SitemapEntry]]:
+    """
+    Потоково разбирает sitemap, индекс sitemap, RSS или Atom (байты или двоичный поток).
+    Отдает ('sitemap', entry) для вложенных sitemap и ('url', entry) для страниц.
+    """
+    for _, element in etree.iterparse(_open_stream(source), events=('end',), tag=_RECORD_TAGS, recover=True,
+                                      resolve_entities=False, no_network=True, huge_tree=True):
+        name = _local_name(element.tag)
+        fields = _fields(element)
+        if name in ('sitemap', 'url'):
+            if 'loc' in fields:
+                yield name, SitemapEntry(fields['loc'], fields.get('lastmod'))
+        else:
+            link = fields.get('link') or fields.get('guid')
+            if link:
+                lastmod = fields.get('lastmod') or fields.get('updated') or fields.get('pubdate') or fields.get('published')
+                yield 'url', SitemapEntry(link, lastmod)
+        # Разобранная запись и уже пройденные соседи больше не нужны
+        element.clear()
+        parent = element.getparent()
+        while parent is not None and element.getprevious() is not None:
+            del parent[0]
+
+
+def sitemaps_from_robots(base_url: str) -> list[str]:
+    parsed = urlparse(base_url)
+    robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+    try:
+        response = fetch(robots_url, headers=HEADERS, timeout=10, retries=1)
+    except requests.RequestException as e:
+        logger.info(f"[sitemap] robots.txt недоступен ({robots_url}): {e}")
+        return []
+    if response.status_code != 200:
+        return []
+    return [
+        line.split(':', 1)[1].strip()
+        for line in response.text.splitlines()
+        if line.lower().startswith('sitemap:') and line.split(':', 1)[1].strip()
+    ]
+
+
+def url_matcher(config: dict):
+    pattern = config.get('sitemap_url_pattern')
+    if pattern:
+        return re.compile(pattern).search
+    # По умолчанию - страницы "внутри" категории: https://site/rus/bileti/muzyka/<что-то>
+    prefix = config['url'].rstrip('/') + '/'
+    return lambda url: url.startswith(prefix) and len(url.rstrip('/')) > len(prefix.rstrip('/'))
+
+
+def discover(config: dict) -> Optional[list[SitemapEntry]]:
+    """
+    Ссылки на события конфига из sitemap (синхронно - запускать в потоке).
+    None - sitemap нет или подходящих ссылок нет (нужно листать категорию).
+    """
+    site_name = config_key(config)
+    roots = [config['sitemap_url']] if config.get('sitemap_url') else sitemaps_from_robots(config['url'])
+    if not roots:
+        logger.info(f"[sitemap] {site_name}: sitemap не найден")
+        return None
+
+    matches = url_matcher(config)
+    queue, seen_sitemaps = list(roots), set()
+    entries: dict[str, SitemapEntry] = {}
+    while queue and len(seen_sitemaps) < MAX_SITEMAPS:
+        if deadline.expired():
+            deadline.mark_partial(site_name, f"sitemap: прочитано {len(seen_sitemaps)} файлов")
+            break
+        sitemap_url = queue.pop(0)
+        if sitemap_url in seen_sitemaps:
+            continue
+        seen_sitemaps.add(sitemap_url)
+        try:
+            with metrics.stage('list_scan', site_name) as st:
+                with fetch(sitemap_url, headers=HEADERS, timeout=30, stream=True) as response:
+                    if response.status_code != 200:
+                        logger.info(f"[sitemap] {sitemap_url}: HTTP {response.status_code}")
+                        continue
+                    found = 0
+                    for kind, entry in iter_sitemap(_response_stream(response)):
+                        if kind == 'sitemap':
+                            queue.append(urljoin(sitemap_url, entry.url))
+                        elif matches(entry.url):
+                            entries[entry.url] = entry
+                            found += 1
+                    st.items = found
+        # urllib3.exceptions.HTTPError - обрыв при чтении потока, OSError/EOFError - битый gzip
+        except (requests.RequestException, urllib3.exceptions.HTTPError, etree.LxmlError, OSError, EOFError) as e:
+            logger.warning(f"[sitemap] Не удалось прочитать {sitemap_url}: {e}")
+
+    if not entries:
+        logger.info(f"[sitemap] {site_name}: в sitemap нет ссылок на события ({len(seen_sitemaps)} файлов)")
+        return None
+    logger.info(f"[sitemap] {site_name}: {len(entries)} ссылок из {len(seen_sitemaps)} файлов sitemap")
+    return list(entries.values())
+
+
+# --- Пропуск неизменившихся страниц по lastmod ---
+_state: Optional[dict[str, str]] = None
+_state_lock = threading.Lock()
+
+
+def _load_state() -> dict[str, str]:
+    global _state
+    if _state is None:
+        try:
+            with open(STATE_PATH, encoding='utf-8') as f:
+                _state = json.load(f)
+        except (OSError, ValueError):
+            _state = {}
+    return _state
+
+
+def _parse_lastmod(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def is_unchanged(entry: SitemapEntry) -> bool:
+    """Страница не менялась с прошлого успешного разбора (по lastmod)."""
+    if not entry.lastmod:
+        return False
+    with _state_lock:
+        previous = _load_state().get(entry.url)
+    if previous is None:
+        return False
+    if previous == entry.lastmod:
+        return True
+    current, before = _parse_lastmod(entry.lastmod), _parse_lastmod(previous)
+    try:
+        return current is not None and before is not None and current <= before
+    except TypeError:  # одна дата с часовым поясом, другая без
+        return False
+
+
+def select_changed(config: dict, entries: list[SitemapEntry]) -> list[SitemapEntry]:
+    """Отбрасывает неизменившиеся страницы, если это включено в конфиге."""
+    if not config.get('sitemap_skip_unchanged'):
+        return entries
+    changed = [entry for entry in entries if not is_unchanged(entry)]
+    skipped = len(entries) - len(changed)
+    if skipped:
+        logger.info(f"[sitemap] {config_key(config)}: пропущено неизменившихся страниц: {skipped} из {len(entries)}")
+        metrics.increment('sitemap_unchanged_skipped', skipped)
+    return changed
+
+
+def mark_processed(entries: list[SitemapEntry]):
+    """Запоминает lastmod разобранных страниц (в памяти; на диск - save_state())."""
+    with _state_lock:
+        state = _load_state()
+        for entry in entries:
+            if entry.lastmod:
+                state[entry.url] = entry.lastmod
+
+
+def save_state():
+    with _state_lock:
+        if _state is None:
+            return
+        directory = os.path.dirname(STATE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{STATE_PATH}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(_state, f, ensure_ascii=False)
+        os.replace(tmp_path, STATE_PATH)
@@ -0,0 +1,84 @@
+# Файл: parsers/snapshot.py
+#
+# Снимок сырых событий (результат этапа 1 run_parser.py) в сжатом JSONL - чтобы этап
+# синхронизации с БД можно было гонять и профилировать отдельно, без полного обхода сайтов.
+#
+# Формат: gzip, одна JSON-строка на строку файла.
+#   первая строка - заголовок: {"snapshot": 1, "created_at": ..., "events": N, "configs": [...]}
+#   дальше - по событию: поля RawEvent.to_dict(), но вместо config_id - "config": site_name
+#   (config_id - номер в реестре процесса и между процессами не совпадает).
+#
+# Запись:       python run_parser.py --dump-snapshot snapshots/run.jsonl.gz
+# Воспроизведение: python run_parser.py --from-snapshot snapshots/run.jsonl.gz [--no-ai] [--rollback]
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Iterator
+
+from parsers import registry
+from parsers.raw_event import RawEvent, config_key, intern_config
+
+logger = logging.getLogger()
+
+SNAPSHOT_VERSION = 1
+
+
+def dump(events: list[RawEvent], path: str) -> int:
+    """Пишет события в снимок атомарно (через временный файл). Возвращает число записанных событий."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    configs = sorted({config_key(event.config) for event in events if event.config})
+    header = {
+        'snapshot': SNAPSHOT_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'events': len(events),
+        'configs': configs,
+    }
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        f.write(json.dumps(header, ensure_ascii=False) + '\n')
+        for event in events:
+            data = event.to_dict()
+            del data['config_id']
+            data['config'] = config_key(event.config) if event.config else None
+            f.write(json.dumps(data, ensure_ascii=False) + '\n')
+    os.replace(tmp_path, path)
+    logger.info(f"[snapshot] Сохранено {len(events)} сырых событий: {path} ({os.path.getsize(path) / 1024:.0f} КБ)")
+    return len(events)
+
+
+def iter_events(path: str) -> Iterator[RawEvent]:
+    """Читает снимок построчно. Конфиги ищутся по site_name среди всех конфигов пакета parsers/configs."""
+    # Включая отключенные в ALL_CONFIGS: снимок мог быть снят с другим набором конфигов
+    configs = registry.all_configs()
+    unknown: set[str] = set()
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        header = json.loads(f.readline() or '{}')
+        if header.get('snapshot') != SNAPSHOT_VERSION:
+            raise ValueError(f"{path}: неизвестный формат снимка ({header.get('snapshot')!r})")
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            key = data.pop('config', None)
+            config = configs.get(key)
+            if config is None:
+                unknown.add(str(key))
+                continue
+            data['config_id'] = intern_config(config)
+            yield RawEvent.from_dict(data)
+
+    if unknown:
+        logger.warning(f"[snapshot] Пропущены события неизвестных конфигов: {sorted(unknown)}")
+
+
+def load(path: str) -> list[RawEvent]:
+    events = list(iter_events(path))
+    logger.info(f"[snapshot] Загружено {len(events)} сырых событий из {path}")
+    return events
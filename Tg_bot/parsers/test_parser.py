@@ -4,46 +4,54 @@ import asyncio
 import json
 import re
 import sys
-from dataclasses import dataclass, asdict
 from typing import Optional, Dict, List
 import logging # <-- Добавить импорт
 
-from playwright.async_api import async_playwright, Browser, TimeoutError as PlaywrightTimeoutError
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, TimeoutError as PlaywrightTimeoutError
 
-# --- ГЛОБАЛЬНЫЕ НАСТРОЙКИ (без изменений) ---
+from parsers import deadline, fixtures, metrics, sitemap
+from parsers.browser_watchdog import BrowserWatchdog, PlaywrightRecycler
+
+from parsers.rate_limiter import HostThrottled, call_with_retries, looks_like_captcha, THROTTLE_STATUSES
+from parsers.raw_event import RawEvent, config_key, intern_config
+
+# --- ГЛОБАЛЬНЫЕ НАСТРОЙКИ ---
+# Верхняя граница одновременно открытых вкладок (по памяти браузера).
+# Фактическую нагрузку на сайт регулирует адаптивный лимитер хоста (parsers/rate_limiter.py).
 CONCURRENT_EVENTS = 5
 
-# --- ИЗМЕНЕНИЕ 1: Обновляем модель данных ---
-# Мы разделили описание на два поля для ясности.
-@dataclass
-class EventData:
-    link: str
-    title: Optional[str] = None
-    place: Optional[str] = None
-    # Это поле пойдет в Event.description в БД
-    time_str: Optional[str] = None
-    full_description: Optional[str] = None
-    price_min: Optional[float] = None
-    price_max: Optional[float] = None
-    tickets_available: Optional[int] = None
-    status: str = "ok"
+async def polite_goto(page: Page, url: str, timeout: int = 60000):
+    """page.goto через лимитер хоста: повторы с backoff, реакция на 429/503 и капчу."""
+    async def _goto():
+        # Таймаут навигации не выходит за дедлайн конфига (parsers/deadline.py)
+        response = await page.goto(url, timeout=deadline.clip_ms(timeout))
+        if response is not None and response.status in THROTTLE_STATUSES:
+            raise HostThrottled(f"HTTP {response.status}")
+        if looks_like_captcha(page.url):
+            raise HostThrottled("Страница с капчей")
+        return response
+    return await call_with_retries(url, _goto)
 
 
 # --- ИЗМЕНЕНИЕ 2: Обновляем логику парсинга одного события ---
-async def parse_single_event(browser: Browser, event_url: str) -> Dict:
+async def parse_single_event(browser: Browser | BrowserContext | PlaywrightRecycler, event_url: str, config_id: int = -1,
+                             raise_errors: bool = False) -> Optional[RawEvent]:
     """
     Собирает ВСЕ сырые данные со страницы события, но НЕ вызывает AI.
+    Возвращает RawEvent или None, если страницу обработать не удалось
+    (с raise_errors=True ошибка пробрасывается - нужно очереди заданий для повтора).
     """
     page = None
     try:
         page = await browser.new_page()
-        await page.goto(event_url, timeout=60000)
+        with metrics.stage('detail_fetch'):
+            await polite_goto(page, event_url)
 
-        # 1. Извлекаем базовую информацию из JSON
-        try:
-            details_json = await page.evaluate('() => window.concertDetails')
-        except Exception:
-            raise ValueError("Не удалось найти window.concertDetails")
+            # 1. Извлекаем базовую информацию из JSON
+            try:
+                details_json = await page.evaluate('() => window.concertDetails')
+            except Exception:
+                raise ValueError("Не удалось найти window.concertDetails")
 
         if not details_json:
             raise ValueError("Объект window.concertDetails пуст.")
@@ -75,58 +83,140 @@ async def parse_single_event(browser: Browser, event_url: str) -> Dict:
         shop_url_button = page.locator('button[data-shopurl]').first
 
         if await shop_url_button.count() > 0:
-            shop_url = await shop_url_button.get_attribute('data-shopurl')
-            await page.goto(shop_url, timeout=60000)
+            with metrics.stage('ticket_fetch'):
+                shop_url = await shop_url_button.get_attribute('data-shopurl')
+                await polite_goto(page, shop_url)
             
-            ticket_cells_selector = '[data-cy="price-zone-free-places"], .cdk-column-freePlaces'
-            async def find_and_sum_tickets(search_context) -> Optional[int]:
-                try:
-                    await search_context.wait_for_selector(ticket_cells_selector, state='visible', timeout=15000)
-                    await search_context.wait_for_timeout(500)
-                    all_counts_text = await search_context.locator(ticket_cells_selector).all_inner_texts()
-                    if not all_counts_text: return 0
-                    return sum(int(match.group(0)) for text in all_counts_text if (match := re.search(r'\d+', text)))
-                except PlaywrightTimeoutError:
-                    return None
-            tickets_available = await find_and_sum_tickets(page)
-            if tickets_available is None:
-                for frame in page.frames[1:]:
-                    frame_tickets = await find_and_sum_tickets(frame)
-                    if frame_tickets is not None:
-                        tickets_available = frame_tickets
-                        break
-            if tickets_available is None: tickets_available = 0
+                ticket_cells_selector = '[data-cy="price-zone-free-places"], .cdk-column-freePlaces'
+                async def find_and_sum_tickets(search_context) -> Optional[int]:
+                    try:
+                        await search_context.wait_for_selector(ticket_cells_selector, state='visible',
+                                                               timeout=deadline.clip_ms(15000))
+                        await search_context.wait_for_timeout(500)
+                        all_counts_text = await search_context.locator(ticket_cells_selector).all_inner_texts()
+                        if not all_counts_text: return 0
+                        return sum(int(match.group(0)) for text in all_counts_text if (match := re.search(r'\d+', text)))
+                    except PlaywrightTimeoutError:
+                        return None
+                tickets_available = await find_and_sum_tickets(page)
+                if tickets_available is None:
+                    for frame in page.frames[1:]:
+                        if deadline.expired():
+                            break
+                        frame_tickets = await find_and_sum_tickets(frame)
+                        if frame_tickets is not None:
+                            tickets_available = frame_tickets
+                            break
+                if tickets_available is None: tickets_available = 0
         else:
             tickets_available = 0
         
+        if tickets_available > 0:
+            tickets_info = f"{tickets_available} билетов"
+        else:
+            tickets_info = "В наличии" if price_min else "Нет в наличии"
+
         # 4. Формируем итоговый объект с сырыми данными. БЕЗ ВЫЗОВА AI.
-        event = EventData(
-            link=shop_url if shop_url else event_url, 
-            title=title, 
-            place=place, 
-            time_str=time_str,
-            full_description=full_description, 
-            price_min=price_min, 
-            price_max=price_max, 
-            tickets_available=tickets_available
+        event = RawEvent(
+            link=shop_url if shop_url else event_url,
+            title=title,
+            place=place,
+            time_str=time_str,  # Это поле пойдет в Event.description в БД
+            full_description=full_description,
+            price_min=price_min,
+            price_max=price_max,
+            tickets_info=tickets_info,
+            config_id=config_id,
         )
         print(f"✅ Сырые данные собраны: {title}", file=sys.stderr)
-        return asdict(event)
+        return event
 
     except Exception as e:
         print(f"❌ Ошибка при сборе сырых данных для {event_url}: {e}", file=sys.stderr)
-        return asdict(EventData(link=event_url, title=f"Ошибка обработки", status="error"))
+        if raise_errors:
+            raise
+        return None
     finally:
         if page:
             await page.close()
 
 
+async def collect_event_links(browser: Browser | BrowserContext | PlaywrightRecycler, config: Dict) -> List[str]:
+    """
+    Обходит страницы списка категории и собирает ссылки на страницы событий.
+    Учитывает тестовые ограничения конфига (pages_to_parse_limit, max_events_to_process_limit).
+    """
+    base_url = config.get('url')
+    pages_to_parse_limit = config.get('pages_to_parse_limit', float('inf'))
+    max_events_limit = config.get('max_events_to_process_limit', float('inf'))
+    if pages_to_parse_limit != float('inf') or max_events_limit != float('inf'):
+        print(f"⚠️ [ТЕСТОВЫЙ РЕЖИМ] Применены ограничения: страниц={int(pages_to_parse_limit)}, событий={int(max_events_limit)}", file=sys.stderr)
+
+    event_links = set()
+    page_for_lists = await browser.new_page()
+
+    page_num = 1
+    while page_num <= pages_to_parse_limit:
+        if deadline.expired():
+            deadline.mark_partial(config_key(config), f"сбор ссылок остановлен на странице {page_num}")
+            break
+        url = f"{base_url}page:{page_num}/"
+        print(f"📄 Сканирую страницу: {url}", file=sys.stderr)
+        try:
+            with metrics.stage('list_scan'):
+                await polite_goto(page_for_lists, url, timeout=30000)
+            await page_for_lists.wait_for_selector('a.event_short', timeout=deadline.clip_ms(10000), state='attached')
+            locators = page_for_lists.locator('a.event_short')
+            new_links_count = 0
+            for i in range(await locators.count()):
+                if len(event_links) >= max_events_limit: break
+                link = await locators.nth(i).get_attribute('href')
+                if link and link not in event_links:
+                    event_links.add(link)
+                    new_links_count += 1
+            if new_links_count == 0:
+                print(f"   - Новые события на странице {page_num} не найдены. Завершаю сбор.", file=sys.stderr)
+                break
+            print(f"   - Найдено {new_links_count} новых ссылок. Всего собрано: {len(event_links)}", file=sys.stderr)
+            if len(event_links) >= max_events_limit:
+                print("   - Достигнут лимит событий. Завершаю сбор.", file=sys.stderr)
+                break
+            page_num += 1
+        except PlaywrightTimeoutError:
+            print(f"   - Карточки событий на странице {page_num} не найдены. Завершаю сбор.", file=sys.stderr)
+            break
+        except Exception as e:
+            print(f"   - Произошла непредвиденная ошибка: {e}. Завершаю сбор.", file=sys.stderr)
+            break
+
+    await page_for_lists.close()
+    return list(event_links)
+
+
+async def discover_event_links(browser: Browser | BrowserContext | PlaywrightRecycler,
+                               config: Dict) -> tuple[List[str], Dict[str, sitemap.SitemapEntry]]:
+    """
+    Ссылки на страницы событий: из sitemap, если он включен в конфиге и найден (parsers/sitemap.py),
+    иначе - листанием страниц категории. Второе значение - записи sitemap по ссылкам (с lastmod).
+    """
+    if sitemap.uses_sitemap(config):
+        entries = await asyncio.to_thread(sitemap.discover, config)
+        if entries is not None:
+            entries = sitemap.select_changed(config, entries)
+            max_events_limit = config.get('max_events_to_process_limit')
+            if max_events_limit:
+                entries = entries[:int(max_events_limit)]
+            return [entry.url for entry in entries], {entry.url: entry for entry in entries}
+        print("↩️ Sitemap не найден - листаю страницы категории.", file=sys.stderr)
+    return await collect_event_links(browser, config), {}
+
+
 # --- ИЗМЕНЕНИЕ 3: Главная функция parse_site ---
 # Нужно адаптировать ее под новый формат данных
-async def parse_site(config: Dict) -> List[Dict]:
+async def parse_site(config: Dict) -> List[RawEvent]:
     """
     Основная функция-парсер для сайта Kvitki.by с использованием Playwright.
-    Принимает конфиг, возвращает список словарей с данными о событиях.
+    Принимает конфиг, возвращает список RawEvent.
     """
     base_url = config.get('url')
     category_name = config.get('category_name', 'Unknown Category')
@@ -134,52 +224,16 @@ async def parse_site(config: Dict) -> List[Dict]:
         print(f"❌ [Playwright] В конфиге для '{category_name}' отсутствует ключ 'url'.", file=sys.stderr)
         return []
 
-    pages_to_parse_limit = config.get('pages_to_parse_limit', float('inf'))
-    max_events_limit = config.get('max_events_to_process_limit', float('inf'))
     concurrent_events = config.get('concurrent_events', CONCURRENT_EVENTS)
+    config_id = intern_config(config)
 
     print(f"\n[INFO] Запуск Playwright-парсера для категории: '{category_name}'", file=sys.stderr)
-    if pages_to_parse_limit != float('inf') or max_events_limit != float('inf'):
-        print(f"⚠️ [ТЕСТОВЫЙ РЕЖИМ] Применены ограничения: страниц={int(pages_to_parse_limit)}, событий={int(max_events_limit)}", file=sys.stderr)
-    
-    event_links = set()
     async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page_for_lists = await browser.new_page()
-
-        page_num = 1
-        while page_num <= pages_to_parse_limit:
-            url = f"{base_url}page:{page_num}/"
-            print(f"📄 Сканирую страницу: {url}", file=sys.stderr)
-            try:
-                await page_for_lists.goto(url, timeout=30000)
-                await page_for_lists.wait_for_selector('a.event_short', timeout=10000, state='attached')
-                locators = page_for_lists.locator('a.event_short')
-                new_links_count = 0
-                for i in range(await locators.count()):
-                    if len(event_links) >= max_events_limit: break
-                    link = await locators.nth(i).get_attribute('href')
-                    if link and link not in event_links:
-                        event_links.add(link)
-                        new_links_count += 1
-                if new_links_count == 0:
-                    print(f"   - Новые события на странице {page_num} не найдены. Завершаю сбор.", file=sys.stderr)
-                    break
-                print(f"   - Найдено {new_links_count} новых ссылок. Всего собрано: {len(event_links)}", file=sys.stderr)
-                if len(event_links) >= max_events_limit:
-                    print("   - Достигнут лимит событий. Завершаю сбор.", file=sys.stderr)
-                    break
-                page_num += 1
-            except PlaywrightTimeoutError:
-                print(f"   - Карточки событий на странице {page_num} не найдены. Завершаю сбор.", file=sys.stderr)
-                break
-            except Exception as e:
-                print(f"   - Произошла непредвиденная ошибка: {e}. Завершаю сбор.", file=sys.stderr)
-                break
-        
-        await page_for_lists.close()
-        
-        event_links_list = list(event_links)
+        # Браузер под присмотром сторожа памяти: перезапускается по RSS или числу открытых вкладок.
+        # Все вкладки - в одном контексте, чтобы к ним подключалась запись/воспроизведение фикстур.
+        browser = await PlaywrightRecycler(p, BrowserWatchdog.for_config(config),
+                                           setup_context=fixtures.attach_playwright).start()
+        event_links_list, sitemap_entries = await discover_event_links(browser, config)
         print(f"\n🔗 Всего собрано {len(event_links_list)} уникальных ссылок для обработки.", file=sys.stderr)
         
         if not event_links_list:
@@ -188,9 +242,21 @@ async def parse_site(config: Dict) -> List[Dict]:
 
         semaphore = asyncio.Semaphore(concurrent_events)
         tasks = []
+        skipped_by_deadline = 0
         async def run_with_semaphore(link):
+            nonlocal skipped_by_deadline
             async with semaphore:
-                return await parse_single_event(browser, link)
+                if deadline.expired():
+                    # Бюджет конфига исчерпан - оставшиеся ссылки не открываем, вернем то, что успели
+                    skipped_by_deadline += 1
+                    return None
+                generation = browser.generation
+                result = await parse_single_event(browser, link, config_id)
+                if result is None and browser.generation != generation:
+                    # Вкладку оборвал аварийный перезапуск браузера - повторяем ссылку на новом браузере
+                    print(f"🔁 Повтор после перезапуска браузера: {link}", file=sys.stderr)
+                    result = await parse_single_event(browser, link, config_id)
+                return result
 
         for link in event_links_list:
             tasks.append(asyncio.create_task(run_with_semaphore(link)))
@@ -198,23 +264,15 @@ async def parse_site(config: Dict) -> List[Dict]:
         results = await asyncio.gather(*tasks)
         await browser.close()
 
-    # Адаптируем результат под формат, который ожидает run_parsers.py
-    final_results = []
-    for res in results:
-        if res.get('status') == 'ok':
-            # Переименовываем 'time_str' в 'time' для совместимости с run_parsers.py
-            # Это поле пойдет в Event.description
-            res['time'] = res.pop('time_str', None)
-            
-            tickets_count = res.pop('tickets_available', 0)
-            if tickets_count is not None and tickets_count > 0:
-                res['tickets_info'] = f"{tickets_count} билетов"
-            else:
-                res['tickets_info'] = "В наличии" if res.get('price_min') else "Нет в наличии"
-            
-            res.pop('status', None)
-            final_results.append(res)
-            
+    if skipped_by_deadline:
+        deadline.mark_partial(config_key(config), f"не обработано ссылок: {skipped_by_deadline} из {len(event_links_list)}")
+    if sitemap_entries:
+        # lastmod запоминается только для разобранных страниц; на диск - после записи в БД (run_parser)
+        sitemap.mark_processed([sitemap_entries[link] for link, res in zip(event_links_list, results) if res is not None])
+
+    # Отбрасываем события, которые не удалось обработать
+    final_results = [res for res in results if res is not None]
+
     print(f"🎉 Сбор сырых данных для '{category_name}' завершен. Собрано: {len(final_results)} событий.", file=sys.stderr)
     return final_results
 
@@ -235,8 +293,10 @@ if __name__ == '__main__':
 
     async def run_test():
         results = await parse_site(test_config)
+        # PARSER_FIXTURE_MODE=record/replay - запись или офлайн-воспроизведение ответов (parsers/fixtures.py)
+        fixtures.save()
         print("\n--- ИТОГОВЫЙ РЕЗУЛЬТАТ ТЕСТА (СЫРЫЕ ДАННЫЕ) ---")
-        print(json.dumps(results, indent=2, ensure_ascii=False))
+        print(json.dumps([event.to_dict() for event in results], indent=2, ensure_ascii=False))
         print(f"\nВсего получено: {len(results)} событий.")
 
     try:
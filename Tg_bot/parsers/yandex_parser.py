@@ -11,18 +11,52 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 from webdriver_manager.chrome import ChromeDriverManager
-from bs4 import BeautifulSoup
+
+from parsers import deadline, fixtures, metrics
+from parsers.rate_limiter import HostThrottled, call_with_retries_sync, looks_like_captcha
+from parsers.parse_pool import parse_html_sync
+from parsers.fast_extract import get_card_extractor
+from parsers.raw_event import RawEvent, intern_config
+from parsers.browser_watchdog import BrowserWatchdog
 
 # Используем тот же логгер, что и в основном приложении
 logger = logging.getLogger()
 
 
-def _parse_sync(config: dict) -> list[dict]:
+def extract_cards(html: bytes, selectors: dict, config_id: int = -1) -> list[RawEvent]:
+    """
+    Разбирает HTML одной страницы списка Яндекс.Афиши в список RawEvent.
+    Выполняется в процессе-разборщике (parsers/parse_pool.py), поэтому не трогает ни драйвер, ни логгер.
+    """
+    events = []
+    for fields in get_card_extractor(selectors).extract(html):
+        link = "https://afisha.yandex.ru" + fields['link'] if fields['link'] else "Ссылка не найдена"
+
+        price_min = None
+        if fields['price']:
+            price_match = re.search(r'\d+', fields['price'].replace(' ', ''))
+            if price_match:
+                price_min = float(price_match.group(0))
+
+        # Цены "до", билетов и описания в Яндексе нет - AI будет работать с пустым описанием, ничего страшного
+        events.append(RawEvent(
+            title=fields['title'] or "Название не найдено",
+            place=fields['place'] or "Место не указано",
+            time_str=fields['date'] or "Дата не указана",      # Строковое представление даты
+            link=link,
+            price_min=price_min,
+            config_id=config_id,
+        ))
+    return events
+
+
+def _parse_sync(config: dict) -> list[RawEvent]:
     """
     Синхронная функция, которая выполняет всю грязную работу с Selenium.
     Она будет запущена в отдельном потоке.
     """
     site_name = config['site_name']
+    config_id = intern_config(config)
     today_str = datetime.now().strftime("%Y-%m-%d")
     base_url = f"{config['url']}?date={today_str}&period={config['period']}"
 
@@ -41,16 +75,54 @@ def _parse_sync(config: dict) -> list[dict]:
     logger.info(f"Начинаю парсинг Selenium: {site_name}")
 
     driver = None  # Инициализируем заранее для блока finally
+    watchdog = BrowserWatchdog.for_config(config)
     try:
         driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+        watchdog.root_pid = driver.service.process.pid
         
         for page_num in range(1, 11): # Просматриваем до 10 страниц
+            if deadline.expired():
+                deadline.mark_partial(site_name, f"остановлено на странице {page_num}/10")
+                break
+
+            # Сторож памяти: Chrome разрастается от страницы к странице - перезапускаем драйвер между страницами
+            reason = watchdog.soft_reason()
+            if reason:
+                watchdog.recycled(reason)
+                driver.quit()
+                driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=options)
+                watchdog.root_pid = driver.service.process.pid
+
             current_url = f"{base_url}&page={page_num}"
             logger.info(f"  - Обрабатываю страницу {page_num}/10: {current_url}")
-            driver.get(current_url)
+
+            def _open_page():
+                # Загрузка страницы не дольше остатка бюджета конфига (300 с - умолчание Selenium)
+                driver.set_page_load_timeout(deadline.clip(300))
+                driver.get(fixtures.browser_url(current_url))
+                # Яндекс отвечает капчей вместо 429 - считаем это сигналом притормозить
+                if looks_like_captcha(driver.current_url):
+                    raise HostThrottled("Яндекс показал капчу")
 
             try:
-                WebDriverWait(driver, 10).until(
+                # Поток executor'а не видит contextvar текущего конфига - передаем его явно
+                with metrics.stage('list_scan', site_name):
+                    call_with_retries_sync(current_url, _open_page)
+            except HostThrottled:
+                logger.warning(f"  - Яндекс продолжает показывать капчу на странице {page_num}. Завершаю парсинг для '{site_name}'.")
+                break
+            except deadline.DeadlineExceeded as e:
+                deadline.mark_partial(site_name, f"страница {page_num}: {e}")
+                break
+            except TimeoutException:
+                if not deadline.expired():
+                    raise
+                deadline.mark_partial(site_name, f"страница {page_num} не загрузилась до дедлайна")
+                break
+
+            try:
+                # Записанная страница уже отрисована - при воспроизведении долго ждать нечего
+                WebDriverWait(driver, 1 if fixtures.is_replaying() else deadline.clip(10)).until(
                     EC.presence_of_element_located((By.XPATH, "//*[@data-test-id='eventCard.root']"))
                 )
             except TimeoutException:
@@ -58,56 +130,22 @@ def _parse_sync(config: dict) -> list[dict]:
                 break
             
             # ИСПРАВЛЕНИЕ: Используем time.sleep() внутри синхронной функции
-            time.sleep(2)
+            if not fixtures.is_replaying():
+                time.sleep(deadline.clip(2))
 
-            html = driver.page_source
-            soup = BeautifulSoup(html, 'lxml')
-            event_cards = soup.find_all("div", attrs={"data-test-id": "eventCard.root"})
+            # Разбор HTML - в пуле процессов, чтобы не держать GIL в потоке Selenium
+            html = driver.page_source.encode('utf-8')
+            if fixtures.is_recording():
+                fixtures.record_page(current_url, html)
+            events_on_page = parse_html_sync(extract_cards, html, config['selectors'], config_id)
 
-            if not event_cards:
-                logger.info(f"  - BeautifulSoup не нашел карточек на странице {page_num}, хотя они должны были быть. Завершаю.")
+            if not events_on_page:
+                logger.info(f"  - Разбор HTML не нашел карточек на странице {page_num}, хотя они должны были быть. Завершаю.")
                 break
 
-            for card in event_cards:
-                title_element = card.find("h2", attrs={"data-test-id": "eventCard.eventInfoTitle"})
-                title = title_element.get_text(strip=True) if title_element else "Название не найдено"
-
-                link_element = card.find("a", attrs={"data-test-id": "eventCard.link"})
-                link = "https://afisha.yandex.ru" + link_element['href'] if link_element else "Ссылка не найдена"
-
-                details_list = card.find("ul", attrs={"data-test-id": "eventCard.eventInfoDetails"})
-                place = "Место не указано"
-                date_str = "Дата не указана"
-
-                if details_list:
-                    details_items = details_list.find_all("li")
-                    if len(details_items) > 0:
-                        date_str = details_items[0].get_text(strip=True)
-                    if len(details_items) > 1:
-                        place_link = details_items[1].find('a')
-                        place = place_link.get_text(strip=True) if place_link else details_items[1].get_text(strip=True)
-
-                price_min = None
-                price_element = card.find("span", string=re.compile(r'от \d+'))
-                if price_element:
-                    price_str = price_element.get_text(strip=True)
-                    price_match = re.search(r'\d+', price_str.replace(' ', ''))
-                    if price_match:
-                        price_min = float(price_match.group(0))
-
-                # Формируем словарь, соответствующий другим парсерам
-                event_data = {
-                    'title': title,
-                    'place': place,
-                    'time': date_str,      # Строковое представление даты
-                    'link': link,
-                    'price_min': price_min,
-                    # Добавляем заглушки для полей, которых нет в Яндексе
-                    'price_max': None,
-                    'tickets_info': None,
-                    'full_description': None, # AI будет работать с пустым описанием, ничего страшного
-                }
-                all_events_data.append(event_data)
+            all_events_data.extend(events_on_page)
+            watchdog.page_opened()
+            watchdog.sample()
     
     except WebDriverException as e:
          logger.error(f"Ошибка Selenium при парсинге {site_name}: {e}", exc_info=True)
@@ -116,23 +154,19 @@ def _parse_sync(config: dict) -> list[dict]:
     finally:
         if driver:
             driver.quit() # Гарантированно закрываем браузер
-            logger.info(f"Драйвер для {site_name} успешно закрыт.")
+            logger.info(f"Драйвер для {site_name} успешно закрыт. Пик памяти браузера: {watchdog.high_water_mb:.0f} МБ, "
+                        f"перезапусков: {watchdog.recycles}")
 
     logger.info(f"Сайт {site_name} спарсен. Найдено событий: {len(all_events_data)}")
     return all_events_data
 
 
-async def parse(config: dict) -> list[dict]:
+async def parse(config: dict) -> list[RawEvent]:
     """
     Асинхронная обертка для запуска синхронного парсера в отдельном потоке.
     """
     logger.info(f"Запускаю парсер Yandex для '{config['site_name']}' в фоновом потоке...")
-    loop = asyncio.get_running_loop()
-    
-    # Запускаем _parse_sync в executor'е пула потоков по умолчанию
-    result = await loop.run_in_executor(
-        None, 
-        _parse_sync, 
-        config
-    )
-    return result
\ No newline at end of file
+
+    # Запускаем _parse_sync в пуле потоков по умолчанию. to_thread, в отличие от run_in_executor,
+    # копирует contextvars - поток видит дедлайн конфига (parsers/deadline.py)
+    return await asyncio.to_thread(_parse_sync, config)
\ No newline at end of file
@@ -0,0 +1,308 @@
+# Файл: run_crawl_worker.py
+#
+# Распределенный обход сайтов через очередь заданий в Postgres (таблица crawl_jobs).
+# Задание - одна страница конфига (категория) или одна страница события.
+# Воркеров можно запускать сколько угодно, на одной или нескольких машинах:
+# каждый забирает задания через FOR UPDATE SKIP LOCKED, продлевает их heartbeat,
+# а задания упавшего воркера возвращаются в очередь и выполняются другим.
+#
+# Запуск из папки Tg_bot:
+#   python run_crawl_worker.py enqueue                  # поставить в очередь все конфиги (новый прогон)
+#   python run_crawl_worker.py work --concurrency 5     # воркер (запускать в нужном количестве экземпляров)
+#   python run_crawl_worker.py status --run-id <id>     # прогресс прогона
+#   python run_crawl_worker.py requeue                  # вручную вернуть зависшие задания
+
+import argparse
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime
+
+from playwright.async_api import async_playwright
+
+from app.database.models import async_session
+from app.database.requests.requests_crawl_jobs import (
+    ClaimedJob,
+    enqueue_jobs,
+    claim_jobs,
+    heartbeat_jobs,
+    complete_job,
+    fail_job,
+    release_jobs,
+    requeue_stalled_jobs,
+    get_run_progress,
+)
+from parsers import deadline, fixtures, metrics
+from parsers.browser_watchdog import BrowserWatchdog, PlaywrightRecycler, log_high_water
+from parsers.configs import ALL_CONFIGS
+from parsers.raw_event import config_key, intern_config
+from parsers.test_parser import discover_event_links, parse_single_event
+from parsers import registry
+from run_parser import populate_artists_if_needed, sync_raw_events
+from app.database.requests.requests import refresh_afisha_series
+
+# Как часто воркер продлевает аренду своих заданий (должно быть заметно меньше STALL_TIMEOUT)
+HEARTBEAT_INTERVAL = 30
+# Как часто воркер ищет зависшие задания других воркеров
+REQUEUE_INTERVAL = 60
+# Пауза, если очередь пуста
+POLL_INTERVAL = 5
+# Как часто воркер пишет отчет метрик (parsers/metrics.py) и начинает новый период, секунды
+METRICS_REPORT_INTERVAL = int(os.getenv('PARSER_METRICS_INTERVAL', 3600))
+
+# Конфиги, у которых обход разбит на задания по страницам событий (fan-out)
+FAN_OUT_METHODS = {'playwright_kvitki'}
+
+
+class CrawlWorker:
+    def __init__(self, worker_id: str, concurrency: int, exit_when_idle: bool = False):
+        self.worker_id = worker_id
+        self.concurrency = concurrency
+        self.exit_when_idle = exit_when_idle
+        self.configs = {config_key(config): config for config in ALL_CONFIGS}
+        self.in_flight: set[int] = set()
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        # События записаны, а представление афиши еще не пересчитано
+        self.afisha_stale = False
+        self._playwright = None
+        # config_key -> браузер конфига
+        self._browsers: dict[str, PlaywrightRecycler] = {}
+        self._browser_lock = asyncio.Lock()
+
+    async def get_browser(self, config: dict) -> PlaywrightRecycler:
+        """
+        Браузер конфига, запускается при первом задании Playwright этого конфига.
+        Сторож памяти у каждого конфига свой (пороги и пик памяти - по конфигу, как в run_parser):
+        перезапускает браузер по RSS/числу вкладок, а упавший браузер запускает заново при следующей
+        вкладке. Оборванные аварийным перезапуском задания падают и возвращаются в очередь через fail_job.
+        """
+        key = config_key(config)
+        async with self._browser_lock:
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            if key not in self._browsers:
+                self._browsers[key] = await PlaywrightRecycler(
+                    self._playwright, BrowserWatchdog.for_config(config), setup_context=fixtures.attach_playwright
+                ).start()
+            return self._browsers[key]
+
+    async def close_browsers(self):
+        """Закрывает браузеры всех конфигов (очередь опустела - память не держим до следующего прогона)."""
+        async with self._browser_lock:
+            browsers, self._browsers = list(self._browsers.values()), {}
+        for browser in browsers:
+            await browser.close()
+
+    async def close(self):
+        await self.close_browsers()
+        if self._playwright is not None:
+            await self._playwright.stop()
+
+    # --- Выполнение заданий ---
+    async def run_job(self, job: ClaimedJob) -> int:
+        """Выполняет задание, возвращает число найденных событий (или ссылок для fan-out)."""
+        config = self.configs.get(job.config_key)
+        if config is None:
+            raise ValueError(f"Конфиг '{job.config_key}' не найден среди ALL_CONFIGS")
+
+        # Бюджет времени задания - как у конфига в run_parser (parsers/deadline.py)
+        with deadline.budget(deadline.config_budget(config), job.config_key):
+            return await self._run_job(job, config)
+
+    async def _run_job(self, job: ClaimedJob, config: dict) -> int:
+        if job.kind == 'event_url':
+            browser = await self.get_browser(config)
+            event = await parse_single_event(browser, job.url, intern_config(config), raise_errors=True)
+            if event is None:
+                return 0
+            await sync_raw_events([event], sync_artists=False)
+            self.afisha_stale = True
+            return 1
+
+        parsing_method = config.get('parsing_method')
+        if parsing_method in FAN_OUT_METHODS:
+            # Страница категории: собираем ссылки (из sitemap или листанием) и ставим по заданию на каждое событие
+            links, _ = await discover_event_links(await self.get_browser(config), config)
+            added = await enqueue_jobs(job.run_id, 'event_url', job.config_key, links)
+            logging.info(f"[{job.config_key}] найдено ссылок: {len(links)}, новых заданий: {added}")
+            return len(links)
+
+        parser_func = registry.get_parser(parsing_method)
+        if parser_func is None:
+            raise ValueError(f"Неизвестный метод парсинга: {parsing_method}")
+        raw_events = await parser_func(config)
+        await sync_raw_events(raw_events, sync_artists=False)
+        self.afisha_stale = True
+        return len(raw_events)
+
+    async def refresh_afisha_if_stale(self):
+        """Пересчитывает представление афиши, если с прошлого пересчета воркер записывал события."""
+        if not self.afisha_stale:
+            return
+        self.afisha_stale = False
+        try:
+            await refresh_afisha_series()
+            logging.info("Представление афиши (afisha_event_series) обновлено.")
+        except Exception as e:
+            self.afisha_stale = True
+            logging.error(f"Не удалось обновить представление афиши: {e}")
+
+    async def process(self, job: ClaimedJob):
+        self.in_flight.add(job.job_id)
+        # Каждый слот - отдельная задача asyncio, поэтому contextvar конфига у слотов свой
+        metrics.current_config.set(job.config_key)
+        try:
+            found = await self.run_job(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.jobs_failed += 1
+            metrics.increment('jobs_failed')
+            # Сбой БД при отметке не должен ронять слот (а через gather - весь воркер):
+            # неотмеченное задание вернет в очередь requeue_stalled_jobs по просроченному heartbeat
+            try:
+                status = await fail_job(job.job_id, self.worker_id, f"{type(e).__name__}: {e}")
+            except Exception as mark_error:
+                status = f"не отмечено: {mark_error}"
+            logging.error(f"❌ Задание {job.job_id} ({job.kind} {job.url}), попытка {job.attempts}: {e} -> {status}")
+        else:
+            self.jobs_done += 1
+            metrics.increment('jobs_done')
+            try:
+                if not await complete_job(job.job_id, self.worker_id, found):
+                    logging.warning(f"Задание {job.job_id} было возвращено в очередь до завершения (просрочен heartbeat)")
+            except Exception as e:
+                logging.error(f"Не удалось отметить задание {job.job_id} выполненным: {e}")
+        finally:
+            self.in_flight.discard(job.job_id)
+
+    # --- Циклы воркера ---
+    async def slot_loop(self):
+        idle_rounds = 0
+        while True:
+            try:
+                jobs = await claim_jobs(self.worker_id, limit=1)
+            except Exception as e:
+                logging.error(f"Не удалось взять задание из очереди: {e}")
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            if not jobs:
+                # Очередь опустела (прогон закончился) - обновляем афишу один раз
+                if not self.in_flight:
+                    await self.refresh_afisha_if_stale()
+                # Пока обновлялась афиша, другой слот мог взять задание - его браузер не трогаем
+                if not self.in_flight:
+                    await self.close_browsers()
+                if self.exit_when_idle and not self.in_flight:
+                    idle_rounds += 1
+                    if idle_rounds >= 3:
+                        return
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+            idle_rounds = 0
+            await self.process(jobs[0])
+
+    async def heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            try:
+                alive = await heartbeat_jobs(self.worker_id, list(self.in_flight))
+                if alive < len(self.in_flight):
+                    logging.warning(f"Heartbeat: за воркером осталось {alive} из {len(self.in_flight)} заданий")
+            except Exception as e:
+                logging.error(f"Не удалось продлить heartbeat: {e}")
+
+    async def requeue_loop(self):
+        while True:
+            try:
+                requeued, failed = await requeue_stalled_jobs()
+                if requeued or failed:
+                    logging.warning(f"Зависшие задания: возвращено в очередь {requeued}, исчерпали попытки {failed}")
+            except Exception as e:
+                logging.error(f"Ошибка при поиске зависших заданий: {e}")
+            await asyncio.sleep(REQUEUE_INTERVAL)
+
+    def start_metrics_period(self):
+        worker = self.worker_id.replace(':', '-')
+        metrics.start_run(f"worker-{worker}-{datetime.now().strftime('%Y%m%d-%H%M%S')}")
+
+    async def metrics_loop(self):
+        """Отчет метрик за период: воркер работает сутками, отчет только при остановке был бы слишком редким."""
+        while True:
+            await asyncio.sleep(METRICS_REPORT_INTERVAL)
+            metrics.finish_run()
+            self.start_metrics_period()
+
+    async def run(self):
+        logging.info(f"Воркер {self.worker_id} запущен, параллельных заданий: {self.concurrency}")
+        self.start_metrics_period()
+        async with async_session() as session:
+            await populate_artists_if_needed(session)
+            await session.commit()
+
+        background = [asyncio.create_task(self.heartbeat_loop()), asyncio.create_task(self.requeue_loop()),
+                      asyncio.create_task(self.metrics_loop())]
+        try:
+            await asyncio.gather(*(self.slot_loop() for _ in range(self.concurrency)))
+        finally:
+            for task in background:
+                task.cancel()
+            # Штатная остановка (Ctrl+C / SIGTERM): незавершенные задания сразу отдаем другим воркерам
+            if self.in_flight:
+                logging.info(f"Возвращаю в очередь незавершенные задания: {sorted(self.in_flight)}")
+                await release_jobs(self.worker_id, list(self.in_flight))
+            await self.close()
+            log_high_water()
+            metrics.finish_run()
+            logging.info(f"Воркер {self.worker_id} остановлен. Выполнено: {self.jobs_done}, с ошибкой: {self.jobs_failed}")
+
+
+async def enqueue_run(run_id: str) -> int:
+    added = 0
+    for config in ALL_CONFIGS:
+        if not registry.is_registered(config.get('parsing_method')):
+            logging.warning(f"Пропускаю конфиг с неизвестным методом: {config.get('parsing_method')}")
+            continue
+        added += await enqueue_jobs(run_id, 'config', config_key(config), [config['url']])
+    return added
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description="Воркер очереди заданий парсера")
+    subparsers = arg_parser.add_subparsers(dest='command', required=True)
+
+    enqueue_cmd = subparsers.add_parser('enqueue', help='Поставить в очередь все конфиги')
+    enqueue_cmd.add_argument('--run-id', default=datetime.now().strftime('%Y%m%d-%H%M%S'))
+
+    work_cmd = subparsers.add_parser('work', help='Запустить воркер')
+    work_cmd.add_argument('--concurrency', type=int, default=5, help='Заданий одновременно в этом процессе')
+    work_cmd.add_argument('--worker-id', default=f"{socket.gethostname()}:{os.getpid()}")
+    work_cmd.add_argument('--exit-when-idle', action='store_true', help='Завершиться, когда очередь опустеет')
+
+    status_cmd = subparsers.add_parser('status', help='Прогресс прогона')
+    status_cmd.add_argument('--run-id', required=True)
+
+    subparsers.add_parser('requeue', help='Вернуть в очередь зависшие задания')
+
+    args = arg_parser.parse_args()
+
+    if args.command == 'enqueue':
+        added = await enqueue_run(args.run_id)
+        print(f"Прогон {args.run_id}: поставлено заданий: {added}")
+    elif args.command == 'work':
+        await CrawlWorker(args.worker_id, args.concurrency, args.exit_when_idle).run()
+    elif args.command == 'status':
+        progress = await get_run_progress(args.run_id)
+        print(f"Прогон {args.run_id}: " + ", ".join(f"{status}={count}" for status, count in sorted(progress.items())))
+    elif args.command == 'requeue':
+        requeued, failed = await requeue_stalled_jobs()
+        print(f"Возвращено в очередь: {requeued}, исчерпали попытки: {failed}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nВоркер остановлен пользователем.")
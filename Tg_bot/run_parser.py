@@ -1,6 +1,8 @@
+import argparse
 import asyncio
 import logging
 import re
+import time
 from datetime import datetime, timedelta
 
 from sqlalchemy import func, select
@@ -9,21 +11,23 @@ from sqlalchemy import func, select
 from app.database.models import async_session
 from parsers.configs import ALL_CONFIGS
 
-# Импортируем наш новый парсер и даем ему понятное имя
-from parsers.test_parser import parse_site as parse_kvitki_playwright
-# Импортируем AI функцию
-from parsers.test_ai import getArtist
+# Парсеры (и Playwright/Selenium вместе с ними) загружаются лениво по parsing_method
+from parsers import registry
 # Импортируем НОВЫЕ функции для работы с БД
 from app.database.requests.requests import (
     find_event_by_signature,
+    lock_event_signature,
     update_event_details,
-    create_event_with_artists
+    create_event_with_artists,
+    upsert_event_links,
+    refresh_afisha_series,
 )
-# Импортируем старые парсеры, если они нужны
-from parsers.kvitki_parser import parse_site as parse_kvitki
-from parsers.bezkassira_parser import parse as parse_bezkassira
-from parsers.liveball_parser import parse as parse_liveball
-from parsers.yandex_parser import parse as parse_yandex
+from app.database.requests.requests_venues import VenueResolver
+from parsers.rate_limiter import log_stats as log_rate_stats, report_stats_periodically
+from parsers.parse_pool import log_stats as log_parse_pool_stats, shutdown_pool as shutdown_parse_pool
+from parsers.raw_event import RawEvent, measure_memory, config_key
+from parsers import deadline, fixtures, metrics, sitemap, snapshot
+from parsers.browser_watchdog import log_high_water as log_browser_high_water
 
 from app.database.models import Artist  
 
@@ -209,80 +213,193 @@ def extract_city_from_place(place_string: str) -> str:
     # 3. Город по умолчанию, если ничего не помогло
     return "Минск"
 
+# Сколько ждать ответа AI по одному событию
+AI_TIMEOUT = 60
+
+
 # --- 4. ОСНОВНАЯ ЛОГИКА ОРКЕСТРАТОРА (ПОЛНОСТЬЮ ПЕРЕПИСАНА) ---
-async def process_all_sites():
-    # Этап 1: Сбор "сырых" данных со всех сайтов
+async def process_all_sites(dump_snapshot: str | None = None, from_snapshot: str | None = None,
+                            extract_artists: bool = True, commit: bool = True,
+                            run_budget: float = deadline.RUN_BUDGET):
+    """
+    dump_snapshot - сохранить сырые события этапа 1 в снимок (parsers/snapshot.py);
+    from_snapshot - не обходить сайты, а взять сырые события из снимка и сразу перейти к этапу 2.
+    extract_artists и commit передаются в sync_raw_events (для замеров на одних и тех же данных).
+    run_budget - бюджет времени прогона в секундах (parsers/deadline.py), 0 - без ограничения.
+    """
+    # Поэтапные замеры времени; отчет пишется в reports/ в конце прогона (parsers/metrics.py)
+    metrics.start_run()
+    try:
+        with deadline.budget(run_budget, 'прогон'):
+            await _process_all_sites(dump_snapshot, from_snapshot, extract_artists, commit)
+    finally:
+        metrics.finish_run()
+
+
+async def collect_raw_events() -> list[RawEvent]:
+    """Этап 1: сбор "сырых" данных со всех сайтов."""
     all_raw_events = []
-    parser_mapping = {
-        'playwright_kvitki': parse_kvitki_playwright,
-        'selenium_yandex': parse_yandex,
-    }
+
+    # Живая статистика пропускной способности по хостам (пишется в лог раз в 30 сек)
+    rate_reporter = asyncio.create_task(report_stats_periodically())
 
     for site_config in ALL_CONFIGS:
         parsing_method = site_config.get('parsing_method')
-        parser_func = parser_mapping.get(parsing_method)
+        parser_func = registry.get_parser(parsing_method)
         
         if not parser_func:
             logging.warning(f"Пропускаю конфиг с неизвестным методом: {parsing_method}")
             continue
+
+        site_name = config_key(site_config)
+        if deadline.expired():
+            # Бюджет прогона исчерпан: оставшиеся конфиги не запускаем, чтобы прогоны не наложились
+            deadline.mark_partial(site_name, "не запускался: исчерпан бюджет прогона")
+            continue
             
         logging.info(f"\n--- Запуск парсера '{parsing_method}' для категории '{site_config.get('site_name')}' ---")
-        events_from_site = await parser_func(site_config)
-        
-        # ОБОГАЩАЕМ КАЖДОЕ СОБЫТИЕ ДАННЫМИ ИЗ КОНФИГА
-        for event in events_from_site:
-            event['event_type'] = site_config.get('event_type', 'Другое')
-            event['config'] = site_config # <-- Просто передаем весь конфиг дальше!
+        # Каждый RawEvent уже несет config_id - конфиг и тип события берутся из реестра конфигов
+        metrics.current_config.set(site_name)
+        # Дедлайн конфига (не позже дедлайна прогона) виден парсеру через contextvar
+        with metrics.stage('config_total') as st, deadline.budget(deadline.config_budget(site_config), site_name):
+            events_from_site = await deadline.guard(parser_func(site_config), site_name) or []
+            st.items = len(events_from_site)
+        log_rate_stats()
 
         all_raw_events.extend(events_from_site)
 
+    rate_reporter.cancel()
+    metrics.current_config.set('-')
+    metrics.increment('raw_events', len(all_raw_events))
+    log_browser_high_water()
+    # В режиме PARSER_FIXTURE_MODE=record сохраняем записанные ответы сайтов
+    fixtures.save()
+    # Разбор HTML закончен - освобождаем процессы-разборщики до этапа работы с БД
+    log_parse_pool_stats()
+    shutdown_parse_pool()
+    return all_raw_events
+
+
+async def _process_all_sites(dump_snapshot: str | None, from_snapshot: str | None,
+                             extract_artists: bool, commit: bool):
+    if from_snapshot:
+        all_raw_events = snapshot.load(from_snapshot)
+    else:
+        all_raw_events = await collect_raw_events()
+        if dump_snapshot:
+            snapshot.dump(all_raw_events, dump_snapshot)
+
     if not all_raw_events:
         logging.info("События не найдены ни на одном из сайтов. Завершаю работу.")
         return
 
+    memory = measure_memory(all_raw_events)
+    logging.info(
+        f"Память сырых событий: {memory['events']} шт., {memory['total_bytes'] / 1024:.0f} КБ "
+        f"(~{memory['bytes_per_event']} байт/событие с данными; объект RawEvent {memory['container_bytes_per_event']} байт "
+        f"против {memory['dict_container_bytes_per_event']} байт у прежнего словаря)"
+    )
+
     # Этап 2: Обработка сырых данных и синхронизация с БД
-    logging.info(f"\n--- Всего собрано {len(all_raw_events)} сырых событий. Начинаю обработку и сверку с БД... ---")
+    events_created_count, events_updated_count = await sync_raw_events(
+        all_raw_events, extract_artists=extract_artists, commit=commit)
+
+    metrics.increment('events_created', events_created_count)
+    metrics.increment('events_updated', events_updated_count)
+
+    if commit:
+        # Афиша читает заранее сгруппированные события - пересчитываем после записи
+        with metrics.stage('db_write', 'afisha_series'):
+            await refresh_afisha_series()
+        logging.info("Представление афиши (afisha_event_series) обновлено.")
+
+    print("\n--- Обработка завершена ---")
+    print(f"Новых событий создано: {events_created_count}")
+    print(f"Существующих событий обновлено: {events_updated_count}")
+
+
+async def sync_raw_events(raw_events: list[RawEvent], sync_artists: bool = True,
+                          extract_artists: bool = True, commit: bool = True) -> tuple[int, int]:
+    """
+    Этап 2: сверяет сырые события с БД - обновляет найденные и создает новые.
+    sync_artists=False пропускает сверку artists.txt (воркер очереди делает ее один раз при старте).
+    extract_artists=False создает события без вызова AI, commit=False откатывает транзакцию в конце -
+    так один и тот же снимок можно прогонять на одной и той же БД много раз.
+    Возвращает (создано, обновлено).
+    """
+    logging.info(f"\n--- Всего собрано {len(raw_events)} сырых событий. Начинаю обработку и сверку с БД... ---")
     
     events_created_count = 0
     events_updated_count = 0
+    started = time.perf_counter()
+    # Кэш мест проведения на время прогона (живет столько же, сколько транзакция ниже)
+    venue_resolver = VenueResolver()
+    # Ссылки событий копятся здесь и пишутся одним запросом перед commit
+    link_batch: list[tuple[int, str, str]] = []
     
     async with async_session() as session:
-        await populate_artists_if_needed(session)
-        for event_data in all_raw_events:
-            title = event_data.get('title')
-            current_config = event_data.get('config') # <-- Извлекаем прикрепленный конфиг
+        if sync_artists:
+            await populate_artists_if_needed(session)
+        # Блокировки сигнатур (lock_event_signature) берутся в одном порядке во всех транзакциях -
+        # два прогона с пересекающимися событиями не ждут друг друга по кругу
+        for event_data in sorted(raw_events, key=lambda raw: (raw.title or '', raw.time_str or '')):
+            title = event_data.title
+            current_config = event_data.config # <-- Конфиг из реестра по config_id
 
             if not title or "Ошибка обработки" in title or not current_config:
                 continue
+            site_name = config_key(current_config)
             
-            time_str = event_data.get('time')
+            time_str = event_data.time_str
             timestamp = parse_datetime_from_str(time_str)
+            if timestamp is None and event_data.timestamp:
+                # Некоторые парсеры отдают точное время начала в виде unix timestamp
+                timestamp = datetime.fromtimestamp(event_data.timestamp)
             
-            existing_event = await find_event_by_signature(session, title=title, date_start=timestamp)
+            with metrics.stage('db_lookup', site_name):
+                existing_event = await find_event_by_signature(session, title=title, date_start=timestamp)
+                if existing_event is None and timestamp is not None:
+                    # Параллельный воркер мог создать это событие, пока мы его искали
+                    await lock_event_signature(session, title, timestamp)
+                    existing_event = await find_event_by_signature(session, title=title, date_start=timestamp)
             
             if existing_event:
                 update_data = {
-                    "price_min": event_data.get('price_min'),
-                    "price_max": event_data.get('price_max'),
-                    "tickets_info": event_data.get('tickets_info'),
-                    "link": event_data.get('link')
+                    "price_min": event_data.price_min,
+                    "price_max": event_data.price_max,
+                    "tickets_info": event_data.tickets_info,
+                    "link": event_data.link
                 }
-                await update_event_details(session, event_id=existing_event.event_id, event_data=update_data)
+                with metrics.stage('db_write', site_name):
+                    await update_event_details(session, event_id=existing_event.event_id, event_data=update_data,
+                                               link_batch=link_batch)
                 events_updated_count += 1
                 logging.info(f"🔄 ОБНОВЛЕНО: {title} | {time_str}")
                 
             else:
                 logging.info(f"  - Найдено новое событие: '{title}'.")
                 
-                full_description = event_data.get('full_description')
+                full_description = event_data.full_description
                 artist_names = []
-                if full_description:
+                if full_description and extract_artists and deadline.expired():
+                    # После дедлайна прогона события создаются без AI - сохранение в БД не откладываем
+                    metrics.increment('ai_skipped_by_deadline')
+                elif full_description and extract_artists:
                     logging.info(f"    - Вызываю AI для поиска артистов...")
-                    artist_names = await getArtist(full_description)
+                    # google.generativeai тяжелый - импортируем только когда AI действительно нужен
+                    from parsers.test_ai import getArtist
+                    try:
+                        with metrics.stage('ai_extraction', site_name) as st:
+                            artist_names = await deadline.wait_for(getArtist(full_description), AI_TIMEOUT)
+                            st.items = len(artist_names or [])
+                    except TimeoutError:
+                        # И таймаут AI_TIMEOUT, и дедлайн прогона (DeadlineExceeded - подкласс TimeoutError)
+                        logging.warning("    - AI не ответил вовремя, создаю событие без артистов")
+                        artist_names = []
                     logging.info(f"    - AI нашел: {artist_names if artist_names else 'нет артистов'}")
                 
                 # --- НОВАЯ ЛОГИКА ОПРЕДЕЛЕНИЯ ГОРОДА И СТРАНЫ ---
-                place_str = event_data.get('place')
+                place_str = event_data.place
                 
                 # Способ 1: Получаем город и страну напрямую из конфига (приоритетный)
                 city = current_config.get('city_name')
@@ -294,31 +411,67 @@ async def process_all_sites():
 
                 creation_data = {
                     "event_title": title,
-                    "event_type": event_data['event_type'],
+                    "event_type": event_data.event_type,
                     "venue": place_str or 'Место не указано',
                     "city": city,
                     "country_name": country_name,
                     "time": time_str,
                     "timestamp": timestamp,
-                    "price_min": event_data.get('price_min'),
-                    "price_max": event_data.get('price_max'),
-                    "link": event_data.get('link'),
-                    "tickets_info": event_data.get('tickets_info'),
+                    "price_min": event_data.price_min,
+                    "price_max": event_data.price_max,
+                    "link": event_data.link,
+                    "tickets_info": event_data.tickets_info,
                 }
                 
-                new_event_obj = await create_event_with_artists(session, event_data=creation_data, artist_names=artist_names)
+                with metrics.stage('db_write', site_name):
+                    new_event_obj = await create_event_with_artists(session, event_data=creation_data, artist_names=artist_names,
+                                                                    venue_resolver=venue_resolver, link_batch=link_batch)
                 if new_event_obj:
                     events_created_count += 1
                     logging.info(f"✅ СОЗДАНО: {new_event_obj.title} | {time_str}")
         
-        # 4. Сохраняем все изменения в БД одной большой транзакцией
-        print("\nСохраняю все изменения в базе данных...")
-        await session.commit()
-        print("Изменения успешно сохранены.")
+        with metrics.stage('db_write', 'event_links'):
+            links_added = await upsert_event_links(session, link_batch)
+        logging.info(f"Ссылки событий: {len(link_batch)} в пачке, новых {links_added}")
 
-    print("\n--- Обработка завершена ---")
-    print(f"Новых событий создано: {events_created_count}")
-    print(f"Существующих событий обновлено: {events_updated_count}")
+        # 4. Сохраняем все изменения в БД одной большой транзакцией
+        if commit:
+            print("\nСохраняю все изменения в базе данных...")
+            with metrics.stage('db_write', 'commit'):
+                await session.commit()
+            print("Изменения успешно сохранены.")
+            # lastmod страниц из sitemap - только после того, как их события попали в БД
+            sitemap.save_state()
+        else:
+            await session.rollback()
+            print("\nИзменения отменены (rollback).")
+
+    venue_resolver.log_stats()
+    elapsed = time.perf_counter() - started
+    processed = events_created_count + events_updated_count
+    logging.info(
+        f"Синхронизация с БД: {len(raw_events)} событий за {elapsed:.1f} с "
+        f"({processed / elapsed if elapsed else 0.0:.1f} событий/с; создано {events_created_count}, "
+        f"обновлено {events_updated_count})"
+    )
+    return events_created_count, events_updated_count
 
 if __name__ == "__main__":
-    asyncio.run(process_all_sites())
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Сбор событий со всех сайтов и синхронизация с БД")
+    arg_parser.add_argument('--dump-snapshot', metavar='PATH',
+                            help='Сохранить сырые события в снимок (.jsonl.gz) перед синхронизацией с БД')
+    arg_parser.add_argument('--from-snapshot', metavar='PATH',
+                            help='Не обходить сайты: взять сырые события из снимка и сразу синхронизировать с БД')
+    arg_parser.add_argument('--no-ai', action='store_true', help='Создавать события без поиска артистов через AI')
+    arg_parser.add_argument('--rollback', action='store_true', help='Откатить изменения в БД в конце (для замеров)')
+    arg_parser.add_argument('--budget', type=float, default=deadline.RUN_BUDGET,
+                            help='Бюджет времени на обход сайтов, сек (0 - без ограничения; по умолчанию PARSER_RUN_BUDGET)')
+    args = arg_parser.parse_args()
+
+    asyncio.run(process_all_sites(
+        dump_snapshot=args.dump_snapshot,
+        from_snapshot=args.from_snapshot,
+        extract_artists=not args.no_ai,
+        commit=not args.rollback,
+        run_budget=args.budget,
+    ))
\ No newline at end of file
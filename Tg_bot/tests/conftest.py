@@ -0,0 +1,9 @@
+import os
+
+from dotenv import load_dotenv
+
+# app/database/models.py требует переменные подключения при импорте (движок создается, но не подключается).
+# Тестам чистых функций из app/database/requests база не нужна - без .env подставляем заглушки
+load_dotenv()
+for name, value in {'DB_HOST': 'localhost', 'DB_PORT': '5432', 'DB_NAME': 'test', 'DB_USER': 'test', 'DB_PASS': 'test'}.items():
+    os.environ.setdefault(name, value)
@@ -0,0 +1,60 @@
+from datetime import datetime
+from decimal import Decimal
+
+from app.database.requests.requests import trim_afisha_series
+
+MAY_1, MAY_10, MAY_20 = datetime(2025, 5, 1, 19), datetime(2025, 5, 10, 19), datetime(2025, 5, 20, 19)
+
+
+def series(dates, links=None, prices_min=None, prices_max=None):
+    count = len(dates)
+    return dict(
+        event_ids=list(range(100, 100 + count)),
+        title='Щелкунчик',
+        category_name='Театр',
+        venue_name='Большой театр',
+        dates=dates,
+        links=links or [f'https://tickets/{i}' for i in range(count)],
+        prices_min=prices_min or [None] * count,
+        prices_max=prices_max or [None] * count,
+    )
+
+
+def test_without_period_keeps_everything():
+    row = trim_afisha_series(**series([MAY_1, None, MAY_20]))
+    assert row.event_id == 100
+    assert row.dates == [MAY_1, None, MAY_20]
+
+
+def test_period_boundaries_are_inclusive():
+    row = trim_afisha_series(**series([MAY_1, MAY_10, MAY_20]), date_from=MAY_10, date_to=MAY_20)
+    assert row.dates == [MAY_10, MAY_20]
+    # event_id - первое событие серии в периоде, а не первое в серии
+    assert row.event_id == 101
+
+
+def test_undated_events_drop_out_of_a_period():
+    row = trim_afisha_series(**series([None, MAY_10]), date_from=MAY_1)
+    assert row.dates == [MAY_10]
+    assert row.event_id == 101
+    row = trim_afisha_series(**series([MAY_10, None]), date_to=MAY_20)
+    assert row.dates == [MAY_10]
+
+
+def test_links_follow_the_period_and_skip_empty():
+    row = trim_afisha_series(**series([MAY_1, MAY_10, MAY_20], links=['https://a', None, '']), date_from=MAY_1)
+    assert row.links == ['https://a']
+    row = trim_afisha_series(**series([MAY_1, MAY_10, MAY_20], links=['https://a', '', 'https://c']), date_from=MAY_10)
+    assert row.links == ['https://c']
+
+
+def test_price_range_is_taken_within_the_period():
+    row = trim_afisha_series(
+        **series([MAY_1, MAY_10, MAY_20],
+                 prices_min=[Decimal(10), Decimal(30), None],
+                 prices_max=[Decimal(90), Decimal(50), None]),
+        date_from=MAY_10,
+    )
+    assert (row.min_price, row.max_price) == (Decimal(30), Decimal(50))
+    row = trim_afisha_series(**series([MAY_1, MAY_20], prices_min=[Decimal(10), None]), date_from=MAY_20)
+    assert (row.min_price, row.max_price) == (None, None)
@@ -0,0 +1,38 @@
+from app.services.artist_index import ArtistIndex, normalize_artist_name
+
+
+def make_index(*rows):
+    index = ArtistIndex()
+    index.add_many(rows)
+    return index
+
+
+def test_normalization():
+    assert normalize_artist_name('  Ёлка!  ') == 'елка'
+    assert normalize_artist_name('AC/DC') == 'ac dc'
+
+
+def test_typo_finds_artist():
+    index = make_index((1, 'Кино'), (2, 'Сплин'), (3, 'Ленинград'))
+    assert index.search('Ленингад', limit=1)[0].artist_id == 3
+
+
+def test_renamed_artist_is_found_only_by_new_name():
+    index = make_index((1, 'Старое Имя'), (2, 'Сплин'))
+    index.add(1, 'Новое Название')
+    assert len(index) == 2
+    assert [match.artist_id for match in index.search('Новое Название', limit=1)] == [1]
+    assert all(match.name != 'Старое Имя' for match in index.search('Старое Имя', limit=5))
+
+
+def test_same_key_rename_updates_display_name():
+    index = make_index((1, 'Елка'))
+    index.add(1, 'Ёлка')
+    assert index.search('елка', limit=5) == [(1, 'Ёлка', 100.0)]
+
+
+def test_max_artist_id_and_empty_query():
+    index = make_index((5, 'Кино'), (2, 'Сплин'))
+    assert index.max_artist_id == 5
+    assert index.search('  !!! ') == []
+    assert ArtistIndex().search('Кино') == []
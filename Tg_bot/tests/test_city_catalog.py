@@ -0,0 +1,25 @@
+from app.services.city_catalog import CityCatalog
+
+CATALOG = CityCatalog([(1, 'Минск'), (2, 'Минская Горка'), (3, 'Гомель'), (4, 'Санкт-Петербург'), (5, 'Мир')])
+
+
+def test_exact_match_comes_first():
+    assert CATALOG.search('мир')[0] == 'Мир'
+    assert CATALOG.search('Минск')[0] == 'Минск'
+
+
+def test_prefix_matches_shortest_first():
+    assert CATALOG.search('мин')[:2] == ['Минск', 'Минская Горка']
+
+
+def test_hyphens_and_case_are_ignored():
+    assert CATALOG.search('санкт петербург') == ['Санкт-Петербург']
+
+
+def test_typo_falls_back_to_fuzzy_search():
+    assert CATALOG.search('Гомль')[0] == 'Гомель'
+
+
+def test_empty_query_and_top():
+    assert CATALOG.search('  ') == []
+    assert CATALOG.top(2) == ['Минск', 'Минская Горка']
@@ -0,0 +1,38 @@
+import pytest
+
+from app.services.venues import normalize_venue_name
+
+
+@pytest.mark.parametrize('variants', [
+    ['Минск-Арена', 'Minsk Arena, Минск', 'Минск-Арена (Минск)', 'Минск-Арена, пр-т Победителей, 111', 'МИНСК-АРЕНА'],
+    ['Цирк', 'Tsirk', 'Tzirk'],
+    ['Дворец Республики', 'Дворец Республики, Октябрьская пл., 1', 'Дворец Республики, г. Минск'],
+    ['«Falcon Club»', 'Falcon Club, Минск', '"Falcon Club"'],
+    ['Ёлка', 'Елка'],
+])
+def test_variants_share_key(variants):
+    assert len({normalize_venue_name(name) for name in variants}) == 1
+
+
+def test_latin_c_is_kept():
+    assert normalize_venue_name('Re:Public Club') == 're public club'
+    assert normalize_venue_name('Concert Hall') == 'concert hall'
+
+
+def test_halls_are_not_addresses():
+    assert normalize_venue_name('Prime Hall, зал 1') != normalize_venue_name('Prime Hall, зал 2')
+    assert normalize_venue_name('Prime Hall, зал 1') == 'prime hall zal 1'
+
+
+def test_address_tail_is_dropped():
+    assert normalize_venue_name('Prime Hall, пр-т Победителей, 65') == 'prime hall'
+    assert normalize_venue_name('Prime Hall, Победителей 65') == 'prime hall'
+
+
+def test_city_from_argument():
+    assert normalize_venue_name('Ледовый дворец, Пинск', city_name='Пинск') == normalize_venue_name('Ледовый дворец')
+
+
+def test_empty():
+    assert normalize_venue_name(None) == ''
+    assert normalize_venue_name('') == ''